@@ -0,0 +1,253 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from Dat_writer import DatTable, write_dat
+from Encoded_text import decode_hz_column
+from Input_cache import read_input_csv
+from Input_schema import read_typed_csv
+from Run_metrics import frame_mb, measure
+from Stage_scheduler import Stage
+
+AOR_CODE = ['Aor_groups.py', 'Dat_writer.py', 'Encoded_text.py', 'Input_cache.py', 'Input_schema.py']
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+DAT_PATH = os.path.join('..', 'Dat_files', 'aor_group_dat.dat')
+AOR_INPUTS = ['Zones.CSV', 'ZoneGroups.CSV', 'UserTypes.CSV', 'StationPoints.CSV', 'StatusPoints.csv']
+# Without status points the groups of the stations are still built
+OPTIONAL_AOR_INPUTS = ['StatusPoints.csv']
+
+# An AOR code keeps the zone bits in its low ZONE_BITS bits and the user type PKey above them
+ZONE_BITS = 48
+# A MASK lists one zone, or several one per line once decoded from 'T=HZ;<hex>'
+MASK_SEPARATORS = r'[,;|+\s]+'
+# Columns of StatusPoints read to find the AOR groups in use
+STATUS_AOR_COLUMNS = ['STATIONPID', 'ZONEID', 'USERTYPEID']
+
+# AORList 2:0-127 holds one state per AOR, set for the zones of the group
+AOR_LIST_SIZE = 128
+
+AOR_GROUP_TABLE = DatTable(
+    name='AOR_GROUP', number=3,
+    # The record number leads each record, the template has no field 0
+    fields=['1'] + [f'2:{i}' for i in range(AOR_LIST_SIZE)] + ['4'],
+    columns=['record', 'Name'] + [f'AORList{i}' for i in range(AOR_LIST_SIZE)] + ['SiteID'],
+    header=["*", "*", "{fields}",
+            "*\trecord\tName\t" + '\t'.join(f'AORList2:{i}' for i in range(AOR_LIST_SIZE)) + "\tSiteID", "*"],
+    quoted=('Name',),
+    numbered=('record',),
+    # The exports have a single site
+    constants={'SiteID': 0})
+
+
+def upper_names(values):
+    return values.astype('string').str.strip().str.upper().fillna('')
+
+
+def first_index(keys, values):
+    """Hash index of the first occurrence of each non blank key, with its value."""
+    unique = ~keys.duplicated().to_numpy() & (keys != '').to_numpy()
+    return pd.Index(keys[unique].to_numpy()), np.asarray(values)[unique]
+
+
+class AorGroups:
+    """Zones as bits of an int64, zone groups as masks of those bits, and the AOR groups in use.
+
+    The AOR code of a station or point is its zone mask OR'ed with its user type PKey
+    shifted above the zone bits. Every distinct code is one AOR group, numbered from 1 in
+    the order the stations, then the status points, first use it, and named after the
+    zone group row that first used it. Codes are computed and looked up over whole
+    columns, so the groups cost a few array operations per table.
+    """
+
+    def __init__(self, df_zones, df_zone_groups, df_user_types):
+        zones = upper_names(df_zones['NAME'])
+        if len(zones) > ZONE_BITS:
+            raise ValueError(f"{len(zones)} zones do not fit in the {ZONE_BITS} bits of an AOR mask")
+        self.zone_index, self.zone_bits = first_index(zones, np.left_shift(1, np.arange(len(zones), dtype='int64')))
+        self.all_zones = np.bitwise_or.reduce(self.zone_bits) if len(self.zone_bits) else np.int64(0)
+
+        group_names = upper_names(df_zone_groups['NAME'])
+        masks, self.undecoded, self.unknown_zones = self.zone_group_masks(df_zone_groups['MASK'],
+                                                                           df_zone_groups['NAME'].astype(str))
+        self.group_index, self.group_masks = first_index(group_names, masks)
+        _, self.group_labels = first_index(group_names, df_zone_groups['NAME'].astype(str).to_numpy(dtype=object))
+
+        self.type_index, self.type_keys = first_index(upper_names(df_user_types['Name']),
+                                                      df_user_types['PKey'].astype('int64'))
+        self.type_names = dict(zip(df_user_types['PKey'].astype('int64').tolist(), df_user_types['Name'].astype(str)))
+
+        self.codes = pd.Index([], dtype='int64')
+        self.code_names = []
+        self.station_index = pd.Index([])
+        self.station_masks = np.zeros(0, dtype='int64')
+        self.station_zone_groups = np.zeros(0, dtype=object)
+        self.unknown = {'zone group': {}, 'user type': {}}
+
+    def zone_group_masks(self, masks, group_names):
+        """OR of the zone bits named in each MASK; masks that cannot be decoded give every zone."""
+        masks, undecoded = decode_hz_column(masks.reset_index(drop=True))
+        zones = upper_names(masks).str.split(MASK_SEPARATORS).explode()
+        zones = zones[zones != '']
+        positions = self.zone_index.get_indexer(zones.to_numpy())
+        bits = pd.Series(np.where(positions >= 0, self.zone_bits[positions], 0), index=zones.index)
+        result = np.zeros(len(masks), dtype='int64')
+        if len(bits):
+            combined = bits.groupby(level=0).agg(np.bitwise_or.reduce)
+            result[combined.index.to_numpy()] = combined.to_numpy()
+        result[undecoded] = self.all_zones
+        unknown = sorted(set(zones[positions < 0]))
+        return result, list(dict.fromkeys(group_names[undecoded])), unknown
+
+    def lookup(self, index, values, names, label):
+        """Value of each name in the index, 0 for blanks and unknown names, which are counted."""
+        keys = upper_names(names)
+        positions = index.get_indexer(keys.to_numpy())
+        found = positions >= 0
+        missing = ~found & (keys != '').to_numpy()
+        if missing.any():
+            for name, count in keys[missing].value_counts(sort=False).items():
+                self.unknown[label][name] = self.unknown[label].get(name, 0) + int(count)
+        return np.where(found, values[positions], 0).astype('int64')
+
+    def zone_masks(self, zone_group_names):
+        return self.lookup(self.group_index, self.group_masks, zone_group_names, 'zone group')
+
+    def zone_group_labels(self, zone_group_names):
+        """ZoneGroups NAME of each zone group name, '' for blanks and unknown names."""
+        positions = self.group_index.get_indexer(upper_names(zone_group_names).to_numpy())
+        return np.where(positions >= 0, np.append(self.group_labels, '')[positions], '')
+
+    def user_types(self, user_type_names):
+        return self.lookup(self.type_index, self.type_keys, user_type_names, 'user type')
+
+    def set_stations(self, station_names, zone_group_names):
+        """Zone mask of every station, by upper case name; the last duplicate wins, as in StationIndex."""
+        keys = upper_names(station_names)
+        unique = ~keys.duplicated(keep='last').to_numpy()
+        self.station_index = pd.Index(keys[unique].to_numpy())
+        self.station_masks = self.zone_masks(zone_group_names)[unique]
+        self.station_zone_groups = self.zone_group_labels(zone_group_names)[unique]
+
+    def station_mask(self, station_names):
+        positions = self.station_index.get_indexer(upper_names(station_names).to_numpy())
+        return np.where(positions >= 0, self.station_masks[positions], 0)
+
+    def station_zone_group(self, station_names):
+        positions = self.station_index.get_indexer(upper_names(station_names).to_numpy())
+        return np.where(positions >= 0, np.append(self.station_zone_groups, '')[positions], '')
+
+    def point_codes(self, station_names, zone_group_names, user_type_names):
+        """Codes of points: their own zone group, or their station's when blank, with their user type."""
+        masks = np.where(upper_names(zone_group_names).to_numpy() != '', self.zone_masks(zone_group_names),
+                         self.station_mask(station_names))
+        return masks | np.left_shift(self.user_types(user_type_names), ZONE_BITS)
+
+    def point_zone_groups(self, station_names, zone_group_names):
+        """ZoneGroups NAME the code of each point comes from."""
+        return np.where(upper_names(zone_group_names).to_numpy() != '', self.zone_group_labels(zone_group_names),
+                        self.station_zone_group(station_names))
+
+    def register(self, codes, zone_groups):
+        """Give the codes not seen yet the next group numbers, named after the zone group of their first use."""
+        codes = np.asarray(codes, dtype='int64')
+        new = ~pd.Series(codes).duplicated().to_numpy() & ~pd.Index(codes).isin(self.codes)
+        if new.any():
+            self.codes = self.codes.append(pd.Index(codes[new], dtype='int64'))
+            self.code_names += np.asarray(zone_groups, dtype=object)[new].tolist()
+
+    def groups(self, codes):
+        """AOR group number of each code, 0 for codes never registered."""
+        positions = self.codes.get_indexer(np.asarray(codes, dtype='int64'))
+        return pd.Series(np.where(positions >= 0, positions + 1, 0)).astype('int32')
+
+    def station_groups(self, station_names):
+        return self.groups(self.station_mask(station_names)).set_axis(station_names.index)
+
+    def point_groups(self, station_names, zone_group_names, user_type_names):
+        codes = self.point_codes(station_names, zone_group_names, user_type_names)
+        return self.groups(codes).set_axis(station_names.index)
+
+    def table(self):
+        """One record per AOR group: the name of its zone group and user type, and the AORList of its zones."""
+        codes = self.codes.to_numpy()
+        masks = codes & ((1 << ZONE_BITS) - 1)
+        types = codes >> ZONE_BITS
+        names = [(name or f'AOR_{int(mask):X}') +
+                 (f"/{self.type_names.get(int(user_type), user_type)}" if user_type else '')
+                 for name, mask, user_type in zip(self.code_names, masks, types)]
+        states = np.zeros((len(codes), AOR_LIST_SIZE), dtype='int64')
+        states[:, :ZONE_BITS] = (masks[:, None] >> np.arange(ZONE_BITS, dtype='int64')) & 1
+        df_aor = pd.DataFrame(states, columns=[f'AORList{i}' for i in range(AOR_LIST_SIZE)])
+        df_aor.insert(0, 'Name', names)
+        return df_aor
+
+    def report_unknown(self):
+        if self.undecoded:
+            print(f"Warning: Zone group masks could not be decoded, they are given every zone: "
+                  f"{', '.join(self.undecoded)}")
+        if self.unknown_zones:
+            print(f"Warning: Zone group masks name unknown zones, ignored: {', '.join(self.unknown_zones)}")
+        for label, unknown in self.unknown.items():
+            if unknown:
+                names = sorted(unknown, key=unknown.get, reverse=True)
+                shown = ', '.join(f"{name} ({unknown[name]})" for name in names[:10])
+                more = f" and {len(names) - 10} more" if len(names) > 10 else ''
+                print(f"Warning: {sum(unknown.values())} references to {len(names)} unknown {label}s, "
+                      f"no zone or user type given: {shown}{more}")
+            self.unknown[label] = {}
+
+
+def build_aor_groups(input_folder=INPUT_FOLDER, write_dat_file=True):
+    """Build the AOR groups of the stations and status points, return them or None."""
+    paths = {file_name: os.path.join(input_folder, file_name) for file_name in AOR_INPUTS}
+    for file_name, csv_path in paths.items():
+        if not os.path.exists(csv_path) and file_name not in OPTIONAL_AOR_INPUTS:
+            print(f"Error: Could not find the file at {csv_path}")
+            return None
+
+    try:
+        aor = AorGroups(read_input_csv(paths['Zones.CSV'], usecols=['NAME']),
+                        read_input_csv(paths['ZoneGroups.CSV'], usecols=['NAME', 'MASK']),
+                        read_input_csv(paths['UserTypes.CSV'], usecols=['PKey', 'Name']))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+    df_station = read_typed_csv(paths['StationPoints.CSV'])
+    if df_station is None:
+        return None
+    if os.path.exists(paths['StatusPoints.csv']):
+        # Only the categorical AOR columns of the points, small whatever the size of the export
+        df_status = read_input_csv(paths['StatusPoints.csv'], usecols=STATUS_AOR_COLUMNS,
+                                   dtype={column: 'category' for column in STATUS_AOR_COLUMNS})
+    else:
+        print(f"Warning: Could not find the file at {paths['StatusPoints.csv']}, only the station AOR groups are built")
+        df_status = pd.DataFrame(columns=STATUS_AOR_COLUMNS)
+    with measure('transform', 'aor', rows_in=len(df_station) + len(df_status)) as step:
+        aor.set_stations(df_station['NAME'], df_station['ZONEID'])
+        aor.register(aor.station_mask(df_station['NAME']), aor.station_zone_group(df_station['NAME']))
+        aor.register(aor.point_codes(df_status['STATIONPID'], df_status['ZONEID'], df_status['USERTYPEID']),
+                     aor.point_zone_groups(df_status['STATIONPID'], df_status['ZONEID']))
+        df_aor = aor.table()
+        step['rows_out'] = len(df_aor)
+        step['frame_mb'] = frame_mb(df_aor)
+    aor.report_unknown()
+
+    if write_dat_file:
+        write_dat(DAT_PATH, AOR_GROUP_TABLE, df_aor)
+        print(f".dat file generated: {DAT_PATH}")
+    return aor
+
+
+def restore_aor():
+    # AOR stage was up to date, only the groups are needed by the station and point stages
+    return build_aor_groups(write_dat_file=False)
+
+
+def aor_stage():
+    return Stage('aor', build_aor_groups,
+                 inputs=[os.path.join(INPUT_FOLDER, file_name) for file_name in AOR_INPUTS],
+                 outputs=[DAT_PATH],
+                 code=AOR_CODE, restore=restore_aor)
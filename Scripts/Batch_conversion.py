@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MAPPINGS = os.path.join(os.path.dirname(SCRIPTS_FOLDER), 'Mappings')
+BATCH_REPORT_FOLDER = os.path.join('..', 'Reports')
+
+# Folders read from the project root; everything else is written in the workspace
+SHARED_FOLDERS = ['Inputs', 'Mappings']
+# Every conversion path is relative to '..', so a project runs from a folder one level below it
+WORK_FOLDER = '.cache'
+LOG_FILE = 'conversion.log'
+
+
+def project_name(root):
+    return os.path.basename(os.path.normpath(root))
+
+
+def link_folder(source, target):
+    """Make target show the content of source: a symlink, or a copy where links are not allowed."""
+    if os.path.lexists(target):
+        return
+    try:
+        os.symlink(source, target, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        shutil.copytree(source, target)
+
+
+def prepare_workspace(root, output_root=None):
+    """Return the folder a project is converted in: its root, or an isolated folder under output_root."""
+    if output_root is None:
+        workspace = root
+    else:
+        workspace = os.path.join(output_root, project_name(root))
+        os.makedirs(workspace, exist_ok=True)
+        for folder in SHARED_FOLDERS:
+            if os.path.isdir(os.path.join(root, folder)):
+                link_folder(os.path.join(root, folder), os.path.join(workspace, folder))
+    # Projects without their own mapping use the one next to these scripts
+    if not os.path.isdir(os.path.join(workspace, 'Mappings')) and os.path.isdir(DEFAULT_MAPPINGS):
+        link_folder(DEFAULT_MAPPINGS, os.path.join(workspace, 'Mappings'))
+    os.makedirs(os.path.join(workspace, WORK_FOLDER), exist_ok=True)
+    return workspace
+
+
+def convert_project(root, workspace, options):
+    """Convert one project in this worker process, return its status and timings."""
+    # Imported here so a fresh worker only loads pandas when it converts
+    from PMPA_Conversion import conversion_stages
+    from Run_metrics import write_run_report
+    from Stage_scheduler import run_stages
+
+    start = time.perf_counter()
+    cwd = os.getcwd()
+    result = {'project': project_name(root), 'root': root, 'workspace': workspace}
+    try:
+        os.chdir(os.path.join(workspace, WORK_FOLDER))
+        os.makedirs(os.path.join('..', 'Reports'), exist_ok=True)
+        log_path = os.path.join('..', 'Reports', LOG_FILE)
+        with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+            stages = conversion_stages(options['trailer'], options['chunksize'], options['validate'],
+                                       options['fail_fast'], options['delta'])
+            report = run_stages(stages, force=options['force'], workers=1)
+            report_path = write_run_report(report)
+        statuses = {name: info['status'] for name, info in report['stages'].items()}
+        failed = [name for name, status in statuses.items() if status in ('failed', 'blocked')]
+        result.update({
+            'status': 'failed' if failed else 'ok',
+            'failed_stages': failed,
+            'stages': {name: {'status': info['status'], 'seconds': round(info['seconds'], 3)}
+                       for name, info in report['stages'].items()},
+            'report': os.path.abspath(report_path),
+            'log': os.path.abspath(log_path),
+        })
+    except Exception as e:
+        result.update({'status': 'error', 'error': repr(e)})
+    finally:
+        os.chdir(cwd)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(roots, workers=None, output_root=None, **options):
+    """Convert every project root in a process pool, return the per project results."""
+    options = dict({'force': False, 'trailer': False, 'chunksize': None, 'validate': True, 'fail_fast': False,
+                    'delta': None}, **options)
+    roots = [os.path.abspath(root) for root in roots]
+    names = [project_name(root) for root in roots]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if output_root and duplicated:
+        print(f"Error: Projects with the same folder name would share an output folder: {duplicated}")
+        return None
+    output_root = os.path.abspath(output_root) if output_root else None
+
+    jobs = []
+    for root in roots:
+        if not os.path.isdir(os.path.join(root, 'Inputs')):
+            print(f"Error: No se pudo encontrar la carpeta Inputs en {root}")
+            continue
+        jobs.append((root, prepare_workspace(root, output_root)))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_project, root, workspace, options): root for root, workspace in jobs}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"{result['project']}: {result['status']} in {result['seconds']:.2f} s")
+
+    results.sort(key=lambda result: roots.index(result['root']))
+    return {
+        'started': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'workers': workers,
+        'seconds': round(time.perf_counter() - start, 3),
+        'projects': results,
+        'missing': [root for root in roots if root not in {job[0] for job in jobs}],
+    }
+
+
+def print_batch_summary(batch):
+    print(f"{'Project':<30}{'Status':<9}{'Seconds':>9}  Failed stages")
+    for result in batch['projects']:
+        failed = ', '.join(result.get('failed_stages', [])) or result.get('error', '')
+        print(f"{result['project'][:29]:<30}{result['status']:<9}{result['seconds']:>9.2f}  {failed}")
+    total = sum(result['seconds'] for result in batch['projects'])
+    print(f"{len(batch['projects'])} projects with {batch['workers']} worker(s): {batch['seconds']:.2f} s "
+          f"wall, {total:.2f} s of conversion")
+
+
+def read_roots(paths, roots_file=None):
+    roots = list(paths)
+    if roots_file:
+        with open(roots_file) as f:
+            roots += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return roots
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert several PMPA projects in parallel")
+    parser.add_argument('roots', nargs='*', help="Project folders, each with its own Inputs folder")
+    parser.add_argument('--roots-file', help="Text file with one project folder per line")
+    parser.add_argument('--workers', type=int, default=None, help="Projects converted at the same time (default: CPUs)")
+    parser.add_argument('--output-root', help="Write each project's outputs to <output-root>/<project> instead of its folder")
+    parser.add_argument('--force', action='store_true', help="Rebuild every stage even if its inputs did not change")
+    parser.add_argument('--trailer', action='store_true', help="Write the checksum and record counts of each SCADA file")
+    parser.add_argument('--chunksize', type=int, default=None, help="Convert analog and status points in chunks")
+    parser.add_argument('--no-validate', action='store_true', help="Skip the reference checks of the inputs")
+    parser.add_argument('--fail-fast', action='store_true', help="Do not convert projects whose inputs have errors")
+    parser.add_argument('--delta', action='store_true',
+                        help="Also write the records changed since the previous SCADA build of each project")
+    parser.add_argument('--report', help="Batch report path (default ../Reports/batch_yymmdd_HHMMSS.json)")
+    args = parser.parse_args()
+
+    roots = read_roots(args.roots, args.roots_file)
+    if not roots:
+        parser.error("no project roots given")
+    batch = run_batch(roots, workers=args.workers, output_root=args.output_root, force=args.force,
+                      trailer=args.trailer, chunksize=args.chunksize, validate=not args.no_validate,
+                      fail_fast=args.fail_fast, delta='' if args.delta else None)
+    if batch is None:
+        sys.exit(1)
+    print_batch_summary(batch)
+
+    report_path = args.report or os.path.join(BATCH_REPORT_FOLDER, f"batch_{datetime.now().strftime('%y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(batch, f, indent=2)
+    print(f"Batch report: {report_path}")
+    sys.exit(0 if all(result['status'] == 'ok' for result in batch['projects']) and not batch['missing'] else 1)
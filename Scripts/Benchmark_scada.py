@@ -0,0 +1,312 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Run_metrics import peak_rss_mb
+
+SAMPLE_INPUTS = os.path.join('..', 'Inputs')
+SAMPLE_MAPPINGS = os.path.join('..', 'Mappings')
+BASELINE_PATH = os.path.join('..', 'Benchmarks', 'scada_baseline.json')
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+# Share of the points that are analog, the rest are status points
+ANALOG_SHARE = 0.75
+# Zipf exponent of the points per station distribution
+STATION_SKEW = 1.1
+MAX_POINTS_PER_STATION = 999
+MAX_STATIONS = 999
+# Slowdown (rows/sec) or growth (peak RSS) flagged as a regression
+TOLERANCE = 0.20
+# Stages faster than this are timer noise, their rate is not compared
+MIN_SECONDS = 0.1
+# Exports of the FEP, ICCP and calc stages, copied from the samples at their own size
+SAMPLE_ONLY_INPUTS = {
+    'channel_group': ['ComLines.CSV'],
+    'channel': ['Rtus.CSV'],
+    'rtu': ['Rtus.CSV'],
+    'iccp': ['DESetAnalog.CSV', 'DESetStatus.CSV', 'DESetSetpoint.CSV'],
+    'formula_template': ['CalcFunctions.CSV'],
+    'formula': ['CalcOnline.CSV'],
+    'execution_group': ['CalcOnline.CSV'],
+}
+OTHER_SAMPLE_INPUTS = ['DEServers.CSV', 'ICCP.CSV', 'DESets.CSV']
+
+
+def sample_header(file_name, required):
+    """Columns of the sample export when it is available, so synthetic files have the real width."""
+    path = os.path.join(SAMPLE_INPUTS, file_name)
+    if os.path.exists(path):
+        columns = list(pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns)
+        return columns + [c for c in required if c not in columns]
+    return list(required)
+
+
+def points_per_station(points, stations, rng):
+    """Skewed point counts per station, none above MAX_POINTS_PER_STATION."""
+    weights = 1.0 / np.arange(1, stations + 1) ** STATION_SKEW
+    counts = rng.multinomial(points, weights / weights.sum())
+    # Move the excess of full stations to the ones with room left
+    while (counts > MAX_POINTS_PER_STATION).any():
+        excess = int((counts - MAX_POINTS_PER_STATION).clip(min=0).sum())
+        counts = counts.clip(max=MAX_POINTS_PER_STATION)
+        room = MAX_POINTS_PER_STATION - counts
+        counts += rng.multinomial(excess, room / room.sum())
+    return counts
+
+
+def write_synthetic_inputs(input_folder, points, seed=0):
+    """Write StationPoints, AnalogPoints, StatusPoints and the lookup exports they reference."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(input_folder, exist_ok=True)
+
+    analog_points = int(points * ANALOG_SHARE)
+    status_points = points - analog_points
+    needed = max(analog_points, status_points) // MAX_POINTS_PER_STATION + 1
+    stations = min(MAX_STATIONS, max(10, needed * 4))
+
+    # PrefixSuffixes and MeasurementUnits are small lookup tables, reuse the samples when present
+    for file_name, target in (('PrefixSuffixes.CSV', 'PrefixSuffixes.csv'), ('MeasurementUnits.CSV', 'MeasurementUnits.CSV')):
+        sample = os.path.join(SAMPLE_INPUTS, file_name)
+        if os.path.exists(sample):
+            shutil.copyfile(sample, os.path.join(input_folder, target))
+        elif file_name == 'PrefixSuffixes.CSV':
+            pd.DataFrame({'PKey': range(1, 21), 'Name': [f'STATES{i}' for i in range(1, 21)]}).to_csv(
+                os.path.join(input_folder, target), index=False)
+        else:
+            pd.DataFrame({'PKey': range(1, 39), 'Name': [f'U{i}' for i in range(1, 39)],
+                          'Desc': [f'Unit {i}' for i in range(1, 39)]}).to_csv(os.path.join(input_folder, target), index=False)
+    # Zones, zone groups and user types of the AOR groups
+    for file_name in ('Zones.CSV', 'ZoneGroups.CSV', 'UserTypes.CSV'):
+        sample = os.path.join(SAMPLE_INPUTS, file_name)
+        if os.path.exists(sample):
+            shutil.copyfile(sample, os.path.join(input_folder, file_name))
+    if not os.path.exists(os.path.join(SAMPLE_INPUTS, 'Zones.CSV')):
+        pd.DataFrame({'NAME': [f'Zone{i}' for i in range(1, 9)]}).to_csv(os.path.join(input_folder, 'Zones.CSV'), index=False)
+        pd.DataFrame({'PKEY': [1, 2], 'NAME': ['ALLZONES', 'ZONE6'], 'MASK': ['ZONE1,ZONE2,ZONE3', 'ZONE6']}).to_csv(
+            os.path.join(input_folder, 'ZoneGroups.CSV'), index=False)
+        pd.DataFrame({'PKey': [41], 'Name': ['Master']}).to_csv(os.path.join(input_folder, 'UserTypes.CSV'), index=False)
+    # The FEP, ICCP and calc exports do not grow with the points
+    for file_name in sorted({name for names in SAMPLE_ONLY_INPUTS.values() for name in names} | set(OTHER_SAMPLE_INPUTS)):
+        sample = os.path.join(SAMPLE_INPUTS, file_name)
+        if os.path.exists(sample):
+            shutil.copyfile(sample, os.path.join(input_folder, file_name))
+    states = pd.read_csv(os.path.join(input_folder, 'PrefixSuffixes.csv'), encoding='utf-8-sig')['Name'].to_numpy()
+    units = pd.read_csv(os.path.join(input_folder, 'MeasurementUnits.CSV'), encoding='utf-8-sig')['Name'].to_numpy()
+
+    station_names = np.array([f'ST{i:04d}' for i in range(1, stations + 1)], dtype=object)
+    station = pd.DataFrame('', index=range(stations), columns=sample_header(
+        'StationPoints.CSV', ['PKEY', 'NAME', 'DESC', 'ZONEID', 'ALRMPRIOR']))
+    station['PKEY'] = np.arange(1, stations + 1)
+    station['NAME'] = station_names
+    station['DESC'] = [f'Station {i}' for i in range(1, stations + 1)]
+    station['ZONEID'] = 'ALLZONES'
+    station['ALRMPRIOR'] = 0
+    station.to_csv(os.path.join(input_folder, 'StationPoints.CSV'), index=False)
+
+    def point_stations(count):
+        counts = points_per_station(count, stations, rng)
+        return rng.permutation(np.repeat(station_names, counts))
+
+    analog_station = point_stations(analog_points)
+    limits = ['PREMGHI', 'PREMGSEVHI', 'EMGHI', 'EMGSEVHI', 'PREMGLO', 'PREMGSEVLO', 'EMGLO', 'EMGSEVLO']
+    analog = pd.DataFrame({
+        'PKEY': np.arange(1, analog_points + 1),
+        'RTUID': np.where(rng.random(analog_points) < 0.45, '', analog_station + '_PRI'),
+        'NAME': [f'A_{i}' for i in range(analog_points)],
+        'ENGUNITS': rng.choice(units, analog_points),
+        'SCALEFACT': rng.choice([1.0, 16.0, 0.4, 0.004], analog_points),
+        'STATIONPID': analog_station,
+    })
+    for column in limits:
+        analog[column] = np.where(rng.random(analog_points) < 0.9, 0, rng.integers(1, 500_000, analog_points))
+    analog.to_csv(os.path.join(input_folder, 'AnalogPoints.csv'), index=False)
+
+    status = pd.DataFrame('', index=range(status_points), columns=sample_header(
+        'StatusPoints.CSV', ['PKEY', 'STATIONPID', 'NAME', 'ZONEID', 'USERTYPEID', 'NORMSTATE', 'PREFSUFFID']))
+    status['PKEY'] = np.arange(1, status_points + 1)
+    status['STATIONPID'] = point_stations(status_points)
+    status['NAME'] = [f'S_{i}' for i in range(status_points)]
+    status['USERTYPEID'] = 'MASTER'
+    # Most points are in the zone of their station, a few in a zone of their own
+    status['ZONEID'] = np.where(rng.random(status_points) < 0.95, '', 'ZONE6')
+    status['NORMSTATE'] = rng.integers(0, 2, status_points)
+    status['PREFSUFFID'] = rng.choice(states, status_points)
+    status.to_csv(os.path.join(input_folder, 'StatusPoints.csv'), index=False)
+
+    return {'stations': stations, 'analog': analog_points, 'status': status_points}
+
+
+def sample_rows(input_folder, file_names):
+    """Data rows of the copied sample exports, None when one is missing."""
+    total = 0
+    for file_name in file_names:
+        path = os.path.join(input_folder, file_name)
+        if not os.path.exists(path):
+            return None
+        total += len(pd.read_csv(path, usecols=[0], encoding='utf-8-sig'))
+    return total
+
+
+def run_case(points, chunksize=None, seed=0):
+    """Generate a project of the given size in a temp folder, convert and merge it, return the measures."""
+    global SAMPLE_INPUTS
+    scripts_folder = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, scripts_folder)
+    sample_inputs = os.path.abspath(SAMPLE_INPUTS)
+    sample_mappings = os.path.abspath(SAMPLE_MAPPINGS)
+
+    root = tempfile.mkdtemp(prefix='pmpa_bench_')
+    cwd = os.getcwd()
+    try:
+        # The conversion works on '..' paths, run it from a folder one level below the project
+        os.makedirs(os.path.join(root, 'Scripts'))
+        os.chdir(os.path.join(root, 'Scripts'))
+        SAMPLE_INPUTS = sample_inputs
+        shutil.copytree(sample_mappings, os.path.join('..', 'Mappings'))
+        counts = write_synthetic_inputs(os.path.join('..', 'Inputs'), points, seed)
+
+        from Scada_code import scada_stages
+        from Fep_code import fep_stages
+        from Iccp_code import iccp_stages
+        from Calc_code import calc_stages
+        from Merging_scada import merge_fep_stage, merge_iccp_stage, merge_opencalc_stage, merge_scada_stage
+        from Stage_scheduler import run_stages
+
+        stages = scada_stages(chunksize) + fep_stages() + iccp_stages() + calc_stages()
+        stages += [merge_scada_stage(), merge_fep_stage(), merge_iccp_stage(), merge_opencalc_stage()]
+        start = time.perf_counter()
+        report = run_stages(stages, force=True, workers=1)
+        elapsed = time.perf_counter() - start
+
+        rows = {'aor': counts['stations'] + counts['status'], 'station': counts['stations'],
+                'analog': counts['analog'], 'status': counts['status'],
+                'unit': None, 'merge_scada': points + counts['stations']}
+        for name, file_names in SAMPLE_ONLY_INPUTS.items():
+            rows[name] = sample_rows(os.path.join('..', 'Inputs'), file_names)
+        stages = {}
+        for name, info in report['stages'].items():
+            stage_rows = rows.get(name)
+            stages[name] = {
+                'status': info['status'],
+                'seconds': round(info['seconds'], 4),
+                'rows': stage_rows,
+                'rows_per_sec': round(stage_rows / info['seconds']) if stage_rows and info['seconds'] else None,
+            }
+        return {
+            'points': points,
+            'chunksize': chunksize,
+            'stations': counts['stations'],
+            'seconds': round(elapsed, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'stages': stages,
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def best_of(runs):
+    """Keep the fastest time of every stage over repeated runs of one case."""
+    best = min(runs, key=lambda run: run['seconds'])
+    for name, stage in best['stages'].items():
+        fastest = min((run['stages'][name] for run in runs), key=lambda stage: stage['seconds'])
+        best['stages'][name] = fastest
+    best['peak_rss_mb'] = min(run['peak_rss_mb'] for run in runs)
+    return best
+
+
+def run_benchmarks(sizes, chunksize=None, repeat=1):
+    """Run every size in its own fresh process, so peak RSS is measured per size."""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for points in sizes:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(run_case, points, chunksize).result())
+        result = best_of(runs)
+        results.append(result)
+        print(f"{points:>10} points: {result['seconds']:8.2f} s, peak RSS {result['peak_rss_mb']:8.1f} MB")
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=TOLERANCE):
+    """Return the regressions of results against a stored baseline."""
+    regressions = []
+    previous = {(case['points'], case.get('chunksize')): case for case in baseline.get('results', [])}
+    for case in results:
+        base = previous.get((case['points'], case.get('chunksize')))
+        if base is None:
+            continue
+        for name, stage in case['stages'].items():
+            base_stage = base['stages'].get(name, {})
+            base_rate = base_stage.get('rows_per_sec')
+            rate = stage['rows_per_sec']
+            if base_stage.get('seconds', 0) < MIN_SECONDS:
+                continue
+            if base_rate and rate and rate < base_rate * (1 - tolerance):
+                regressions.append(f"{case['points']} points, {name}: {rate} rows/s vs {base_rate} rows/s in baseline")
+            elif not base_rate and stage['seconds'] > base_stage['seconds'] * (1 + tolerance):
+                # Stages without a row count, like the merges of fixed size, are compared by time
+                regressions.append(f"{case['points']} points, {name}: {stage['seconds']} s vs {base_stage['seconds']} s in baseline")
+        if case['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{case['points']} points: peak RSS {case['peak_rss_mb']} MB vs {base['peak_rss_mb']} MB in baseline")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'Points':>10} {'Stage':<18}{'Seconds':>10}{'Rows/s':>12}")
+    for case in results:
+        for name, stage in case['stages'].items():
+            rate = f"{stage['rows_per_sec']:,}" if stage['rows_per_sec'] else '-'
+            print(f"{case['points']:>10} {name:<18}{stage['seconds']:>10.3f}{rate:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conversion and merge stages on synthetic exports")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Total points per run (1k to 1M)")
+    parser.add_argument('--chunksize', type=int, default=None, help="Benchmark the chunked conversion mode")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size, the fastest time of each stage is kept")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.chunksize, args.repeat)
+    print_results(results)
+    document = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0],
+                'pandas': pd.__version__, 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f))
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import os
+
+from Mapping_engine import MAPPING_SPEC, mapped_table_stage
+from Merging_scada import merge_opencalc_stage
+from Stage_scheduler import run_stages
+
+CALC_CODE = ['Calc_code.py']
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+
+# Stage name and table of the mapping spec. The online calcs are OpenCalc objects: P1 is
+# the output of a Survalent calc and P2-P8 its inputs. The OpenCalc template has no
+# Priority, timer or constant parameters in the exports.
+CALC_TABLES = [
+    ('formula_template', 'FORMULA_TEMPLATE'),      # CalcFunctions.CSV
+    ('formula', 'FORMULA'),                        # CalcOnline.CSV
+    ('execution_group', 'EXECUTION_GROUP'),        # CalcOnline.CSV, one group per calc
+]
+
+# Exports with no object in the template, left unconverted
+UNCONVERTED_INPUTS = {
+    'CalcOffline.CSV': "the OpenCalc template has no object for the offline calcs",
+    'HistDataSets.CSV': "the template has no OpenHIS objects for the historian data sets",
+}
+
+
+def warn_unconverted(input_folder=INPUT_FOLDER):
+    """Warn about the exports of the project that are not converted, return their names."""
+    found = [name for name in UNCONVERTED_INPUTS if os.path.exists(os.path.join(input_folder, name))]
+    for name in found:
+        print(f"Warning: {name} is not converted, {UNCONVERTED_INPUTS[name]}")
+    return found
+
+
+def calc_stages(spec_path=MAPPING_SPEC):
+    """Conversion stages of the calculations.
+
+    The calc tables come from the mapping spec. The parameters of the online calcs are
+    the InputKey and OutputKey of their formula, every Pid resolved in one lookup by its
+    point rule. The offline calcs and historian data sets are only reported.
+    """
+    warn_unconverted()
+    return [mapped_table_stage(stage_name, table_name, CALC_CODE, spec_path) for stage_name, table_name in CALC_TABLES]
+
+
+def calc_processing(force=False, workers=None):
+    return run_stages(calc_stages() + [merge_opencalc_stage()], force=force, workers=workers)
+
+
+if __name__ == "__main__":
+    calc_processing()
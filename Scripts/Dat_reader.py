@@ -0,0 +1,218 @@
+import argparse
+import csv
+import io
+import mmap
+import os
+from dataclasses import dataclass, field
+
+# Bytes counted per step when counting records
+COUNT_BLOCK = 8 << 20
+
+
+@dataclass
+class DatTableInfo:
+    """Where one table of a .dat file is, found without reading its records."""
+    name: str                       # Table name, e.g. 'STATUS'
+    number: int                     # Table number before the name
+    fields: list                    # Field numbers of the table line
+    labels: list                    # Column names of the '*<tab>' comment line, if any
+    start: int                      # Offset of the first record
+    end: int                        # Offset just after the last record
+    columns: list = field(default_factory=list)  # Names of the record values
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+
+class TableStream(io.RawIOBase):
+    """Read-only file over a byte range of a memory map, so pandas reads a table without a copy of it."""
+
+    def __init__(self, mm, start, end):
+        self.mm = mm
+        self.pos = start
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.end - self.pos)
+        buffer[:count] = self.mm[self.pos:self.pos + count]
+        self.pos += count
+        return count
+
+
+def record_columns(info, first_record):
+    """Names for the values of a record: the comment labels, else 'record' and the field numbers."""
+    values = first_record.count(b'\t')
+    if len(info.labels) == values:
+        return info.labels
+    if len(info.fields) + 1 == values:
+        return ['record'] + info.fields
+    return [f'value{i}' for i in range(values)]
+
+
+class DatFile:
+    """Memory mapped .dat file (a single table or a merged SCADA_yymmdd.dat) with an index of its tables."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.database = None
+        self.tables = {}
+        self.index_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
+
+    def line_at(self, pos):
+        """Return the line starting at pos (without newline) and the offset of the next line."""
+        end = self.mm.find(b'\n', pos)
+        if end == -1:
+            end = len(self.mm)
+        return self.mm[pos:end].rstrip(b'\r'), end + 1
+
+    def index_tables(self):
+        """Find every table line and ' 0' terminator; records are skipped with a single search each."""
+        pos = 0
+        size = len(self.mm)
+        line, after = self.line_at(0) if size else (b'', 0)
+        # Merged files start with the database line, e.g. '10 SCADA.DB'
+        if line[:1].isdigit() and b' ' in line:
+            number, name = line.decode().split(None, 1)
+            self.database = (int(number), name)
+            pos = after
+
+        while pos < size:
+            labels = []
+            table_line = None
+            # Comments up to the table line, which is the first line starting with a tab
+            while pos < size:
+                line, after = self.line_at(pos)
+                if line.startswith(b'\t'):
+                    table_line = line
+                    pos = after
+                    break
+                if line.startswith(b'*\t'):
+                    labels = line[2:].decode().split('\t')
+                pos = after
+            if table_line is None:
+                break
+
+            # More comments, then the records or the terminator of an empty table
+            start = pos
+            while start < size:
+                line, after = self.line_at(start)
+                if not line.startswith(b'*'):
+                    break
+                if line.startswith(b'*\t'):
+                    labels = line[2:].decode().split('\t')
+                start = after
+
+            if self.mm[start:start + 2] == b' 0':
+                end = start
+            else:
+                # Records start with a tab, so the first line starting with a blank is the terminator
+                terminator = self.mm.find(b'\n ', start)
+                end = size if terminator == -1 else terminator + 1
+
+            values = table_line[1:].decode().split('\t')
+            info = DatTableInfo(name=values[1], number=int(values[0]), fields=values[2:], labels=labels,
+                                start=start, end=end)
+            if end > start:
+                first_record, _ = self.line_at(start)
+                info.columns = record_columns(info, first_record)
+            self.tables[info.name] = info
+            _, pos = self.line_at(end)
+
+    def table(self, name):
+        if name not in self.tables:
+            raise KeyError(f"Table {name} not found in {self.path}, tables: {list(self.tables)}")
+        return self.tables[name]
+
+    def count_records(self, name):
+        """Number of records of a table, counted on the mapped bytes."""
+        info = self.table(name)
+        count = 0
+        for block_start in range(info.start, info.end, COUNT_BLOCK):
+            count += self.mm[block_start:min(block_start + COUNT_BLOCK, info.end)].count(b'\n')
+        return count
+
+    def stream(self, info):
+        return io.BufferedReader(TableStream(self.mm, info.start, info.end), buffer_size=1 << 20)
+
+    def frame(self, name, chunksize=None, dtype=None):
+        """Records of one table as a frame (or an iterator of frames with a chunksize).
+
+        Values are parsed by pandas (or all kept as text with dtype=str), except quoted
+        values which are kept as strings without their quotes, and 'nan' which stays as written.
+        """
+        import pandas as pd
+        info = self.table(name)
+        if info.end == info.start:
+            empty = pd.DataFrame(columns=info.columns)
+            return iter([empty]) if chunksize else empty
+        reader = pd.read_csv(self.stream(info), sep='\t', header=None, names=[''] + info.columns,
+                             usecols=info.columns, quoting=csv.QUOTE_NONE, keep_default_na=False,
+                             dtype=dtype, chunksize=chunksize)
+        if chunksize:
+            return (unquote(chunk) for chunk in reader)
+        return unquote(reader)
+
+    def lines(self, name, chunksize):
+        """Iterate the records of one table as chunks of raw lines, as written in the file."""
+        import pandas as pd
+        info = self.table(name)
+        if info.end == info.start:
+            return iter([])
+        # No record holds a unit separator, so each line is read as a single value
+        reader = pd.read_csv(self.stream(info), sep='\x1f', header=None, names=['line'], quoting=csv.QUOTE_NONE,
+                             keep_default_na=False, dtype=str, chunksize=chunksize)
+        return (chunk['line'] for chunk in reader)
+
+    def frames(self, chunksize=None):
+        """Yield (name, frame) for every table, reading each one only when it is reached."""
+        for name in self.tables:
+            yield name, self.frame(name, chunksize)
+
+
+def unquote(df):
+    """Strip the single quotes of quoted columns."""
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object and len(values) and values.str.startswith("'").all():
+            df[column] = values.str[1:-1]
+    return df
+
+
+def print_dat_summary(path):
+    with DatFile(path) as dat:
+        if dat.database:
+            print(f"Database {dat.database[0]} {dat.database[1]}")
+        print(f"{'Table':<22}{'Number':>7}{'Fields':>8}{'Records':>10}{'Bytes':>14}")
+        for name, info in dat.tables.items():
+            print(f"{name:<22}{info.number:>7}{len(info.fields):>8}{dat.count_records(name):>10}{info.size:>14,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the tables of a .dat file")
+    parser.add_argument('path', help=".dat file, e.g. ../Populateables/SCADA_yymmdd.dat")
+    parser.add_argument('--table', help="Print the first records of this table")
+    parser.add_argument('--rows', type=int, default=10)
+    args = parser.parse_args()
+    print_dat_summary(args.path)
+    if args.table:
+        with DatFile(args.path) as dat:
+            print(next(iter(dat.frame(args.table, chunksize=args.rows))))
@@ -0,0 +1,103 @@
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+from Run_metrics import file_size, measure
+
+# Rows rendered per batch and size of the file buffer
+CHUNK_ROWS = 100_000
+WRITE_BUFFER = 1 << 20
+
+
+@dataclass
+class DatTable:
+    """Layout of one table in a .dat file."""
+    name: str                       # Table name, e.g. 'ANALOG'
+    number: int                     # Table number written before the name
+    fields: list                    # Field numbers, e.g. ['0', '1', '77:0']
+    columns: list                   # Frame columns written per record, in field order
+    header: list                    # Lines before the records; '{fields}' is the field line, '{now}' the creation date
+    quoted: tuple = ()              # Columns written between single quotes
+    numbered: tuple = ()            # Columns filled with the running record number
+    constants: dict = field(default_factory=dict)  # Columns written with a fixed value
+
+    def field_line(self):
+        return '\t' + '\t'.join([str(self.number), self.name] + [str(f) for f in self.fields])
+
+
+class DatWriter:
+    """Write the header, batches of records and the ' 0' terminator of a .dat table."""
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        self.records = 0
+        self.file = None
+        self.tmp_path = None
+
+    def __enter__(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # Records go to a temp file renamed on success, a failed run never leaves half a table
+        self.tmp_path = self.path + '.tmp'
+        self.file = open(self.tmp_path, 'w', buffering=WRITE_BUFFER)
+        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        for line in self.table.header:
+            self.file.write(line.replace('{fields}', self.table.field_line()).replace('{now}', now) + '\n')
+        return self
+
+    def write(self, df):
+        """Append the records of a frame, numbering them after the ones already written."""
+        with measure('dat', os.path.basename(self.path), rows_in=len(df)) as step:
+            for start in range(0, len(df), CHUNK_ROWS):
+                chunk = df.iloc[start:start + CHUNK_ROWS]
+                lines = render_records(chunk, self.table, self.records + 1)
+                self.file.write('\n'.join(lines.tolist()))
+                self.file.write('\n')
+                self.records += len(chunk)
+            step['rows_out'] = len(df)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            # Counted with the record writes: flushing the buffer and renaming
+            with measure('dat', os.path.basename(self.path)) as step:
+                self.file.write(" 0")
+                self.file.close()
+                os.replace(self.tmp_path, self.path)
+                step['bytes_written'] = file_size(self.path)
+        else:
+            self.file.close()
+            os.remove(self.tmp_path)
+        return False
+
+
+def render_records(df, table, first_record=1):
+    """Return an array with one tab separated .dat line per row."""
+    line = None
+    for column in table.columns:
+        if column in table.numbered:
+            text = np.arange(first_record, first_record + len(df)).astype(str).astype(object)
+        elif column in table.constants:
+            text = str(table.constants[column])
+        else:
+            text = df[column].astype(str).to_numpy(dtype=object)
+
+        if column in table.quoted:
+            text = "'" + text + "'"
+
+        line = '\t' + text if line is None else line + '\t' + text
+
+    if isinstance(line, str):
+        # Only constant columns, repeat the same line for every row
+        line = np.full(len(df), line, dtype=object)
+    return line
+
+
+def write_dat(path, table, df):
+    """Write a whole frame as a .dat table."""
+    with DatWriter(path, table) as writer:
+        writer.write(df)
+    return writer.records
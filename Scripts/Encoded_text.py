@@ -0,0 +1,41 @@
+import struct
+import zlib
+
+import pandas as pd
+
+# Long text fields of the exports (zone group masks, alarm texts)
+# are written as 'T=HZ;' and the hex of: compressed size and text size as little-endian
+# uint32, then the text compressed with raw deflate.
+HZ_PREFIX = 'T=HZ;'
+
+
+def decode_hz(value):
+    """Plain text of one 'T=HZ;<hex>' value; raises ValueError when it is not valid."""
+    try:
+        data = bytes.fromhex(value[len(HZ_PREFIX):])
+        packed, size = struct.unpack('<II', data[:8])
+        text = zlib.decompress(data[8:8 + packed], -15)
+    except (struct.error, zlib.error) as e:
+        raise ValueError(f"Invalid encoded text {value[:40]}: {e}")
+    if len(text) != size:
+        raise ValueError(f"Invalid encoded text {value[:40]}: {len(text)} bytes instead of {size}")
+    return text.decode('latin-1')
+
+
+def decode_hz_column(values):
+    """Decode the encoded values of a column, plain values are kept as they are.
+
+    Each distinct value is decompressed once and the column is mapped through the result.
+    Returns the decoded column and a mask of the values that could not be decoded, left as None.
+    """
+    text = values.astype('string')
+    encoded = text.str.startswith(HZ_PREFIX).fillna(False).to_numpy()
+    decoded = {}
+    for value in pd.unique(text[encoded]):
+        try:
+            decoded[value] = decode_hz(value)
+        except ValueError:
+            decoded[value] = None
+    result = text.astype(object)
+    result[encoded] = text[encoded].map(decoded)
+    return result, encoded & result.isna().to_numpy()
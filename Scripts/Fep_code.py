@@ -0,0 +1,31 @@
+from Mapping_engine import MAPPING_SPEC, mapped_table_stage
+from Merging_scada import merge_fep_stage
+from Stage_scheduler import run_stages
+
+FEP_CODE = ['Fep_code.py']
+
+# Stage name and template object of the mapping spec, in FEP.DB order. The FEP hosts and
+# RTU_CONTROL have no source in the exports and are not converted.
+FEP_TABLES = [
+    ('channel_group', 'CHANNEL_GROUP'),  # ComLines.CSV
+    ('channel', 'CHANNEL'),              # Rtus.CSV, one record per HOSTNAME<n> in use
+    ('rtu', 'RTU_DATA'),                 # Rtus.CSV
+]
+
+
+def fep_stages(spec_path=MAPPING_SPEC):
+    """Conversion stages of the FEP tables.
+
+    The tables come from the mapping spec: the HOSTNAME<n> column groups of the RTUs
+    are unpivoted by its group rule into channels, and channels and RTUs point to the
+    channel group of their comline.
+    """
+    return [mapped_table_stage(stage_name, table_name, FEP_CODE, spec_path) for stage_name, table_name in FEP_TABLES]
+
+
+def fep_processing(force=False, workers=None):
+    return run_stages(fep_stages() + [merge_fep_stage()], force=force, workers=workers)
+
+
+if __name__ == "__main__":
+    fep_processing()
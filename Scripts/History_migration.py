@@ -0,0 +1,200 @@
+import glob
+import os
+import time
+from functools import partial
+
+import pandas as pd
+
+from Encoded_text import decode_hz_column
+from Input_cache import file_digest
+from Point_index import POINT_INDEX_FILES, PointIndex, point_index_path
+from Run_metrics import file_size, frame_mb, measure, measured_chunks
+from Stage_scheduler import Stage
+
+HISTORY_CODE = ['History_migration.py', 'Encoded_text.py', 'Point_index.py', 'Station_index.py']
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+HISTORY_FOLDER = os.path.join('..', 'History')
+
+# Rows read at a time; memory depends on this, not on the size of the log
+HISTORY_CHUNK_ROWS = 50_000
+
+# Columns migrated from each log. The first time column gives the partition of a row;
+# point and station are the legacy references resolved to the new keys. Encoded columns
+# are migrated as plain text, values that cannot be decoded are kept as exported.
+HISTORY_LOGS = {
+    'Alarms.CSV': {
+        'name': 'alarms',
+        'time': ['Time', 'CapturTime', 'AckedAt', 'ClearedAt'],
+        'point': 'Pid',
+        'station': 'StationPid',
+        'encoded': ['Text'],
+        'columns': ['PKey', 'Time', 'CapturTime', 'AckedAt', 'ClearedAt', 'Pid', 'StationPid', 'Text', 'AlarmSklId',
+                    'ZoneId', 'Priority', 'State', 'Active', 'Cleared', 'AckedBy'],
+    },
+    'SecureLog.CSV': {
+        'name': 'securelog',
+        'time': ['Time', 'CapturTime'],
+        'point': 'PointPid',
+        'station': 'StationPid',
+        'columns': ['PKey', 'Time', 'CapturTime', 'PointPid', 'StationPid', 'Desc', 'ZoneId', 'RecordType',
+                    'UserId', 'AlarmSklId', 'State', 'Priorty', 'Sequence'],
+    },
+}
+# The digest of each monthly file tells when one was edited or deleted after the run
+PARTITION_COLUMNS = ['partition', 'file', 'rows', 'first', 'last', 'digest']
+
+
+def parse_times(values):
+    """Parse '#YYYY-MM-DD HH:MM:SS.fff#' text over a whole column; blanks and bad values give NaT.
+
+    Returns the datetimes and the text without the '#' delimiters, written as is to the
+    partitions so the migrated times keep the precision of the export.
+    """
+    text = values.astype('string').str.strip().str.strip('#')
+    times = pd.to_datetime(text, format='ISO8601', errors='coerce')
+    return times, text.where(times.notna())
+
+
+def history_folder(log):
+    return os.path.join(HISTORY_FOLDER, log['name'])
+
+
+def partitions_path(log):
+    return os.path.join(history_folder(log), f"{log['name']}_partitions.csv")
+
+
+def partition_path(log, partition):
+    return os.path.join(history_folder(log), f"{log['name']}_{partition}.csv")
+
+
+def build_history_frame(df, log, stations, points, counters):
+    """Migrated rows of one chunk with their month, the rows without a valid time left out."""
+    df_new = df[log['columns']].copy()
+    for column in log['time']:
+        times, df_new[column] = parse_times(df[column])
+        if column == log['time'][0]:
+            df_new['Timestamp'] = times
+            # Blank times are unused slots of the log, anything else that does not parse is an error
+            counters['empty'] += int(df[column].isna().sum())
+            counters['invalid'] += int((df[column].notna() & times.isna()).sum())
+    # Months as yyyymm integers, the partition of each row
+    for column in log.get('encoded', []):
+        decoded, undecoded = decode_hz_column(df[column])
+        df_new[column] = decoded.where(~undecoded, df[column])
+        counters['undecoded'] += int(undecoded.sum())
+    df_new['partition'] = (df_new['Timestamp'].dt.year * 100 + df_new['Timestamp'].dt.month).astype('Int64')
+
+    resolved, missing = points.resolve(df[log['point']])
+    counters['unresolved'].update(missing)
+    df_new['Key'] = resolved['Key']
+    df_new['pPoint'] = resolved['record']
+    # Most log entries have no station, only the ones that do are looked up
+    station = df[log['station']]
+    present = station.notna().to_numpy()
+    df_new['pStation'] = 0
+    df_new.loc[present, 'pStation'] = stations.order(station[present]).to_numpy()
+    return df_new[df_new['partition'].notna().to_numpy()]
+
+
+def write_partitions(df_new, log, started):
+    """Append each month of a chunk to its file, return the rows written per partition."""
+    written = {}
+    for partition, df_part in df_new.groupby('partition', sort=True):
+        path = partition_path(log, int(partition))
+        first = path not in started
+        df_part.drop(columns=['Timestamp', 'partition']).to_csv(path, mode='w' if first else 'a', header=first,
+                                                                index=False)
+        summary = started.setdefault(path, {'partition': int(partition), 'file': os.path.basename(path), 'rows': 0,
+                                            'first': df_part['Timestamp'].min(), 'last': df_part['Timestamp'].max()})
+        summary['rows'] += len(df_part)
+        summary['first'] = min(summary['first'], df_part['Timestamp'].min())
+        summary['last'] = max(summary['last'], df_part['Timestamp'].max())
+        written[path] = len(df_part)
+    return written
+
+
+def migrate_history(stations, file_name, chunksize=None):
+    """Stream one log into monthly partitions, return the number of rows migrated or None."""
+    log = HISTORY_LOGS[file_name]
+    csv_path = os.path.join(INPUT_FOLDER, file_name)
+    if not os.path.exists(csv_path):
+        print(f"Error: Could not find the file at {csv_path}")
+        return None
+
+    points = PointIndex.load()
+    folder = history_folder(log)
+    os.makedirs(folder, exist_ok=True)
+    # Partitions of a previous run would mix with this one
+    for path in glob.glob(os.path.join(folder, f"{log['name']}_*.csv")):
+        os.remove(path)
+
+    # Blanks stay missing, any other text (such as 'NA') is kept as written
+    chunks = pd.read_csv(csv_path, usecols=log['columns'], dtype=str, keep_default_na=False, na_values=[''],
+                         chunksize=chunksize or HISTORY_CHUNK_ROWS)
+    started = {}
+    counters = {'rows_in': 0, 'rows_out': 0, 'empty': 0, 'invalid': 0, 'undecoded': 0, 'unresolved': set()}
+    start = time.perf_counter()
+    for df in measured_chunks(chunks, file_name):
+        with measure('transform', log['name'], rows_in=len(df)) as step:
+            df_new = build_history_frame(df, log, stations, points, counters)
+            step['rows_out'] = len(df_new)
+            step['frame_mb'] = frame_mb(df_new)
+        with measure('history', log['name'], rows_in=len(df_new)) as step:
+            sizes = {path: file_size(path) for path in started}
+            written = write_partitions(df_new, log, started)
+            step['rows_out'] = len(df_new)
+            step['bytes_written'] = sum(file_size(path) - sizes.get(path, 0) for path in written)
+        counters['rows_in'] += len(df)
+        counters['rows_out'] += len(df_new)
+    seconds = time.perf_counter() - start
+
+    for path, summary in started.items():
+        summary['digest'] = file_digest(path)
+    df_partitions = pd.DataFrame(sorted(started.values(), key=lambda summary: summary['partition']),
+                                 columns=PARTITION_COLUMNS)
+    df_partitions.to_csv(partitions_path(log), index=False)
+
+    stations.report_unmatched(file_name)
+    if counters['unresolved']:
+        names = sorted(counters['unresolved'])
+        shown = ', '.join(names[:10]) + (f" and {len(names) - 10} more" if len(names) > 10 else '')
+        print(f"Warning: {file_name} references {len(names)} points not found in the point index: {shown}")
+    if counters['undecoded']:
+        print(f"Warning: {counters['undecoded']} encoded texts of {file_name} could not be decoded, kept as exported")
+    if counters['invalid']:
+        print(f"Warning: {counters['invalid']} rows of {file_name} have an invalid Time and were not migrated")
+    rate = counters['rows_in'] / seconds if seconds else 0
+    print(f"History: {counters['rows_out']:,} rows of {file_name} in {len(df_partitions)} monthly files "
+          f"({counters['empty']:,} empty rows skipped), {rate:,.0f} rows/s")
+    return counters['rows_out']
+
+
+def partitions_intact(log):
+    """True if every monthly file listed in the partitions file is there with the digest it was written with."""
+    path = partitions_path(log)
+    if not os.path.exists(path):
+        return False
+    df_partitions = pd.read_csv(path, usecols=['file', 'digest'], dtype=str, keep_default_na=False)
+    for file_name, digest in zip(df_partitions['file'], df_partitions['digest']):
+        partition = os.path.join(history_folder(log), file_name)
+        if not os.path.exists(partition) or file_digest(partition) != digest:
+            print(f"Monthly file {partition} was deleted or edited")
+            return False
+    return True
+
+
+def history_stages(chunksize=None):
+    """One stage per log. They need the StationIndex and the point indexes of the analog and status stages.
+
+    The monthly files change with the data, so they are not outputs: the stage checks
+    them against the digests of its partitions file before it is skipped.
+    """
+    return [
+        Stage(log['name'], partial(migrate_history, file_name=file_name, chunksize=chunksize), deps=('station',),
+              inputs=[os.path.join(INPUT_FOLDER, file_name)]
+              + [point_index_path(point_type) for point_type in POINT_INDEX_FILES],
+              outputs=[partitions_path(log)],
+              code=HISTORY_CODE, check=partial(partitions_intact, log))
+        for file_name, log in HISTORY_LOGS.items()
+    ]
@@ -0,0 +1,289 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from Dat_writer import DatTable, write_dat
+from Input_cache import read_input_csv
+from Merging_scada import merge_iccp_stage
+from Point_index import POINT_INDEX_FILES, PointIndex, point_index_path
+from Scada_code import ANALOG_TABLE, STATUS_TABLE
+from Run_metrics import file_size, frame_mb, measure
+from Stage_scheduler import Stage, run_stages
+
+ICCP_CODE = ['Iccp_code.py', 'Dat_writer.py', 'Input_cache.py', 'Point_index.py', 'Scada_code.py']
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+XREF_PATH = os.path.join('..', 'Xrefs', 'iccp_xref.csv')
+DAT_FOLDER = os.path.join('..', 'Dat_files')
+
+# Members of the data exchange sets
+SET_MEMBER_FILES = ['DESetAnalog.CSV', 'DESetStatus.CSV', 'DESetSetpoint.CSV']
+MEMBER_COLUMNS = ['PKey', 'SetId', 'Pid', 'Alias', 'Type']
+SET_COLUMNS = ['Name', 'Desc', 'ProtoName']
+CONTROL_CENTER_COLUMNS = ['Name', 'HostName', 'ApTitle', 'AeQual', 'Psel', 'Ssel', 'Tsel']
+SERVER_COLUMNS = ['NAME', 'PROTONAME', 'ICDOMAIN', 'ICRMDOMAIN']
+# Control centers each ICCP server talks through, ICLOCNAME<n> on this side and ICREMNAME<n> on the other
+LOCAL_NODE_COLUMNS = [f'ICLOCNAME{n}' for n in range(1, 5)]
+REMOTE_NODE_COLUMNS = [f'ICREMNAME{n}' for n in range(1, 5)]
+# VCC_INFO has 3 control center pointers per side, 6:0-2 and 44:0-2
+CONTROL_CENTER_SLOTS = 3
+
+# Only the ICCP servers and sets are converted, the DNP ones have no object in ICCP.DB
+ICCP_PROTOCOL = 'ICCPSV'
+# The export has no direction column: the set description says where the data goes
+IMPORT_PATTERN = r'\b(?:recvd|received)\s+from\b'
+EXPORT_PATTERN = r'\bsent\s+to\b'
+
+ICCP_INPUTS = ['DEServers.CSV', 'ICCP.CSV', 'DESets.CSV'] + SET_MEMBER_FILES
+
+# Objects and F:I of the ICCP template, numbered in ICCP.DB order. The template has no
+# field 0: the record number leads each record, then one value per field
+VCC_INFO_TABLE = DatTable(
+    name='VCC_INFO', number=1,
+    fields=['6:0', '6:1', '6:2', '7', '12', '16', '18', '35', '44:0', '44:1', '44:2'],
+    columns=['record', 'pLocalControlCenter0', 'pLocalControlCenter1', 'pLocalControlCenter2', 'Local_DomainName',
+             'RemoteDomainName', 'pExpDS', 'pImpDS', 'Name',
+             'pRemoteControlCenter0', 'pRemoteControlCenter1', 'pRemoteControlCenter2'],
+    header=["*", "*", "{fields}",
+            "*\trecord\tpLocalControlCenter6:0\tpLocalControlCenter6:1\tpLocalControlCenter6:2\tLocal_DomainName"
+            "\tRemoteDomainName\tpExpDS\tpImpDS\tName"
+            "\tpRemoteControlCenter44:0\tpRemoteControlCenter44:1\tpRemoteControlCenter44:2", "*"],
+    quoted=('Local_DomainName', 'RemoteDomainName', 'Name'),
+    numbered=('record',))
+
+CONTROL_CENTER_INFO_TABLE = DatTable(
+    name='CONTROL_CENTER_INFO', number=2, fields=['2', '8', '9', '10', '11', '13', '14'],
+    columns=['record', 'Hostname1', 'PSEL', 'SSEL', 'TSEL', 'Name', 'AP_Title', 'AE_Qualifier'],
+    header=["*", "*", "{fields}", "*\trecord\tHostname1\tPSEL\tSSEL\tTSEL\tName\tAP_Title\tAE_Qualifier", "*"],
+    quoted=('Hostname1', 'PSEL', 'SSEL', 'TSEL', 'Name', 'AP_Title', 'AE_Qualifier'),
+    numbered=('record',))
+
+ICCP_EXPORT_DS_TABLE = DatTable(
+    name='ICCP_EXPORT_DS', number=3, fields=['3'],
+    columns=['record', 'Name'],
+    header=["*", "*", "{fields}", "*\trecord\tName", "*"],
+    quoted=('Name',),
+    numbered=('record',))
+
+# Type, Interval and IntegrityInterval (2, 4, 5) are not in the export and keep their ICCP.DB defaults
+ICCP_IMPORT_DS_TABLE = DatTable(
+    name='ICCP_IMPORT_DS', number=4, fields=['6'],
+    columns=['record', 'Name'],
+    header=["*", "*", "{fields}", "*\trecord\tName", "*"],
+    quoted=('Name',),
+    numbered=('record',))
+
+# DB_NUM and FIELD_NUM (2, 4) of the SCADA value are not in the export and are left to ICCP.DB
+ICCP_EXPORT_POINT_TABLE = DatTable(
+    name='ICCP_EXPORT_POINT', number=5, fields=['3', '6', '7', '8', '12', '22'],
+    columns=['record', 'OBJ_NUM', 'REC_KEY', 'REC_NUMBER', 'TYPE', 'pDS', 'Name'],
+    header=["*", "*", "{fields}", "*\trecord\tOBJ_NUM\tREC_KEY\tREC_NUMBER\tTYPE\tpExpDS\tName", "*"],
+    quoted=('REC_KEY', 'Name'),
+    numbered=('record',))
+
+ICCP_IMPORT_POINT_TABLE = DatTable(
+    name='ICCP_IMPORT_POINT', number=6, fields=['3', '6', '7', '8', '12', '22'],
+    columns=['record', 'OBJ_NUM', 'REC_KEY', 'REC_NUMBER', 'TYPE', 'pDS', 'Name'],
+    header=["*", "*", "{fields}", "*\trecord\tOBJ_NUM\tREC_KEY\tREC_NUMBER\tTYPE\tpImpDS\tName", "*"],
+    quoted=('REC_KEY', 'Name'),
+    numbered=('record',))
+
+ICCP_TABLES = {
+    'vcc_info_dat.dat': VCC_INFO_TABLE,
+    'control_center_info_dat.dat': CONTROL_CENTER_INFO_TABLE,
+    'iccp_export_ds_dat.dat': ICCP_EXPORT_DS_TABLE,
+    'iccp_import_ds_dat.dat': ICCP_IMPORT_DS_TABLE,
+    'iccp_export_point_dat.dat': ICCP_EXPORT_POINT_TABLE,
+    'iccp_import_point_dat.dat': ICCP_IMPORT_POINT_TABLE,
+}
+
+# SCADA object of a point, by the type of its "STATION,POINT:TYPE" reference
+SCADA_OBJECTS = {'A': ANALOG_TABLE.number, 'S': STATUS_TABLE.number}
+
+
+def text(values, default=''):
+    return values.astype(object).where(values.notna(), default)
+
+
+def upper_names(values):
+    return values.astype('string').str.strip().str.upper().fillna('')
+
+
+class NameIndex:
+    """Case insensitive hash index from names to the record numbers of a table."""
+
+    def __init__(self, names, records=None):
+        keys = upper_names(names)
+        # First occurrence wins, it is the record the name was first given to
+        unique = ~keys.duplicated().to_numpy()
+        self.index = pd.Index(keys[unique].to_numpy())
+        records = np.arange(1, len(keys) + 1) if records is None else np.asarray(records)
+        self.records = records[unique]
+
+    def records_of(self, names):
+        """Record number of each name, 0 when unknown or blank."""
+        positions = self.index.get_indexer(upper_names(names).to_numpy())
+        return pd.Series(np.where(positions >= 0, self.records[positions], 0), index=names.index)
+
+
+def read_iccp_inputs(input_folder=INPUT_FOLDER):
+    """Read every ICCP input, return them by file name or None when one is missing."""
+    usecols = {
+        'DEServers.CSV': SERVER_COLUMNS + LOCAL_NODE_COLUMNS + REMOTE_NODE_COLUMNS,
+        'ICCP.CSV': CONTROL_CENTER_COLUMNS,
+        'DESets.CSV': SET_COLUMNS,
+    }
+    frames = {}
+    for file_name in ICCP_INPUTS:
+        csv_path = os.path.join(input_folder, file_name)
+        if not os.path.exists(csv_path):
+            print(f"Error: Could not find the file at {csv_path}")
+            return None
+        frames[file_name] = read_input_csv(csv_path, usecols=usecols.get(file_name, MEMBER_COLUMNS))
+    return frames
+
+
+def build_control_centers(df_nodes):
+    return pd.DataFrame({
+        'Hostname1': text(df_nodes['HostName']),
+        'PSEL': text(df_nodes['Psel']),
+        'SSEL': text(df_nodes['Ssel']),
+        'TSEL': text(df_nodes['Tsel']),
+        'Name': text(df_nodes['Name']),
+        'AP_Title': text(df_nodes['ApTitle']),
+        'AE_Qualifier': text(df_nodes['AeQual']),
+    })
+
+
+def split_sets(df_sets):
+    """ICCP sets by direction, from their description; other sets are left out with a warning."""
+    iccp = df_sets[upper_names(df_sets['ProtoName']) == ICCP_PROTOCOL]
+    desc = text(iccp['Desc']).astype(str)
+    imports = desc.str.contains(IMPORT_PATTERN, case=False, regex=True)
+    exports = desc.str.contains(EXPORT_PATTERN, case=False, regex=True) & ~imports
+    unknown = iccp.loc[~imports & ~exports, 'Name']
+    if len(unknown):
+        print(f"Warning: {len(unknown)} ICCP sets have no direction in their description, not converted: "
+              f"{', '.join(unknown)}")
+    return (pd.DataFrame({'Name': text(iccp.loc[exports, 'Name'])}).reset_index(drop=True),
+            pd.DataFrame({'Name': text(iccp.loc[imports, 'Name'])}).reset_index(drop=True))
+
+
+def build_vccs(df_servers, control_centers, export_sets, import_sets):
+    """VCC_INFO of the ICCP servers, pointing to the control centers listed on each side.
+
+    The export does not say which sets a server exchanges, so pExpDS and pImpDS stay 0
+    and the sets are reported as unlinked.
+    """
+    df_servers = df_servers[upper_names(df_servers['PROTONAME']) == ICCP_PROTOCOL].reset_index(drop=True)
+    centers = NameIndex(control_centers['Name'])
+    df_vcc = pd.DataFrame({'Name': text(df_servers['NAME'])})
+    for side, columns in (('Local', LOCAL_NODE_COLUMNS), ('Remote', REMOTE_NODE_COLUMNS)):
+        names = df_servers[columns].apply(upper_names)
+        for slot, column in enumerate(columns[:CONTROL_CENTER_SLOTS]):
+            df_vcc[f'p{side}ControlCenter{slot}'] = centers.records_of(names[column])
+        unknown = names[columns[:CONTROL_CENTER_SLOTS]].stack()
+        unknown = unknown[(unknown != '') & (centers.records_of(unknown) == 0)]
+        if len(unknown):
+            print(f"Warning: {side} control centers not in ICCP.CSV, pointer set to 0: {', '.join(unknown.unique())}")
+        dropped = names[columns[CONTROL_CENTER_SLOTS:]].stack()
+        dropped = dropped[dropped != '']
+        if len(dropped):
+            print(f"Warning: VCC_INFO has {CONTROL_CENTER_SLOTS} {side.lower()} control centers, "
+                  f"not converted: {', '.join(dropped.unique())}")
+    df_vcc['Local_DomainName'] = text(df_servers['ICDOMAIN'])
+    df_vcc['RemoteDomainName'] = text(df_servers['ICRMDOMAIN'])
+    df_vcc['pExpDS'] = 0
+    df_vcc['pImpDS'] = 0
+    unlinked = pd.concat([export_sets['Name'], import_sets['Name']])
+    if len(unlinked):
+        print(f"Warning: {len(unlinked)} ICCP sets are linked to no VCC, pExpDS and pImpDS set to 0: "
+              f"{', '.join(unlinked)}")
+    return df_vcc
+
+
+def build_set_points(frames, data_sets, points):
+    """Members of the sets of one direction: set record and new point key resolved over whole columns."""
+    members = pd.concat([frames[file_name][MEMBER_COLUMNS].assign(File=file_name)
+                         for file_name in SET_MEMBER_FILES], ignore_index=True)
+    sets = NameIndex(data_sets['Name'])
+    members = members[sets.records_of(members['SetId']) > 0].reset_index(drop=True)
+    resolved, unresolved = points.resolve(members['Pid'])
+    if unresolved:
+        shown = ', '.join(unresolved[:10]) + (f" and {len(unresolved) - 10} more" if len(unresolved) > 10 else '')
+        print(f"Warning: {len(unresolved)} set member points not found in the point index: {shown}")
+
+    point_types = upper_names(members['Pid']).str.rsplit(':', n=1).str[-1]
+    alias = text(members['Alias']).astype(str).str.strip()
+    df_points = pd.DataFrame({
+        'OBJ_NUM': point_types.map(SCADA_OBJECTS).fillna(0).astype('int64'),
+        'REC_KEY': text(resolved['Key']),
+        'REC_NUMBER': resolved['record'].fillna(0).astype('int64'),
+        'TYPE': text(members['Type'], 0),
+        'pDS': sets.records_of(members['SetId']),
+        # The ICCP point name is the alias, the PMPA point name when there is none
+        'Name': alias.where(alias != '', text(members['Pid'])),
+    })
+    return members, df_points
+
+
+def process_iccp(input_folder=INPUT_FOLDER):
+    """Convert the ICCP servers, control centers, sets and set members, return the number of set members or None."""
+    frames = read_iccp_inputs(input_folder)
+    if frames is None:
+        return None
+    points = PointIndex.load()
+    rows_in = sum(len(frames[file_name]) for file_name in SET_MEMBER_FILES)
+
+    with measure('transform', 'iccp', rows_in=rows_in) as step:
+        control_centers = build_control_centers(frames['ICCP.CSV'])
+        export_sets, import_sets = split_sets(frames['DESets.CSV'])
+        export_members, export_points = build_set_points(frames, export_sets, points)
+        import_members, import_points = build_set_points(frames, import_sets, points)
+        tables = {
+            'vcc_info_dat.dat': build_vccs(frames['DEServers.CSV'], control_centers, export_sets, import_sets),
+            'control_center_info_dat.dat': control_centers,
+            'iccp_export_ds_dat.dat': export_sets,
+            'iccp_import_ds_dat.dat': import_sets,
+            'iccp_export_point_dat.dat': export_points,
+            'iccp_import_point_dat.dat': import_points,
+        }
+        members = pd.concat([
+            export_members.assign(Object='ICCP_EXPORT_POINT', record=np.arange(1, len(export_members) + 1)),
+            import_members.assign(Object='ICCP_IMPORT_POINT', record=np.arange(1, len(import_members) + 1)),
+        ], ignore_index=True)
+        step['rows_out'] = len(members)
+        step['frame_mb'] = frame_mb(export_points) + frame_mb(import_points)
+
+    os.makedirs(os.path.dirname(XREF_PATH), exist_ok=True)
+    with measure('xref', os.path.basename(XREF_PATH), rows_in=len(members)) as step:
+        members[['File', 'PKey', 'SetId', 'Pid', 'Object', 'record']].to_csv(XREF_PATH, index=False)
+        step['rows_out'] = len(members)
+        step['bytes_written'] = file_size(XREF_PATH)
+    print(f"Xref file generated: {XREF_PATH}")
+
+    for file_name, df in tables.items():
+        dat_path = os.path.join(DAT_FOLDER, file_name)
+        write_dat(dat_path, ICCP_TABLES[file_name], df)
+        print(f".dat file generated: {dat_path}")
+    return len(members)
+
+
+def iccp_stages():
+    """The ICCP stage; it reads the point indexes, so it runs after the analog and status stages."""
+    return [
+        Stage('iccp', process_iccp,
+              inputs=[os.path.join(INPUT_FOLDER, name) for name in ICCP_INPUTS]
+              + [point_index_path(point_type) for point_type in POINT_INDEX_FILES],
+              outputs=[XREF_PATH] + [os.path.join(DAT_FOLDER, name) for name in ICCP_TABLES],
+              code=ICCP_CODE),
+    ]
+
+
+def iccp_processing(force=False, workers=None):
+    return run_stages(iccp_stages() + [merge_iccp_stage()], force=force, workers=workers)
+
+
+if __name__ == "__main__":
+    iccp_processing()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from Run_metrics import frame_mb, measure
+
+CACHE_FOLDER = os.path.join('..', '.cache', 'inputs')
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_BLOCK = 1 << 20
+
+# Frames kept in this process by keep_inputs_in_memory(), for long running sessions like watch mode
+MEMORY_CACHE = {}
+MEMORY_ENABLED = False
+
+
+def file_digest(file_path):
+    """Return the blake2b hex digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(csv_path, read_kwargs):
+    """Build the cache entry name from path, size, mtime, content hash and read options."""
+    import pandas as pd
+    stat = os.stat(csv_path)
+    identity = {
+        'path': os.path.abspath(csv_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': file_digest(csv_path),
+        'options': repr(sorted(read_kwargs.items())),
+        'pandas': pd.__version__,
+    }
+    return hashlib.blake2b(json.dumps(identity, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+
+def keep_inputs_in_memory(enabled=True):
+    """Keep parsed inputs in this process, so unchanged files are not read again."""
+    global MEMORY_ENABLED
+    MEMORY_ENABLED = enabled
+    if not enabled:
+        MEMORY_CACHE.clear()
+
+
+def read_memory_csv(csv_path, cache_folder, max_bytes, **read_kwargs):
+    """read_cached_csv through the in-process cache, keyed by path, size and mtime of the file."""
+    stat = os.stat(csv_path)
+    key = (os.path.abspath(csv_path), repr(sorted(read_kwargs.items())))
+    identity = (stat.st_size, stat.st_mtime_ns)
+    entry = MEMORY_CACHE.get(key)
+    if entry is None or entry[0] != identity:
+        # Replaces the frame of the previous version of the file
+        entry = (identity, read_cached_csv(csv_path, cache_folder, max_bytes, **read_kwargs))
+        MEMORY_CACHE[key] = entry
+    # Callers change the frames they read, the cached one must stay as parsed
+    return entry[1].copy()
+
+
+def read_input_csv(csv_path, cache_folder=CACHE_FOLDER, max_bytes=MAX_CACHE_BYTES, **read_kwargs):
+    """pd.read_csv with a binary copy of the parsed frame cached on disk."""
+    read = read_memory_csv if MEMORY_ENABLED else read_cached_csv
+    with measure('read', os.path.basename(csv_path)) as step:
+        df = read(csv_path, cache_folder, max_bytes, **read_kwargs)
+        step['rows_out'] = len(df)
+        step['frame_mb'] = frame_mb(df)
+    return df
+
+
+def read_cached_csv(csv_path, cache_folder=CACHE_FOLDER, max_bytes=MAX_CACHE_BYTES, **read_kwargs):
+    # Imported on first read: Stage_manifest only needs file_digest and must stay light
+    import pandas as pd
+    if cache_folder is None:
+        return pd.read_csv(csv_path, **read_kwargs)
+
+    cache_path = os.path.join(cache_folder, cache_key(csv_path, read_kwargs) + '.pkl')
+
+    if os.path.exists(cache_path):
+        try:
+            df = pd.read_pickle(cache_path)
+            # Mark the entry as recently used for eviction
+            os.utime(cache_path)
+            return df
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable cache entry {cache_path}: {e}")
+
+    df = pd.read_csv(csv_path, **read_kwargs)
+
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        # Write to a temporary file first so other processes never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=cache_folder, suffix='.tmp')
+        os.close(fd)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+        evict_cache(cache_folder, max_bytes)
+    except OSError as e:
+        print(f"Warning: Could not cache {csv_path}: {e}")
+
+    return df
+
+
+def evict_cache(cache_folder=CACHE_FOLDER, max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_folder):
+        if entry.name.endswith('.pkl'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def clear_cache(cache_folder=CACHE_FOLDER):
+    """Remove every cached input."""
+    if not os.path.isdir(cache_folder):
+        return
+    for entry in os.scandir(cache_folder):
+        if entry.name.endswith(('.pkl', '.tmp')):
+            os.remove(entry.path)
@@ -0,0 +1,116 @@
+import os
+
+import pandas as pd
+
+from Input_cache import read_input_csv
+from Run_metrics import frame_mb, measure
+
+# Columns read from each input and how they are held in memory:
+#   'category'  repetitive strings (stations, units, state sets...)
+#   'int'       integers, downcast to the smallest type that holds them
+#               (left as read when blanks turned them into floats)
+#   'float64'   kept as float64 so the text written to xrefs and .dat files does not change
+#   'str'       plain strings
+INPUT_SCHEMAS = {
+    'StationPoints.CSV': {
+        'PKEY': 'int', 'NAME': 'str', 'DESC': 'str', 'ZONEID': 'category', 'ALRMPRIOR': 'int',
+    },
+    'AnalogPoints.csv': {
+        'PKEY': 'str', 'RTUID': 'category', 'NAME': 'str', 'ENGUNITS': 'category', 'SCALEFACT': 'float64',
+        'STATIONPID': 'category',
+        'PREMGHI': 'int', 'PREMGSEVHI': 'int', 'EMGHI': 'int', 'EMGSEVHI': 'int',
+        'PREMGLO': 'int', 'PREMGSEVLO': 'int', 'EMGLO': 'int', 'EMGSEVLO': 'int',
+    },
+    'StatusPoints.csv': {
+        'PKEY': 'str', 'NAME': 'str', 'STATIONPID': 'category', 'PREFSUFFID': 'category', 'USERTYPEID': 'category',
+        'ZONEID': 'category', 'NORMSTATE': 'int',
+    },
+    'PrefixSuffixes.csv': {
+        'PKey': 'int', 'Name': 'str',
+    },
+    'MeasurementUnits.CSV': {
+        'PKey': 'int', 'Name': 'str', 'Desc': 'str',
+    },
+}
+
+
+# Schema columns an input may lack, read as missing values. Exports without the legacy
+# PKEY of the analog points still convert; their xrefs and point index have no PKEY.
+OPTIONAL_COLUMNS = {
+    'AnalogPoints.csv': ['PKEY'],
+}
+
+
+def read_options(schema):
+    """read_csv arguments of a schema: only its columns, categoricals and floats typed while parsing."""
+    return {
+        'usecols': list(schema),
+        'dtype': {column: kind for column, kind in schema.items() if kind in ('category', 'float64')},
+    }
+
+
+def downcast_integers(df, schema):
+    """Downcast the 'int' columns of a frame that were parsed as integers."""
+    for column, kind in schema.items():
+        if kind == 'int' and column in df and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def input_schema(csv_path):
+    file_name = os.path.basename(csv_path)
+    if file_name not in INPUT_SCHEMAS:
+        raise ValueError(f"No input schema for {file_name}")
+    return INPUT_SCHEMAS[file_name]
+
+
+def optional_columns(csv_path):
+    return OPTIONAL_COLUMNS.get(os.path.basename(csv_path), [])
+
+
+def absent_columns(csv_path, schema):
+    """Columns of the schema that the header of the input does not have."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return [column for column in schema if column not in header]
+
+
+def missing_columns(csv_path, schema, optional=None):
+    """Required columns of the schema that the input does not have, reported as an error."""
+    optional = optional_columns(csv_path) if optional is None else optional
+    missing = [column for column in absent_columns(csv_path, schema) if column not in optional]
+    if missing:
+        print(f"Error: Columns missing in {os.path.basename(csv_path)}: {', '.join(missing)}")
+    return missing
+
+
+def fill_absent(df, absent):
+    """Add the optional columns the input lacks, as missing values."""
+    for column in absent:
+        df[column] = pd.NA
+    return df
+
+
+def read_typed_csv(csv_path, schema=None, optional=None):
+    """Read an input with only the columns and types of its schema, or return None if it lacks required ones."""
+    schema = schema or input_schema(csv_path)
+    if missing_columns(csv_path, schema, optional):
+        return None
+    absent = absent_columns(csv_path, schema)
+    df = read_input_csv(csv_path, **read_options({column: kind for column, kind in schema.items() if column not in absent}))
+    # Footprint of the frame the conversion keeps, after downcasting
+    with measure('schema', os.path.basename(csv_path), rows_in=len(df)) as step:
+        df = fill_absent(downcast_integers(df, schema), absent)
+        step['rows_out'] = len(df)
+        step['frame_mb'] = frame_mb(df)
+    return df
+
+
+def read_typed_chunks(csv_path, chunksize, schema=None, optional=None):
+    """Return an iterator over the chunks of an input read with its schema, or None if it lacks required columns."""
+    schema = schema or input_schema(csv_path)
+    if missing_columns(csv_path, schema, optional):
+        return None
+    absent = absent_columns(csv_path, schema)
+    options = read_options({column: kind for column, kind in schema.items() if column not in absent})
+    return (fill_absent(downcast_integers(df, schema), absent)
+            for df in pd.read_csv(csv_path, chunksize=chunksize, **options))
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import sys
+from functools import partial
+
+import pandas as pd
+
+from Input_schema import input_schema, missing_columns, read_typed_csv
+from Run_metrics import REPORT_FOLDER, measure
+from Stage_scheduler import Stage
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+VALIDATION_REPORT = os.path.join(REPORT_FOLDER, 'validation_report.json')
+VALIDATION_VIOLATIONS = os.path.join(REPORT_FOLDER, 'validation_violations.csv')
+
+VALIDATED_FILES = ['StationPoints.CSV', 'AnalogPoints.csv', 'StatusPoints.csv',
+                   'PrefixSuffixes.csv', 'MeasurementUnits.CSV']
+VIOLATION_COLUMNS = ['check', 'severity', 'file', 'row', 'column', 'value']
+# Distinct offending values listed per check in the summary
+EXAMPLES = 10
+
+
+def blank_mask(values):
+    return (values.isna() | (values.astype(str).str.strip() == '')).to_numpy()
+
+
+def unknown_mask(values, known):
+    """Non blank values missing from known (upper case names), case insensitive.
+
+    Categorical columns are checked once per category instead of once per row.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = pd.Series(values.cat.categories)
+        unknown = categories[~categories.astype(str).str.upper().isin(known)]
+        return values.isin(unknown).to_numpy() & ~blank_mask(values)
+    return ~values.astype(str).str.upper().isin(known).to_numpy() & ~blank_mask(values)
+
+
+def duplicate_mask(df, columns):
+    """Rows repeating the (case insensitive) columns of an earlier row."""
+    keys = df[columns].astype(str).apply(lambda column: column.str.upper())
+    return keys.duplicated().to_numpy()
+
+
+def violation_rows(check, severity, file_name, df, column, mask):
+    """Violations of one check, with the 1-based data row of the file."""
+    rows = pd.DataFrame({
+        'check': check,
+        'severity': severity,
+        'file': file_name,
+        'row': df.index[mask] + 1,
+        'column': column,
+        'value': df[column][mask].astype(object).fillna('').astype(str).to_numpy(),
+    })
+    return rows
+
+
+def validate_inputs(input_folder=INPUT_FOLDER):
+    """Run every referential check over the inputs, return the violations frame."""
+    frames = {}
+    found = []
+    for file_name in VALIDATED_FILES:
+        path = os.path.join(input_folder, file_name)
+        if not os.path.exists(path):
+            found.append(pd.DataFrame([['missing_file', 'error', file_name, 0, '', path]], columns=VIOLATION_COLUMNS))
+            continue
+        missing = missing_columns(path, input_schema(path))
+        if missing:
+            found.append(pd.DataFrame([['missing_column', 'error', file_name, 0, column, column] for column in missing],
+                                      columns=VIOLATION_COLUMNS))
+            continue
+        frames[file_name] = read_typed_csv(path)
+
+    with measure('transform', 'validation') as step:
+        stations = frames.get('StationPoints.CSV')
+        analog = frames.get('AnalogPoints.csv')
+        status = frames.get('StatusPoints.csv')
+        states = frames.get('PrefixSuffixes.csv')
+        units = frames.get('MeasurementUnits.CSV')
+
+        checks = []
+        if stations is not None:
+            station_names = set(stations['NAME'].astype(str).str.upper())
+            # Later duplicates replace earlier ones in the StationIndex
+            checks.append(('duplicate_station', 'warning', 'StationPoints.CSV', stations, 'NAME',
+                           duplicate_mask(stations, ['NAME'])))
+            for file_name, df in (('AnalogPoints.csv', analog), ('StatusPoints.csv', status)):
+                if df is not None:
+                    # Unknown or blank stations are written with pStation 0
+                    checks.append(('unknown_station', 'error', file_name, df, 'STATIONPID',
+                                   unknown_mask(df['STATIONPID'], station_names) | blank_mask(df['STATIONPID'])))
+        if analog is not None:
+            # A blank unit is written as the text 'nan'
+            checks.append(('missing_unit', 'error', 'AnalogPoints.csv', analog, 'ENGUNITS', blank_mask(analog['ENGUNITS'])))
+            if units is not None:
+                checks.append(('unknown_unit', 'warning', 'AnalogPoints.csv', analog, 'ENGUNITS',
+                               unknown_mask(analog['ENGUNITS'], set(units['Name'].astype(str).str.upper()))))
+        if status is not None:
+            checks.append(('missing_states', 'error', 'StatusPoints.csv', status, 'PREFSUFFID',
+                           blank_mask(status['PREFSUFFID'])))
+            if states is not None:
+                # Unknown state sets are written with pStates 200
+                checks.append(('unknown_states', 'error', 'StatusPoints.csv', status, 'PREFSUFFID',
+                               unknown_mask(status['PREFSUFFID'], set(states['Name'].astype(str).str.upper()))))
+        for file_name, df in (('AnalogPoints.csv', analog), ('StatusPoints.csv', status)):
+            if df is not None:
+                checks.append(('duplicate_point', 'warning', file_name, df, 'NAME',
+                               duplicate_mask(df, ['STATIONPID', 'NAME'])))
+
+        for check, severity, file_name, df, column, mask in checks:
+            if mask.any():
+                found.append(violation_rows(check, severity, file_name, df, column, mask))
+        violations = pd.concat(found, ignore_index=True) if found else pd.DataFrame(columns=VIOLATION_COLUMNS)
+        step['rows_out'] = len(violations)
+    return violations
+
+
+def summarize_violations(violations):
+    """Counts and example values per check."""
+    checks = {}
+    for (check, severity, file_name), rows in violations.groupby(['check', 'severity', 'file'], sort=False):
+        checks[f'{file_name}:{check}'] = {
+            'check': check,
+            'severity': severity,
+            'file': file_name,
+            'count': len(rows),
+            'examples': rows['value'].drop_duplicates().head(EXAMPLES).tolist(),
+        }
+    return {
+        'errors': int((violations['severity'] == 'error').sum()),
+        'warnings': int((violations['severity'] == 'warning').sum()),
+        'checks': checks,
+    }
+
+
+def write_validation_report(violations, summary, report_path=VALIDATION_REPORT,
+                            violations_path=VALIDATION_VIOLATIONS):
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    violations.to_csv(violations_path, index=False)
+    tmp_path = report_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(summary, violations_file=violations_path), f, indent=2)
+    os.replace(tmp_path, report_path)
+
+
+def print_validation_summary(summary):
+    for name, info in summary['checks'].items():
+        examples = ', '.join(str(value) or '<blank>' for value in info['examples'][:5])
+        print(f"{info['severity'].capitalize()}: {info['count']} rows of {info['file']} fail {info['check']}: {examples}")
+    print(f"Validation: {summary['errors']} errors, {summary['warnings']} warnings")
+
+
+def run_validation(fail_fast=False, input_folder=INPUT_FOLDER):
+    """Validate the inputs and write the report; with fail_fast, return None when there are errors."""
+    violations = validate_inputs(input_folder)
+    summary = summarize_violations(violations)
+    write_validation_report(violations, summary)
+    print_validation_summary(summary)
+    if fail_fast and summary['errors']:
+        print(f"Error: Inputs failed validation, see {VALIDATION_REPORT}")
+        return None
+    return summary
+
+
+def exit_status(summary):
+    """Exit status of a validation run: 1 when it stopped or found errors, else 0."""
+    return 1 if summary is None or summary['errors'] else 0
+
+
+def validation_stage(fail_fast=False):
+    """Stage validating the inputs; the conversion stages are run after it.
+
+    It has no code list, so it is never skipped: a run that only warned must not hide
+    the errors from a later fail fast run. Inputs come from the cache, so it stays cheap.
+    """
+    return Stage('validate', partial(run_validation, fail_fast=fail_fast),
+                 inputs=[os.path.join(INPUT_FOLDER, name) for name in VALIDATED_FILES],
+                 outputs=[VALIDATION_REPORT, VALIDATION_VIOLATIONS])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the references between the PMPA exports")
+    parser.add_argument('--fail-fast', action='store_true',
+                        help="Report the errors as a fail fast conversion would; errors give status 1 either way")
+    args = parser.parse_args()
+    sys.exit(exit_status(run_validation(fail_fast=args.fail_fast)))
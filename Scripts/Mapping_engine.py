@@ -0,0 +1,443 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass, field
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from Dat_writer import DatTable, write_dat
+from Input_cache import file_digest, read_input_csv
+from Mapping_template import MAPPING_TEMPLATE, field_matches, read_template
+from Point_index import POINT_INDEX_FILES, PointIndex, point_index_path
+from Point_keys import KeyAllocator
+from Run_metrics import file_size, measure
+from Stage_scheduler import Stage
+
+# Conversion rules of the mapping: one row per target field, its F:I taken from the template
+MAPPING_SPEC = os.path.join('..', 'Mappings', 'PMPA_DB_Mapping.csv')
+PLAN_CACHE_FOLDER = os.path.join('..', '.cache', 'mapping_plans')
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+XREF_FOLDER = os.path.join('..', 'Xrefs')
+DAT_FOLDER = os.path.join('..', 'Dat_files')
+
+# Bump when compiled plans change shape, so cached plans are rebuilt
+ENGINE_VERSION = 5
+
+ENGINE_CODE = ['Mapping_engine.py', 'Mapping_template.py', 'Dat_writer.py', 'Input_cache.py', 'Point_keys.py', 'Point_index.py']
+
+# Table level settings, given on the first row of each Object
+TABLE_SETTINGS = ['Number', 'File', 'Xref', 'Output']
+
+# record:   running record number; without an F:I it is the value leading each record, not a field
+# column:   copy of the Source column
+# constant: Value written on every record
+# lookup:   Source mapped through another input, Value is 'File|KeyColumn|ValueColumn[|default=D][|offset=N]'
+#           (case insensitive on the key, ValueColumn '#row' is the 1-based row of the lookup file)
+# blank:    Value 'IfBlank|Otherwise' depending on whether Source is empty
+# key:      XXYYYZZZ key, Value 'TypeColumn|StationColumn' naming earlier target columns
+# point:    "STATION,POINT:TYPE" reference resolved through the point index, Value 'Key' (default) or 'record'
+#           (unknown or blank references get the default option, 0 if not given)
+# group:    one record per input row and number in Value 'first..last[|skip=V][|also=T]' whose Source, or
+#           the column of template T, is not blank (nor V); the target column gets the number. Sources of
+#           the other rules may then hold '{n}', e.g. 'HOSTNAME{n}', to read the column of that number;
+#           without an F:I the number only drives the unpivot and is not written
+# A structure written at an index, e.g. InputKey at 5:0, is the target column 'InputKey5:0', so several
+# indexes of the same structure can be mapped
+# column, lookup and point rules accept a default=D option for blank values
+RULES = ('record', 'column', 'constant', 'lookup', 'blank', 'key', 'point', 'group')
+GROUP_PLACEHOLDER = '{n}'
+
+
+@dataclass
+class ColumnStep:
+    """How one target column is produced."""
+    column: str
+    rule: str
+    source: str = None
+    args: list = field(default_factory=list)
+    options: dict = field(default_factory=dict)
+
+
+@dataclass
+class TablePlan:
+    """Compiled conversion of one input file into one .dat table."""
+    name: str
+    input_file: str
+    xref_file: str
+    output_file: str
+    usecols: list
+    steps: list
+    table: DatTable
+
+    @property
+    def group(self):
+        return next((step for step in self.steps if step.rule == 'group'), None)
+
+    def input_paths(self, input_folder=INPUT_FOLDER):
+        """Every input file the plan reads, including lookup files and the point indexes."""
+        files = [self.input_file]
+        files += [step.args[0] for step in self.steps if step.rule == 'lookup' and step.args[0] not in files]
+        paths = [os.path.join(input_folder, name) for name in files]
+        if any(step.rule == 'point' for step in self.steps):
+            # Written by the analog and status stages, so the scheduler runs them first
+            paths += [point_index_path(point_type) for point_type in POINT_INDEX_FILES]
+        return paths
+
+    def read_columns(self, header):
+        """Input columns to read: the sources, with '{n}' replaced by every group number found in header."""
+        if self.group is None:
+            return self.usecols
+        numbers = group_numbers(self.group)
+        columns = []
+        for source in self.usecols:
+            names = [source.replace(GROUP_PLACEHOLDER, str(n)) for n in numbers] if GROUP_PLACEHOLDER in source else [source]
+            columns += [name for name in names if name in header and name not in columns]
+        return columns
+
+    def output_paths(self, xref_folder=XREF_FOLDER, dat_folder=DAT_FOLDER):
+        outputs = [os.path.join(dat_folder, self.output_file)]
+        if self.xref_file:
+            outputs.insert(0, os.path.join(xref_folder, self.xref_file))
+        return outputs
+
+
+def read_spec(spec_path=MAPPING_SPEC):
+    """Read the mapping spec from its CSV export, or from a 'Mapping' sheet of an xlsx workbook."""
+    if spec_path.lower().endswith('.xlsx'):
+        try:
+            return pd.read_excel(spec_path, sheet_name='Mapping', dtype=str).fillna('')
+        except ImportError:
+            raise ValueError("Reading the mapping from .xlsx needs openpyxl, use the CSV export instead")
+    return pd.read_csv(spec_path, dtype=str, keep_default_na=False)
+
+
+def parse_args(value):
+    """Split 'a|b|name=c' into positional arguments and options."""
+    args, options = [], {}
+    for part in value.split('|') if value else []:
+        name, sep, option = part.partition('=')
+        if sep:
+            options[name.strip()] = option.strip()
+        else:
+            args.append(part.strip())
+    return args, options
+
+
+def template_field(template, objects, name, column, field, rule):
+    """F:I of a spec row: the template one, or the spec one when it is an index of the template range.
+
+    Structures the template does not have keep the F:I given in the spec, with a warning
+    when their object is in the template. Returns '' for a record rule without F:I, the
+    value leading each record, and for a group rule without F:I, which is not written.
+    """
+    expected = template.get((name.upper(), column.upper()))
+    if expected is None:
+        if field:
+            if name.upper() in objects:
+                print(f"Warning: Mapping {name}.{column} is not in the template, using F:I {field} of the spec")
+            return field
+        if rule in ('record', 'group'):
+            return ''
+        raise ValueError(f"Mapping {name}.{column}: not in the template and no F:I in the spec")
+    if not field:
+        field = expected
+    elif not field_matches(field, expected):
+        raise ValueError(f"Mapping {name}.{column}: F:I {field} does not match {expected} in the template")
+    if '-' in field:
+        raise ValueError(f"Mapping {name}.{column}: F:I {field} is a range, give one index of it in the spec")
+    if not field and rule != 'record':
+        raise ValueError(f"Mapping {name}.{column}: the template gives no F:I")
+    return field
+
+
+def compile_spec(spec, template):
+    """Compile the spec rows of every table into TablePlans, with the F:I of the template."""
+    # Same headers as the xlsx template, renamed to attribute friendly names
+    spec = spec.rename(columns={'F:I': 'Field', 'Structure Name': 'Structure'})
+    if 'Field' not in spec:
+        spec['Field'] = ''
+    spec[TABLE_SETTINGS] = spec[TABLE_SETTINGS].mask(spec[TABLE_SETTINGS] == '')
+    spec[TABLE_SETTINGS] = spec.groupby('Object', sort=False)[TABLE_SETTINGS].ffill().fillna('')
+
+    plans = {}
+    objects = {obj for obj, _ in template}
+    for name, rows in spec.groupby('Object', sort=False):
+        first = rows.iloc[0]
+        if name.upper() not in objects:
+            print(f"Warning: Mapping {name} is not in the template, using the F:I of the spec")
+        steps, fields, columns, quoted, numbered, constants, usecols = [], [], [], [], [], {}, []
+
+        for row in rows.itertuples(index=False):
+            structure = row.Structure.strip()
+            column = structure
+            rule = row.Rule.strip().lower()
+            if rule not in RULES:
+                raise ValueError(f"Mapping {name}.{column}: unknown rule '{row.Rule}'")
+            args, options = parse_args(row.Value)
+            source = row.Source.strip() or None
+            if rule in ('column', 'lookup', 'blank') and not source:
+                raise ValueError(f"Mapping {name}.{column}: rule '{rule}' needs a Source column")
+            if rule == 'lookup' and len(args) != 3:
+                raise ValueError(f"Mapping {name}.{column}: lookup Value must be 'File|KeyColumn|ValueColumn'")
+            if rule in ('blank', 'key') and len(args) != 2:
+                raise ValueError(f"Mapping {name}.{column}: rule '{rule}' needs two '|' separated values")
+            if rule == 'point' and args and args[0] not in ('Key', 'record'):
+                raise ValueError(f"Mapping {name}.{column}: point Value must be 'Key' or 'record'")
+            if rule == 'group' and (not source or GROUP_PLACEHOLDER not in source or len(args) != 1 or '..' not in args[0]):
+                raise ValueError(f"Mapping {name}.{column}: group needs a Source with '{{n}}' and a Value 'first..last'")
+            if rule == 'group' and options.get('also') and GROUP_PLACEHOLDER not in options['also']:
+                raise ValueError(f"Mapping {name}.{column}: group option also= needs a column template with '{{n}}'")
+            if rule in ('column', 'lookup', 'blank', 'point') and source and GROUP_PLACEHOLDER in source \
+                    and not any(step.rule == 'group' for step in steps):
+                raise ValueError(f"Mapping {name}.{column}: '{{n}}' in Source needs an earlier group rule")
+
+            field_number = template_field(template, objects, name, structure, row.Field.strip(), rule)
+            if ':' in field_number:
+                column = structure + field_number
+            if field_number:
+                fields.append(field_number)
+            if field_number or rule == 'record':
+                columns.append(column)
+            if row.Quoted.strip().upper() in ('Y', 'YES', '1', 'TRUE'):
+                quoted.append(column)
+            if rule == 'record':
+                numbered.append(column)
+            elif rule == 'constant':
+                constants[column] = row.Value
+            else:
+                steps.append(ColumnStep(column, rule, source, args, options))
+            if source and source not in usecols:
+                usecols.append(source)
+            if rule == 'group' and options.get('also') and options['also'] not in usecols:
+                usecols.append(options['also'])
+
+        table = DatTable(
+            name=name, number=int(first.Number), fields=fields, columns=columns,
+            header=["*", "*", "{fields}", "*\t" + "\t".join(columns), "*"],
+            quoted=tuple(quoted), numbered=tuple(numbered), constants=constants)
+        plans[name] = TablePlan(name, first.File, first.Xref, first.Output, usecols, steps, table)
+    return plans
+
+
+def load_plans(spec_path=MAPPING_SPEC, cache_folder=PLAN_CACHE_FOLDER, template_path=MAPPING_TEMPLATE):
+    """Return the compiled plans of the spec, reusing the cached compilation when spec and template are unchanged."""
+    digest = hashlib.blake2b(f"{ENGINE_VERSION}:{file_digest(spec_path)}:{file_digest(template_path)}".encode(),
+                             digest_size=20).hexdigest()
+    cache_path = os.path.join(cache_folder, digest + '.pkl')
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable plan cache {cache_path}: {e}")
+
+    plans = compile_spec(read_spec(spec_path), read_template(template_path))
+
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(plans, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not cache the compiled mapping: {e}")
+    return plans
+
+
+def restore_integers(values):
+    """Integers read as floats because of blanks, back as integers with missing values."""
+    if pd.api.types.is_float_dtype(values):
+        integral = values.dropna()
+        if (integral == integral.round()).all():
+            return values.astype('Int64')
+    return values
+
+
+def key_text(values):
+    """Upper case text of lookup keys; integers read as floats because of blanks lose their '.0'."""
+    return restore_integers(values).astype(str).str.upper()
+
+
+def lookup_values(step, values, input_folder, lookups):
+    """Map a column through a lookup file with one hash index probe."""
+    file_name, key_column, value_column = step.args
+    name = (file_name, key_column, value_column)
+    if name not in lookups:
+        df = read_input_csv(os.path.join(input_folder, file_name))
+        mapped = np.arange(1, len(df) + 1) if value_column == '#row' else df[value_column].to_numpy()
+        keys = key_text(df[key_column])
+        # Last occurrence wins on duplicated keys, as with a dict built in file order
+        unique = ~keys.duplicated(keep='last').to_numpy()
+        lookups[name] = (pd.Index(keys[unique]), mapped[unique])
+    index, mapped = lookups[name]
+
+    # Each distinct value is turned into its key text once
+    codes, uniques = pd.factorize(values)
+    unique_positions = index.get_indexer(key_text(pd.Series(uniques, dtype=values.dtype)))
+    positions = np.append(unique_positions, -1)[codes]
+    found = positions >= 0
+    # Blank values take the default without a warning
+    missing = int((~found & values.notna().to_numpy()).sum())
+    if missing:
+        print(f"Warning: {missing} values of {step.source} not found in {file_name}.{key_column}")
+
+    default = step.options.get('default', 0)
+    result = pd.Series(np.where(found, mapped[positions], default), index=values.index)
+    if 'offset' in step.options:
+        result = pd.to_numeric(result) + int(step.options['offset'])
+    return result
+
+
+def group_numbers(step):
+    first, last = step.args[0].split('..')
+    return range(int(first), int(last) + 1)
+
+
+def expand_groups(plan, df):
+    """Unpivot the numbered column groups: one row per input row and group number in use.
+
+    Each number takes its columns under the '{n}' template name (blank when the input
+    has no such column), so the steps read one column per template. Rows stay in input
+    order, numbers ascending within a row.
+    """
+    group = plan.group
+    templates = [source for source in plan.usecols if GROUP_PLACEHOLDER in source]
+    fixed = [column for column in plan.usecols if GROUP_PLACEHOLDER not in column and column in df]
+    parts = []
+    for n in group_numbers(group):
+        part = df[fixed].copy()
+        for template in templates:
+            name = template.replace(GROUP_PLACEHOLDER, str(n))
+            # Object blanks, so a missing column does not turn the integers of the others into floats
+            if name not in df:
+                part[template] = pd.Series(None, index=part.index, dtype=object)
+            else:
+                # Rows without a value in this group are dropped, the integers must not stay floats
+                part[template] = restore_integers(df[name]) if df[name].hasnans else df[name]
+        used = pd.Series(False, index=part.index)
+        for template in [group.source] + ([group.options['also']] if group.options.get('also') else []):
+            source = part[template]
+            if pd.api.types.is_numeric_dtype(source):
+                # Numbers are compared as numbers, without building their text
+                in_use = source.notna()
+                if 'skip' in group.options:
+                    in_use &= source != float(group.options['skip'])
+            else:
+                # Blank and skipped texts found among the distinct values, then matched by hash
+                values = pd.Series(source.dropna().unique())
+                text = values.astype(str).str.strip()
+                unused = values[(text == '') | (text == group.options.get('skip', ''))]
+                in_use = source.notna() & ~source.isin(unused)
+            used |= in_use
+        part = part[used]
+        part[group.column] = n
+        parts.append(part)
+    # Numbers no row uses would only change the dtypes of the concatenation
+    expanded = pd.concat([part for part in parts if len(part)] or parts[:1])
+    return expanded.sort_index(kind='stable').reset_index(drop=True)
+
+
+def resolve_points(steps, df, lookups):
+    """Resolve the references of every point step with a single index lookup."""
+    if 'points' not in lookups:
+        lookups['points'] = PointIndex.load()
+    references = pd.concat([df[step.source] for step in steps], ignore_index=True)
+    resolved, unresolved = lookups['points'].resolve(references)
+    if unresolved:
+        shown = ', '.join(unresolved[:10]) + (f" and {len(unresolved) - 10} more" if len(unresolved) > 10 else '')
+        print(f"Warning: {len(unresolved)} point references not found in the point index: {shown}")
+
+    columns = {}
+    for position, step in enumerate(steps):
+        part = resolved.iloc[position * len(df):(position + 1) * len(df)]
+        value = step.args[0] if step.args else 'Key'
+        default = step.options.get('default', 0)
+        columns[step.column] = pd.Series(part[value].astype(object).where(part[value].notna(), default).to_numpy(),
+                                         index=df.index)
+    return columns
+
+
+def build_frame(plan, df, input_folder=INPUT_FOLDER, allocator=None):
+    """Apply the column steps of a plan to an input frame, whole columns at a time."""
+    out = pd.DataFrame(index=df.index)
+    lookups = {}
+    point_steps = [step for step in plan.steps if step.rule == 'point']
+    points = resolve_points(point_steps, df, lookups) if point_steps else {}
+    # Keys are built last, from target columns that may come after them in field order
+    for step in sorted(plan.steps, key=lambda step: step.rule == 'key'):
+        if step.rule == 'column':
+            out[step.column] = df[step.source]
+            if out[step.column].hasnans:
+                # A port or address column with blanks is written without '.0'
+                out[step.column] = restore_integers(out[step.column])
+            if 'default' in step.options:
+                out[step.column] = out[step.column].astype(object).where(out[step.column].notna(), step.options['default'])
+        elif step.rule == 'group':
+            out[step.column] = df[step.column]
+        elif step.rule == 'point':
+            out[step.column] = points[step.column]
+        elif step.rule == 'lookup':
+            out[step.column] = lookup_values(step, df[step.source], input_folder, lookups)
+        elif step.rule == 'blank':
+            source = df[step.source]
+            blank = source.isna() | (source.astype(str).str.strip() == '')
+            out[step.column] = np.where(blank, step.args[0], step.args[1])
+        elif step.rule == 'key':
+            allocator = allocator or KeyAllocator()
+            point_type, station = (out[name] if name in out else pd.Series(plan.table.constants[name], index=out.index)
+                                   for name in step.args)
+            out[step.column] = allocator.allocate(point_type.astype('int64'), station.astype('int64'))
+    return out
+
+
+def run_plan(plan, input_folder=INPUT_FOLDER, xref_folder=XREF_FOLDER, dat_folder=DAT_FOLDER):
+    """Convert one table with its compiled plan, return the number of records or None."""
+    csv_path = os.path.join(input_folder, plan.input_file)
+    if not os.path.exists(csv_path):
+        print(f"Error: Could not find the file at {csv_path}")
+        return None
+
+    usecols = plan.usecols
+    if plan.group is not None:
+        usecols = plan.read_columns(pd.read_csv(csv_path, nrows=0).columns)
+    df = read_input_csv(csv_path, usecols=usecols) if usecols else read_input_csv(csv_path)
+
+    if plan.xref_file:
+        os.makedirs(xref_folder, exist_ok=True)
+        xref_path = os.path.join(xref_folder, plan.xref_file)
+        with measure('xref', plan.xref_file, rows_in=len(df)) as step:
+            df[usecols].to_csv(xref_path, index=False)
+            step['rows_out'] = len(df)
+            step['bytes_written'] = file_size(xref_path)
+        print(f"Xref file generated: {xref_path}")
+
+    try:
+        with measure('transform', plan.name, rows_in=len(df)) as step:
+            if plan.group is not None:
+                df = expand_groups(plan, df)
+            frame = build_frame(plan, df, input_folder)
+            step['rows_out'] = len(frame)
+    except (KeyError, ValueError) as e:
+        print(f"Error: Mapping {plan.name} failed: {e}")
+        return None
+
+    dat_path = os.path.join(dat_folder, plan.output_file)
+    write_dat(dat_path, plan.table, frame)
+    print(f".dat file generated: {dat_path}")
+    return len(frame)
+
+
+def run_mapped_table(name, spec_path=MAPPING_SPEC):
+    return run_plan(load_plans(spec_path)[name])
+
+
+def mapped_table_stage(stage_name, table_name, code, spec_path=MAPPING_SPEC):
+    """Stage converting a table of the mapping spec."""
+    plan = load_plans(spec_path)[table_name]
+    return Stage(stage_name, partial(run_mapped_table, table_name, spec_path),
+                 inputs=plan.input_paths() + [spec_path, MAPPING_TEMPLATE],
+                 outputs=plan.output_paths(),
+                 code=code + ENGINE_CODE)
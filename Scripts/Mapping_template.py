@@ -0,0 +1,66 @@
+import os
+import re
+
+import pandas as pd
+
+# Workbook the customer data is mapped in: F:I and Structure Name of every object field
+MAPPING_TEMPLATE = os.path.join('..', 'Mappings', 'PMPA_DB_Mapping_Template.xlsx')
+# Databases the conversion writes
+TEMPLATE_SHEETS = ['SCADA', 'FEP', 'ICCP', 'OpenCalc']
+
+# '3', '77:0' or a range of indexes '2:0-127'
+FIELD_PATTERN = re.compile(r'^(\d+)(?::(\d+)(?:-(\d+))?)?$')
+# Array structures of the OpenCalc sheet are named 'InputKey {100}', with a plain F:I
+ARRAY_PATTERN = re.compile(r'^(.*?)\s*\{(\d+)\}$')
+
+
+def field_text(value):
+    """F:I cell as text: 3.0 read from the workbook is '3', blanks and 'N/A' are ''."""
+    if isinstance(value, float):
+        return '' if pd.isna(value) else f"{value:g}"
+    text = str(value).strip()
+    return '' if text.upper() == 'N/A' else text
+
+
+def read_template(template_path=MAPPING_TEMPLATE, sheets=TEMPLATE_SHEETS):
+    """Return {(OBJECT, STRUCTURE NAME): F:I} of the template sheets, names in upper case.
+
+    Each sheet has a header row with Object, F:I and Structure Name somewhere below its title.
+    Required objects are marked with a trailing '*', which is not part of the name.
+    An array 'Name {N}' at F:I 5 is read as Name at 5:0-(N-1).
+    """
+    try:
+        book = pd.read_excel(template_path, sheet_name=sheets, header=None, dtype=object)
+    except ImportError:
+        raise ValueError("Reading the mapping template needs openpyxl")
+
+    fields = {}
+    for sheet, df in book.items():
+        header = next((i for i, row in df.iterrows() if {'Object', 'F:I', 'Structure Name'} <= set(row.dropna())), None)
+        if header is None:
+            raise ValueError(f"Template sheet {sheet} has no Object, F:I and Structure Name header")
+        columns = {name: position for position, name in df.iloc[header].items() if isinstance(name, str)}
+        for row in df.iloc[header + 1:].itertuples(index=False):
+            obj, number, structure = (row[columns[name]] for name in ('Object', 'F:I', 'Structure Name'))
+            if pd.isna(obj) or pd.isna(structure) or not str(structure).strip():
+                continue
+            structure, number = str(structure).strip(), field_text(number)
+            array = ARRAY_PATTERN.match(structure)
+            if array:
+                structure = array.group(1)
+                if number.isdigit():
+                    number = f"{number}:0-{int(array.group(2)) - 1}"
+            fields.setdefault((str(obj).strip().rstrip('*').upper(), structure.upper()), number)
+    return fields
+
+
+def field_matches(field, template_field):
+    """True if a spec F:I is the template one, or one index of its range."""
+    if field == template_field:
+        return True
+    spec, template = FIELD_PATTERN.match(field), FIELD_PATTERN.match(template_field)
+    if not spec or not template or spec.group(1) != template.group(1) or spec.group(2) is None or spec.group(3):
+        return False
+    first = template.group(2)
+    last = template.group(3) or first
+    return first is not None and int(first) <= int(spec.group(2)) <= int(last)
@@ -1,60 +1,256 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
 from datetime import datetime
+from functools import partial
+from Run_metrics import measure
+from Stage_scheduler import Stage, run_stages
 
-def read_file_content(file_path):
-    """Read and return the content of a file."""
-    with open(file_path, 'r') as file:
-        return file.read()
+MERGE_CODE = ['Merging_scada.py']
 
-def compile_files(input_folder, file_names):
-    """Compile content from multiple files."""
-    compiled_content = []
+# Bytes copied per call when the kernel copy is not available
+COPY_BUFFER = 1 << 20
+
+def find_files(input_folder, file_names):
+    """Return the paths of the files that exist, reporting the missing ones."""
+    file_paths = []
     for file_name in file_names:
         file_path = os.path.join(input_folder, file_name)
         if not os.path.exists(file_path):
             print(f"Error: No se pudo encontrar el archivo en {file_path}")
             continue
         print(f"Archivo encontrado: {file_path}")
-        content = read_file_content(file_path)
-        compiled_content.append(content)
-    return '\n'.join(compiled_content)
-
-def merge_scada():
-    # Define relative paths
-    input_folder = os.path.join('..', 'Dat_files')
-    output_folder = os.path.join('..', 'Populateables')
-    
+        file_paths.append(file_path)
+    return file_paths
+
+def copy_into(src_path, dst_fd):
+    """Append a whole file to an open descriptor, inside the kernel when possible."""
+    with open(src_path, 'rb') as src:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst_fd, remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return
+        except (AttributeError, OSError):
+            # No copy_file_range (e.g. macOS, other filesystems): copy with large buffers
+            src.seek(os.fstat(src.fileno()).st_size - remaining)
+        with os.fdopen(os.dup(dst_fd), 'wb', buffering=0) as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+
+def copy_and_count(src_path, dst_fd, digest):
+    """Append a file while hashing it, return the number of records it holds."""
+    lines = 0
+    previous = b'\n'
+    with open(src_path, 'rb') as src, os.fdopen(os.dup(dst_fd), 'wb', buffering=0) as dst:
+        for block in iter(lambda: src.read(COPY_BUFFER), b''):
+            dst.write(block)
+            digest.update(block)
+            # Records and the table field line are the lines starting with a tab
+            lines += block.count(b'\n\t') + (previous == b'\n' and block[:1] == b'\t')
+            previous = block[-1:]
+    return max(lines - 1, 0)
+
+def write_merged(output_path, header, file_paths, footer, trailer=False):
+    """Stream header, files and footer into output_path through a temp file renamed at the end.
+
+    With trailer=True also returns the sha256 and record counts of the merged file.
+    """
+    output_folder = os.path.dirname(output_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=output_folder, prefix='.' + os.path.basename(output_path), suffix='.tmp')
+    digest = hashlib.sha256()
+    records = {}
+    try:
+        def write_bytes(data):
+            os.write(fd, data)
+            digest.update(data)
+
+        write_bytes(header)
+        for index, file_path in enumerate(file_paths):
+            if index:
+                write_bytes(b'\n')
+            if trailer:
+                records[os.path.basename(file_path)] = copy_and_count(file_path, fd, digest)
+            else:
+                copy_into(file_path, fd)
+        write_bytes(footer)
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    os.close(fd)
+    # mkstemp creates the file as 0600, give it the usual permissions
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp_path, 0o666 & ~umask)
+    os.replace(tmp_path, output_path)
+
+    if not trailer:
+        return None
+    return {
+        'file': os.path.basename(output_path),
+        'bytes': os.path.getsize(output_path),
+        'sha256': digest.hexdigest(),
+        'records': records,
+        'total_records': sum(records.values()),
+    }
+
+def trailer_file(output_path):
+    return output_path + '.json'
+
+def write_trailer(output_path, summary):
+    """Write the checksum and record counts next to the merged file."""
+    trailer_path = trailer_file(output_path)
+    tmp_path = trailer_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, trailer_path)
+    return trailer_path
+
+# Define relative paths
+INPUT_FOLDER = os.path.join('..', 'Dat_files')
+OUTPUT_FOLDER = os.path.join('..', 'Populateables')
+
+# Define input files
+SCADA_FILE_NAMES = [
+    'aor_group_dat.dat',
+    'station_dat.dat',
+    'status_dat.dat',
+    'analog_dat.dat',
+    'unit_dat.dat'
+]
+
+FEP_FILE_NAMES = [
+    'channel_group_dat.dat',
+    'channel_dat.dat',
+    'rtu_data_dat.dat'
+]
+
+OPENCALC_FILE_NAMES = [
+    'formula_template_dat.dat',
+    'formula_dat.dat',
+    'execution_group_dat.dat'
+]
+
+ICCP_FILE_NAMES = [
+    'vcc_info_dat.dat',
+    'control_center_info_dat.dat',
+    'iccp_export_ds_dat.dat',
+    'iccp_import_ds_dat.dat',
+    'iccp_export_point_dat.dat',
+    'iccp_import_point_dat.dat'
+]
+
+def scada_input_paths():
+    return [os.path.join(INPUT_FOLDER, name) for name in SCADA_FILE_NAMES]
+
+def scada_output_path():
+    current_date = datetime.now().strftime("%y%m%d")
+    return os.path.join(OUTPUT_FOLDER, f'SCADA_{current_date}.dat')
+
+def fep_input_paths():
+    return [os.path.join(INPUT_FOLDER, name) for name in FEP_FILE_NAMES]
+
+def fep_output_path():
+    current_date = datetime.now().strftime("%y%m%d")
+    return os.path.join(OUTPUT_FOLDER, f'FEP_{current_date}.dat')
+
+def opencalc_input_paths():
+    return [os.path.join(INPUT_FOLDER, name) for name in OPENCALC_FILE_NAMES]
+
+def opencalc_output_path():
+    current_date = datetime.now().strftime("%y%m%d")
+    return os.path.join(OUTPUT_FOLDER, f'OPENCALC_{current_date}.dat')
+
+def iccp_input_paths():
+    return [os.path.join(INPUT_FOLDER, name) for name in ICCP_FILE_NAMES]
+
+def iccp_output_path():
+    current_date = datetime.now().strftime("%y%m%d")
+    return os.path.join(OUTPUT_FOLDER, f'ICCP_{current_date}.dat')
+
+def write_scada_merge(trailer=False):
+    """Compile the SCADA .dat files into SCADA_yymmdd.dat, return its path or None."""
+    return write_database_merge(b'10 SCADA.DB\n', SCADA_FILE_NAMES, scada_output_path(), trailer)
+
+def write_fep_merge(trailer=False):
+    """Compile the FEP .dat files into FEP_yymmdd.dat, return its path or None."""
+    return write_database_merge(b'10 FEP.DB\n', FEP_FILE_NAMES, fep_output_path(), trailer)
+
+def write_opencalc_merge(trailer=False):
+    """Compile the OpenCalc .dat files into OPENCALC_yymmdd.dat, return its path or None."""
+    return write_database_merge(b'10 OPENCALC.DB\n', OPENCALC_FILE_NAMES, opencalc_output_path(), trailer)
+
+def write_iccp_merge(trailer=False):
+    """Compile the ICCP .dat files into ICCP_yymmdd.dat, return its path or None."""
+    return write_database_merge(b'10 ICCP.DB\n', ICCP_FILE_NAMES, iccp_output_path(), trailer)
+
+def write_database_merge(header, file_names, output_path, trailer=False):
+    """Compile file_names of the Dat_files folder under a database header, return the output path or None."""
     # Ensure output folder exists
-    os.makedirs(output_folder, exist_ok=True)
-
-    # Define input files
-    file_names = [
-        'station_dat.dat',
-        'status_dat.dat',
-        'analog_dat.dat',
-        'unit_dat.dat'
-    ]
-
-    # Compile content
-    compiled_content = compile_files(input_folder, file_names)
-    
-    # If no content was compiled, exit the function
-    if not compiled_content:
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    # Find the files to compile
+    file_paths = find_files(INPUT_FOLDER, file_names)
+
+    # If no file was found, exit the function
+    if not file_paths:
         print("No se pudo compilar ningún contenido. Verificar los archivos de entrada.")
-        return
+        return None
 
-    # Add header and footer
-    final_content = '10 SCADA.DB\n' + compiled_content + '\n0'
+    # Write to output file with header and footer
+    output_file = os.path.basename(output_path)
+    with measure('merge', output_file) as step:
+        summary = write_merged(output_path, header, file_paths, b'\n0', trailer=trailer)
+        step['bytes_written'] = os.path.getsize(output_path)
+        if summary:
+            step['rows_out'] = summary['total_records']
 
-    # Write to output file
-    current_date = datetime.now().strftime("%y%m%d")
-    output_file = f'SCADA_{current_date}.dat'
-    output_path = os.path.join(output_folder, output_file)
-    
-    with open(output_path, 'w') as final_file:
-        final_file.write(final_content)
-    
     print(f"Archivo {output_file} generado correctamente en {output_path}")
+    if summary:
+        trailer_path = write_trailer(output_path, summary)
+        print(f"Resumen {os.path.basename(trailer_path)}: {summary['total_records']} registros, sha256 {summary['sha256']}")
+    elif os.path.exists(trailer_file(output_path)):
+        # A summary left by an earlier merge would not match this file
+        os.remove(trailer_file(output_path))
+    return output_path
+
+def merge_stage(name, func, input_paths, output_path, trailer=False):
+    """Stage merging input_paths into output_path, and its summary with trailer=True."""
+    outputs = [output_path, trailer_file(output_path)] if trailer else [output_path]
+    return Stage(name, partial(func, trailer=trailer), inputs=input_paths, outputs=outputs,
+                 code=MERGE_CODE, options={'trailer': trailer})
+
+def merge_scada_stage(trailer=False):
+    return merge_stage('merge_scada', write_scada_merge, scada_input_paths(), scada_output_path(), trailer)
+
+def merge_fep_stage(trailer=False):
+    return merge_stage('merge_fep', write_fep_merge, fep_input_paths(), fep_output_path(), trailer)
+
+def merge_opencalc_stage(trailer=False):
+    return merge_stage('merge_opencalc', write_opencalc_merge, opencalc_input_paths(), opencalc_output_path(), trailer)
+
+def merge_iccp_stage(trailer=False):
+    return merge_stage('merge_iccp', write_iccp_merge, iccp_input_paths(), iccp_output_path(), trailer)
+
+def merge_scada(force=False, trailer=False):
+    # Skip the merge when no .dat file changed since the last one
+    return run_stages([merge_scada_stage(trailer)], force=force, workers=1)
+
+def merge_fep(force=False, trailer=False):
+    return run_stages([merge_fep_stage(trailer)], force=force, workers=1)
+
+def merge_opencalc(force=False, trailer=False):
+    return run_stages([merge_opencalc_stage(trailer)], force=force, workers=1)
+
+def merge_iccp(force=False, trailer=False):
+    return run_stages([merge_iccp_stage(trailer)], force=force, workers=1)
 
 if __name__ == "__main__":
-    merge_scada()
\ No newline at end of file
+    # Run on its own the merge is always written, like before the stages
+    merge_scada(force=True)
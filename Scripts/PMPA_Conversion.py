@@ -1,26 +1,104 @@
-import pandas as pd
+import argparse
+import os
+import sys
 import time
+from functools import partial
 from datetime import datetime
-from Scada_code import scada_processing
-from Merging_scada import merge_scada
-
-def main():
-    start_time = time.time()
-    print(f"Starting {datetime.now().strftime('%H:%M:%S')}")
+from Stage_scheduler import run_stages
+from Run_metrics import REPORT_FOLDER, print_step_report, write_run_report
+from Watch_inputs import POLL_SECONDS, watch
 
+def conversion_stages(trailer=False, chunksize=None, validate=True, fail_fast=False, delta=None):
+    """All stages of a conversion, in declaration order."""
+    # Imported here: they load pandas, which light commands of PMPA_cli.py never need
+    from Scada_code import scada_stages
+    from Fep_code import fep_stages
+    from Iccp_code import iccp_stages
+    from Calc_code import calc_stages
+    from History_migration import history_stages
+    from Xref_store import xref_store_stage
+    from Merging_scada import merge_fep_stage, merge_iccp_stage, merge_opencalc_stage, merge_scada_stage
+    from Input_validation import validation_stage
+    from Scada_delta import delta_stage
 
-    print("Calling scada_processing...")
-    scada_processing()
+    stages = scada_stages(chunksize)
+    stages += fep_stages()
+    stages += iccp_stages()
+    stages += calc_stages()
+    stages += history_stages(chunksize)
+    stages.append(xref_store_stage())
+    if validate:
+        # Conversion stages wait for the validation; with fail_fast an error stops them
+        for stage in stages:
+            stage.after += ('validate',)
+        stages.insert(0, validation_stage(fail_fast))
+    stages.append(merge_scada_stage(trailer))
+    if delta is not None:
+        # '' compares with the latest previous build
+        stages.append(delta_stage(delta or None))
+    stages.append(merge_fep_stage(trailer))
+    stages.append(merge_iccp_stage(trailer))
+    stages.append(merge_opencalc_stage(trailer))
+    return stages
 
+def main(force=False, workers=None, trailer=False, chunksize=None, report_path=None, profile=False,
+         validate=True, fail_fast=False, delta=None):
+    start_time = time.time()
+    started = datetime.now()
+    print(f"Starting {started.strftime('%H:%M:%S')}")
 
-    # fep_processing()
-    # iccp_processing()
-    print("Calling merge_scada...")
-    merge_scada()
-    # merge_fep()
+    # Independent stages run in parallel, merge_scada waits for every .dat it reads
+    profile_dir = os.path.join(REPORT_FOLDER, 'profiles') if profile else None
+    stages = conversion_stages(trailer, chunksize, validate, fail_fast, delta)
+    report = run_stages(stages, force=force, workers=workers, profile_dir=profile_dir)
 
     end_time = time.time()
+    print_step_report(report)
+    report.update({
+        'started': started.strftime('%Y-%m-%d %H:%M:%S'),
+        'command': sys.argv,
+        'options': {'force': force, 'workers': workers, 'trailer': trailer, 'chunksize': chunksize,
+                    'validate': validate, 'fail_fast': fail_fast, 'delta': delta},
+    })
+    print(f"Run report: {write_run_report(report, report_path)}")
     print(f"Finished. Total time: {end_time - start_time:.2f} seconds")
+    return report
+
+def add_conversion_arguments(parser):
+    """Options of a conversion, shared with the convert command of PMPA_cli.py."""
+    parser.add_argument('--force', action='store_true', help="Rebuild every stage even if its inputs did not change")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for independent stages (1 runs serially)")
+    parser.add_argument('--trailer', action='store_true', help="Write the checksum and record counts of SCADA_yymmdd.dat next to it")
+    parser.add_argument('--chunksize', type=int, default=None, help="Convert analog and status points, and the alarm and security logs, in chunks of this many rows")
+    parser.add_argument('--report', default=None, help="Path of the JSON run report (default ../Reports/run_yymmdd_HHMMSS.json)")
+    parser.add_argument('--profile', action='store_true', help="Profile the stages and keep the cProfile dump of the slowest one")
+    parser.add_argument('--no-validate', action='store_true', help="Skip the reference checks of the inputs")
+    parser.add_argument('--fail-fast', action='store_true', help="Stop before converting when the reference checks find errors")
+    parser.add_argument('--delta', nargs='?', const='', default=None, metavar='PREVIOUS',
+                        help="Also write the records changed since PREVIOUS (default: the latest other SCADA_*.dat)")
+    parser.add_argument('--watch', nargs='?', type=float, const=POLL_SECONDS, default=None, metavar='SECONDS',
+                        help="Keep running and convert again when Inputs or Mappings change, polling every SECONDS "
+                             "(--force only applies to the first run, --workers is not allowed)")
+
+def run_conversion(args):
+    """Run the conversion, or watch the inputs, with the parsed options.
+
+    Returns the run report, the number of runs of a watch, or None when the options are invalid.
+    """
+    if args.watch is not None:
+        # Stages run in this process, where the inputs are kept in memory between runs
+        if args.workers not in (None, 1):
+            print("Error: --workers cannot be used with --watch, which runs the stages in this process")
+            return None
+        profile_dir = os.path.join(REPORT_FOLDER, 'profiles') if args.profile else None
+        return watch(partial(conversion_stages, args.trailer, args.chunksize, not args.no_validate, args.fail_fast,
+                             args.delta),
+                     poll_seconds=args.watch, force=args.force, report_path=args.report, profile_dir=profile_dir)
+    return main(force=args.force, workers=args.workers, trailer=args.trailer, chunksize=args.chunksize,
+                report_path=args.report, profile=args.profile, validate=not args.no_validate,
+                fail_fast=args.fail_fast, delta=args.delta)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="PMPA to SCADA database conversion")
+    add_conversion_arguments(parser)
+    run_conversion(parser.parse_args())
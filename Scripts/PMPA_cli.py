@@ -0,0 +1,118 @@
+import argparse
+import sys
+
+# Only the standard library is imported here; each command imports what it needs
+# when it runs, so merge and inspect start without loading pandas.
+
+
+def stages_succeeded(report):
+    """True when every stage of a run report ran or was up to date."""
+    return all(info['status'] in ('ran', 'skipped') for info in report['stages'].values())
+
+
+def convert_command(args):
+    from PMPA_Conversion import run_conversion
+    report = run_conversion(args)
+    if args.watch is not None:
+        # A watch runs until interrupted, it only fails when it cannot start
+        return 1 if report is None else 0
+    return 0 if report is not None and stages_succeeded(report) else 1
+
+
+def merge_command(args):
+    from Merging_scada import merge_fep_stage, merge_iccp_stage, merge_opencalc_stage, merge_scada_stage
+    from Stage_scheduler import run_stages
+    stages = {'scada': merge_scada_stage, 'fep': merge_fep_stage, 'iccp': merge_iccp_stage,
+              'opencalc': merge_opencalc_stage}
+    # Skip the merges whose .dat files did not change since the last one
+    databases = args.databases or list(stages)
+    report = run_stages([stages[name](args.trailer) for name in databases], force=args.force, workers=1)
+    return 0 if stages_succeeded(report) else 1
+
+
+def validate_command(args):
+    from Input_validation import exit_status, run_validation
+    return exit_status(run_validation(fail_fast=args.fail_fast))
+
+
+def inspect_command(args):
+    from Dat_reader import DatFile, print_dat_summary
+    print_dat_summary(args.path)
+    if args.table:
+        with DatFile(args.path) as dat:
+            print(next(iter(dat.frame(args.table, chunksize=args.rows))))
+    return 0
+
+
+def xref_command(args):
+    import time
+    from Xref_store import XREF_COLUMNS, XrefStore, build_xref_store
+    if args.build and build_xref_store() is None:
+        return 1
+    if args.value is None:
+        return 0
+    if args.by == 'record' and not args.table:
+        print("Error: --by record needs the --table of the record")
+        return 1
+    try:
+        store = XrefStore()
+    except FileNotFoundError as e:
+        print(f"Error: {e}, run convert or xref --build first")
+        return 1
+    with store:
+        start = time.perf_counter()
+        if args.by == 'record':
+            rows = store.by_record(args.table, args.value)
+        else:
+            lookup = {'any': store.find, 'name': store.by_name, 'pkey': store.by_pkey, 'key': store.by_key}[args.by]
+            rows = lookup(args.value, args.table)
+        elapsed = time.perf_counter() - start
+    print('\t'.join(XREF_COLUMNS))
+    for row in rows:
+        print('\t'.join('' if row[column] is None else str(row[column]) for column in XREF_COLUMNS))
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms")
+    return 0 if rows else 1
+
+
+def build_parser():
+    from PMPA_Conversion import add_conversion_arguments
+
+    parser = argparse.ArgumentParser(description="PMPA to SCADA database conversion tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help="Convert the inputs and merge the SCADA, FEP, ICCP and OpenCalc databases")
+    add_conversion_arguments(convert)
+    convert.set_defaults(func=convert_command)
+
+    merge = commands.add_parser('merge', help="Only merge the .dat files into the SCADA, FEP, ICCP and OpenCalc databases")
+    merge.add_argument('--database', dest='databases', action='append', choices=['scada', 'fep', 'iccp', 'opencalc'],
+                       help="Database to merge, repeat for several (default: all)")
+    merge.add_argument('--force', action='store_true', help="Merge even if no .dat file changed")
+    merge.add_argument('--trailer', action='store_true', help="Write the checksum and record counts of each merged file next to it")
+    merge.set_defaults(func=merge_command)
+
+    validate = commands.add_parser('validate', help="Check the references between the PMPA exports")
+    validate.add_argument('--fail-fast', action='store_true',
+                          help="Report the errors as a fail fast conversion would; errors give status 1 either way")
+    validate.set_defaults(func=validate_command)
+
+    inspect = commands.add_parser('inspect', help="List the tables of a .dat file")
+    inspect.add_argument('path', help=".dat file, e.g. ../Populateables/SCADA_yymmdd.dat")
+    inspect.add_argument('--table', help="Print the first records of this table")
+    inspect.add_argument('--rows', type=int, default=10)
+    inspect.set_defaults(func=inspect_command)
+
+    xref = commands.add_parser('xref', help="Find what a legacy station or point became, or what a new key was")
+    xref.add_argument('value', nargs='?',
+                      help="Legacy NAME or PKEY, point as STATION,POINT:TYPE, new key or record number")
+    xref.add_argument('--by', choices=['any', 'name', 'pkey', 'key', 'record'], default='any',
+                      help="What the value is (default: any of name, PKEY and key)")
+    xref.add_argument('--table', help="Only rows of this table, e.g. STATUS (needed with --by record)")
+    xref.add_argument('--build', action='store_true', help="Rebuild the store from the xrefs and point indexes first")
+    xref.set_defaults(func=xref_command)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Written by the analog and status stages next to their xrefs
+POINT_INDEX_FOLDER = os.path.join('..', 'Xrefs')
+POINT_INDEX_FILES = {
+    'A': 'analog_point_index.csv',
+    'S': 'status_point_index.csv',
+}
+INDEX_COLUMNS = ['Station', 'Name', 'Type', 'Key', 'record', 'PKey']
+
+
+def normalize_references(references):
+    """Upper case "STATION,POINT:TYPE" strings without surrounding blanks, missing as ''."""
+    return pd.Series(references).astype('string').str.strip().str.upper().fillna('')
+
+
+def point_index_path(point_type, folder=POINT_INDEX_FOLDER):
+    return os.path.join(folder, POINT_INDEX_FILES[point_type])
+
+
+def point_index_rows(stations, names, point_type, keys, pkeys, first_record=1):
+    """Index rows for converted points: legacy station, name and PKEY, new key and record number."""
+    return pd.DataFrame({
+        'Station': stations.to_numpy(),
+        'Name': names.to_numpy(),
+        'Type': point_type,
+        'Key': keys.to_numpy(),
+        'record': np.arange(first_record, first_record + len(keys)),
+        'PKey': pkeys.to_numpy(),
+    })
+
+
+def write_point_index(rows, path, append=False):
+    """Write (or append) index rows to a point index CSV."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    rows[INDEX_COLUMNS].to_csv(path, mode='a' if append else 'w', header=not append, index=False)
+
+
+class PointIndex:
+    """Hash index from normalized (station, name, type) references to new keys and record numbers."""
+
+    def __init__(self, points):
+        references = normalize_references(
+            points['Station'].astype(str) + ',' + points['Name'].astype(str) + ':' + points['Type'].astype(str))
+        duplicated = references.duplicated().to_numpy()
+        # Same point converted twice: keep the first one, it is the one earlier references meant
+        self.duplicates = int(duplicated.sum())
+        self.points = points[~duplicated].reset_index(drop=True)
+        self.index = pd.Index(references[~duplicated].to_numpy())
+        self.keys = self.points['Key'].to_numpy(dtype=object)
+        self.records = self.points['record'].to_numpy(dtype='int64')
+
+    @classmethod
+    def load(cls, folder=POINT_INDEX_FOLDER):
+        """Build the index from the point index CSVs written by the conversion."""
+        frames = []
+        for point_type in POINT_INDEX_FILES:
+            path = point_index_path(point_type, folder)
+            if os.path.exists(path):
+                frames.append(pd.read_csv(path, dtype={'Station': str, 'Name': str, 'Type': str, 'Key': str,
+                                                                 'PKey': str},
+                                          keep_default_na=False))
+            else:
+                print(f"Warning: Point index not found: {path}")
+        points = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=INDEX_COLUMNS)
+        return cls(points)
+
+    def __len__(self):
+        return len(self.index)
+
+    def resolve(self, references):
+        """Translate a whole column of "STATION,POINT:TYPE" references in one lookup.
+
+        Returns a frame aligned with the references (Key and record, missing when the
+        reference is blank or unknown) and the sorted list of unknown references.
+        """
+        references = pd.Series(references)
+        # References repeat (a point feeds many calcs and sets): normalize and look up each distinct one once
+        codes, uniques = pd.factorize(references)
+        normalized = normalize_references(uniques)
+        unique_positions = self.index.get_indexer(normalized.to_numpy())
+        # Missing references have code -1, which picks the -1 appended for them
+        positions = np.append(unique_positions, -1)[codes]
+        found = positions >= 0
+
+        keys = np.full(len(positions), None, dtype=object)
+        keys[found] = self.keys[positions[found]]
+        records = np.zeros(len(positions), dtype='int64')
+        records[found] = self.records[positions[found]]
+
+        resolved = pd.DataFrame({
+            'Key': keys,
+            'record': pd.arrays.IntegerArray(records, ~found),
+        }, index=references.index)
+
+        unresolved = normalized[(unique_positions < 0) & (normalized != '').to_numpy()]
+        return resolved, sorted(unresolved.unique().tolist())
@@ -0,0 +1,58 @@
+import pandas as pd
+
+# XXYYYZZZ: 2 digits point type, 3 digits station, 3 digits sequence per station
+MAX_TYPE = 99
+MAX_STATION = 999
+MAX_SEQUENCE = 999
+
+
+class KeyAllocator:
+    """Assign XXYYYZZZ point keys, numbering points per station in input order."""
+
+    def __init__(self):
+        # Last sequence number used per station, kept between allocate() calls
+        self.station_counter = {}
+
+    def allocate(self, point_type, station):
+        """Return a Series of keys for the given type and station columns."""
+        index = station.index
+        types = pd.Series(point_type, index=index).astype('int64')
+        stations = station.astype('int64')
+
+        sequence = stations.groupby(stations, sort=False).cumcount() + 1
+        if self.station_counter:
+            sequence += stations.map(self.station_counter).fillna(0).astype('int64')
+
+        check_key_ranges(types, stations, sequence)
+
+        # Only remember the new counters once the whole batch is valid
+        self.station_counter.update(sequence.groupby(stations, sort=False).max().to_dict())
+
+        return (types.astype(str).str.zfill(2)
+                + stations.astype(str).str.zfill(3)
+                + sequence.astype(str).str.zfill(3))
+
+
+def check_key_ranges(types, stations, sequence):
+    """Raise ValueError if any key part does not fit in its digits."""
+    errors = []
+
+    bad_types = sorted(types[(types < 0) | (types > MAX_TYPE)].unique().tolist())
+    if bad_types:
+        errors.append(f"point types out of range 0-{MAX_TYPE}: {bad_types}")
+
+    bad_stations = sorted(stations[(stations < 0) | (stations > MAX_STATION)].unique().tolist())
+    if bad_stations:
+        errors.append(f"stations out of range 0-{MAX_STATION}: {bad_stations}")
+
+    overflow = sorted(stations[sequence > MAX_SEQUENCE].unique().tolist())
+    if overflow:
+        errors.append(f"stations with more than {MAX_SEQUENCE} points: {overflow}")
+
+    if errors:
+        raise ValueError("Cannot create XXYYYZZZ keys, " + "; ".join(errors))
+
+
+def create_keys(point_type, station):
+    """Allocate keys for a whole table in one pass."""
+    return KeyAllocator().allocate(point_type, station)
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REPORT_FOLDER = os.path.join('..', 'Reports')
+
+# Steps measured in this process (kinds read, schema, transform, xref, dat, index, merge),
+# handed to the scheduler after each stage
+STEPS = []
+
+# psutil handle of this process, created on first use
+PROCESS = None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        # No getrusage (Windows): current RSS is the best available figure
+        return rss_mb()
+
+
+def rss_mb():
+    """Current resident memory of this process in MB."""
+    global PROCESS
+    if PROCESS is None or PROCESS.pid != os.getpid():
+        import psutil
+        PROCESS = psutil.Process()
+    return PROCESS.memory_info().rss / (1024 * 1024)
+
+
+def frame_mb(df):
+    """Memory held by a frame in MB, strings included."""
+    return round(df.memory_usage(deep=True).sum() / (1024 * 1024), 3)
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+@contextmanager
+def measure(kind, name, rows_in=None):
+    """Time one step and record it; the caller fills rows_out and bytes_written in the yielded dict."""
+    step = {'kind': kind, 'name': name, 'rows_in': rows_in, 'rows_out': None, 'bytes_written': None}
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield step
+    finally:
+        step['seconds'] = time.perf_counter() - start
+        step['cpu_seconds'] = time.process_time() - cpu_start
+        step['rss_mb'] = round(rss_mb(), 1)
+        step['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        STEPS.append(step)
+
+
+def measured_chunks(chunks, name):
+    """Yield the chunks of a chunked read, measuring each read as a 'read' step."""
+    chunks = iter(chunks)
+    while True:
+        with measure('read', name) as step:
+            df = next(chunks, None)
+            if df is not None:
+                step['rows_out'] = len(df)
+                step['frame_mb'] = frame_mb(df)
+        if df is None:
+            return
+        yield df
+
+
+def take_steps():
+    """Return the steps measured since the last call, repeated steps (chunks) summed into one."""
+    merged = {}
+    for step in STEPS:
+        key = (step['kind'], step['name'])
+        if key not in merged:
+            merged[key] = dict(step, calls=1)
+            continue
+        total = merged[key]
+        total['calls'] += 1
+        for field in ('rows_in', 'rows_out', 'bytes_written', 'seconds', 'cpu_seconds'):
+            if step[field] is not None:
+                total[field] = (total[field] or 0) + step[field]
+        if 'frame_mb' in step:
+            total['frame_mb'] = max(total.get('frame_mb', 0), step['frame_mb'])
+        total['rss_mb'] = max(total['rss_mb'], step['rss_mb'])
+        total['peak_rss_mb'] = max(total['peak_rss_mb'], step['peak_rss_mb'])
+    STEPS.clear()
+    return list(merged.values())
+
+
+def report_path(folder=REPORT_FOLDER):
+    return os.path.join(folder, f"run_{datetime.now().strftime('%y%m%d_%H%M%S')}.json")
+
+
+def write_run_report(report, path=None):
+    """Write the run report as JSON, return its path."""
+    path = path or report_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def print_step_report(report):
+    """Print the measured steps of every stage."""
+    print(f"{'Stage':<20}{'Step':<10}{'Name':<28}{'Seconds':>9}{'CPU':>9}{'Rows out':>11}{'Bytes':>13}"
+          f"{'Frame MB':>10}{'Peak MB':>9}")
+    for stage_name, info in report['stages'].items():
+        for step in info.get('steps', []):
+            rows = '' if step['rows_out'] is None else f"{step['rows_out']:,}"
+            written = '' if step['bytes_written'] is None else f"{step['bytes_written']:,}"
+            frame = f"{step['frame_mb']:.2f}" if 'frame_mb' in step else ''
+            print(f"{stage_name:<20}{step['kind']:<10}{step['name'][:27]:<28}{step['seconds']:>9.3f}"
+                  f"{step['cpu_seconds']:>9.3f}{rows:>11}{written:>13}{frame:>10}{step['peak_rss_mb']:>9.1f}")
@@ -1,37 +1,110 @@
 import pandas as pd
+import numpy as np
 import os
-from datetime import datetime
-
-def scada_processing():
+from functools import partial
+from Point_keys import KeyAllocator
+from Dat_writer import DatTable, DatWriter, write_dat
+from Input_schema import read_typed_csv, read_typed_chunks
+from Run_metrics import file_size, frame_mb, measure, measured_chunks
+from Stage_scheduler import Stage, run_stages
+from Station_index import StationIndex
+from Point_index import POINT_INDEX_FILES, point_index_path, point_index_rows, write_point_index
+from Mapping_engine import mapped_table_stage
+from Aor_groups import DAT_PATH as AOR_DAT_PATH, aor_stage
+
+SCADA_CODE = ['Scada_code.py', 'Point_keys.py', 'Dat_writer.py', 'Input_cache.py', 'Point_index.py', 'Station_index.py',
+              'Input_schema.py', 'Aor_groups.py']
+
+def scada_processing(force=False, workers=None, chunksize=None):
     #print("Hello World from scada_processing!")
-    
-    #  StationPoints.CSV
-    df_station = process_station_points()
-    if df_station is not None:
-        generate_station_dat(df_station)
-    
-    #  AnalogPoints.csv
-    df_analog = process_analog_points(df_station)
-    if df_analog is not None:
-        #print("\nFirst rows of the analog points DataFrame:")
-        #print(df_analog.head(3))
-        generate_analog_dat(df_analog)
-
-    #  Statuspoints.csv
-    df_status = process_status_points(df_station)
-    if df_status is not None:
-        #print("\nFirst rows of the status points DataFrame:")
-        #print(df_status.head(3))
-        generate_status_dat(df_status)
-
-    # MeasurementUnits.CSV
-    df_unit = process_measurement_units()
-    if df_unit is not None:
-        #print("\nFirst rows of the measurement units DataFrame:")
-        #print(df_unit.head(3))
-        generate_unit_dat(df_unit)
-
-def process_station_points():
+    return run_stages(scada_stages(chunksize), force=force, workers=workers)
+
+def scada_stages(chunksize=None):
+    """Conversion stages of the SCADA tables.
+
+    Analog and status points need the StationIndex for their pStation, so they
+    run after the station stage and list StationPoints.CSV as an input. Stations and
+    points take their AOR group from the AorGroups built first by the aor stage, and
+    list its .dat so a change of the groups converts them again.
+    Measurement units do not depend on anything and run alongside them.
+
+    With a chunksize, analog and status points are converted chunk by chunk so
+    memory stays flat whatever the size of the export.
+    """
+    station_csv = os.path.join('..', 'Inputs', 'StationPoints.CSV')
+    return [
+        #  Zones.CSV, ZoneGroups.CSV, UserTypes.CSV
+        aor_stage(),
+        #  StationPoints.CSV
+        Stage('station', station_stage, deps=('aor',),
+              inputs=[station_csv, AOR_DAT_PATH],
+              outputs=[os.path.join('..', 'Xrefs', 'station_xref.csv'),
+                       os.path.join('..', 'Dat_files', 'station_dat.dat')],
+              code=SCADA_CODE, restore=restore_station),
+        #  AnalogPoints.csv
+        Stage('analog', partial(analog_stage, chunksize=chunksize), deps=('station', 'aor'),
+              inputs=[os.path.join('..', 'Inputs', 'AnalogPoints.csv'), station_csv, AOR_DAT_PATH],
+              outputs=[os.path.join('..', 'Xrefs', 'analog_xref.csv'),
+                       os.path.join('..', 'Dat_files', 'analog_dat.dat'),
+                       point_index_path('A')],
+              code=SCADA_CODE),
+        #  Statuspoints.csv
+        Stage('status', partial(status_stage, chunksize=chunksize), deps=('station', 'aor'),
+              inputs=[os.path.join('..', 'Inputs', 'StatusPoints.csv'),
+                      os.path.join('..', 'Inputs', 'PrefixSuffixes.csv'), station_csv, AOR_DAT_PATH],
+              outputs=[os.path.join('..', 'Xrefs', 'status_xref.csv'),
+                       os.path.join('..', 'Dat_files', 'status_dat.dat'),
+                       point_index_path('S')],
+              code=SCADA_CODE),
+        # MeasurementUnits.CSV, converted from the mapping spec
+        mapped_table_stage('unit', 'UNIT', SCADA_CODE),
+    ]
+
+def station_stage(aor):
+    df_station = process_station_points(aor)
+    if df_station is None:
+        return None
+    generate_station_dat(df_station)
+    return StationIndex(df_station)
+
+def restore_station(aor):
+    # Station stage was up to date, only the index is needed by analog/status
+    df_station = process_station_points(aor, write_xref=False)
+    return StationIndex(df_station) if df_station is not None else None
+
+def analog_stage(stations, aor, chunksize=None):
+    if chunksize:
+        return convert_analog_points_chunked(stations, aor, chunksize)
+    df_analog = process_analog_points(stations, aor)
+    if df_analog is None:
+        return None
+    #print("\nFirst rows of the analog points DataFrame:")
+    #print(df_analog.head(3))
+    generate_analog_dat(df_analog)
+    with measure('index', POINT_INDEX_FILES['A']) as step:
+        write_point_index(point_index_rows(df_analog['StationName'], df_analog['Name'], 'A', df_analog['Key'],
+                                           df_analog['PKey']), point_index_path('A'))
+        step['rows_out'] = len(df_analog)
+        step['bytes_written'] = file_size(point_index_path('A'))
+    return len(df_analog)
+
+def status_stage(stations, aor, chunksize=None):
+    if chunksize:
+        return convert_status_points_chunked(stations, aor, chunksize)
+    df_status = process_status_points(stations, aor)
+    if df_status is None:
+        return None
+    #print("\nFirst rows of the status points DataFrame:")
+    #print(df_status.head(3))
+    generate_status_dat(df_status)
+    with measure('index', POINT_INDEX_FILES['S']) as step:
+        write_point_index(point_index_rows(df_status['StationName'], df_status['Name'], 'S', df_status['Key'],
+                                           df_status['PKey']), point_index_path('S'))
+        step['rows_out'] = len(df_status)
+        step['bytes_written'] = file_size(point_index_path('S'))
+    return len(df_status)
+
+def process_station_points(aor, write_xref=True):
     csv_path = os.path.join('..', 'Inputs', 'StationPoints.CSV')
     
     if not os.path.exists(csv_path):
@@ -39,26 +112,29 @@ def process_station_points():
         return None
     
     #print(f"File found: {csv_path}")
-    df_station = pd.read_csv(csv_path)
-    
-    if 'PKEY' not in df_station.columns:
-        print("Error: The PKEY column is not present in StationPoints.CSV")
+    df_station = read_typed_csv(csv_path)
+    if df_station is None:
         return None
     
 
     # XREF CREATION
-    xref_columns = ['PKEY', 'NAME', 'DESC', 'ZONEID', 'ALRMPRIOR']
-    
-    # Create Xref DataFrame
-    df_xref = df_station[xref_columns].copy()
-    
-    # Save Xref file
-    xref_folder = os.path.join('..', 'Xrefs')
-    if not os.path.exists(xref_folder):
-        os.makedirs(xref_folder)
-    xref_path = os.path.join(xref_folder, 'station_xref.csv')
-    df_xref.to_csv(xref_path, index=False)
-    print(f"Xref file generated: {xref_path}")
+    # Skipped when the station stage is up to date and only the frame is needed
+    if write_xref:
+        xref_columns = ['PKEY', 'NAME', 'DESC', 'ZONEID', 'ALRMPRIOR']
+
+        # Create Xref DataFrame
+        df_xref = df_station[xref_columns].copy()
+
+        # Save Xref file
+        xref_folder = os.path.join('..', 'Xrefs')
+        if not os.path.exists(xref_folder):
+            os.makedirs(xref_folder)
+        xref_path = os.path.join(xref_folder, 'station_xref.csv')
+        with measure('xref', 'station_xref.csv', rows_in=len(df_station)) as step:
+            df_xref.to_csv(xref_path, index=False)
+            step['rows_out'] = len(df_xref)
+            step['bytes_written'] = file_size(xref_path)
+        print(f"Xref file generated: {xref_path}")
 
     ##################
     
@@ -68,27 +144,37 @@ def process_station_points():
         'ZONEID': 'pAORGroup',
         'ALRMPRIOR': 'Priority'
     }
-    df_station = df_station.rename(columns=column_mapping)
-    df_station['Order'] = range(1, len(df_station) + 1)
+    with measure('transform', 'station', rows_in=len(df_station)) as step:
+        df_station = df_station.rename(columns=column_mapping)
+        df_station['Order'] = range(1, len(df_station) + 1)
+        df_station['pAORGroup'] = aor.station_groups(df_station['Key'])
+        step['rows_out'] = len(df_station)
+        step['frame_mb'] = frame_mb(df_station)
     
 
     #print(df_station.head())
     
     return df_station
 
-def process_analog_points(df_station):
+ANALOG_COLUMNS = ['RTUID', 'NAME', 'ENGUNITS', 'SCALEFACT', 'STATIONPID',
+                  'PREMGHI', 'PREMGSEVHI', 'EMGHI', 'EMGSEVHI',
+                  'PREMGLO', 'PREMGSEVLO', 'EMGLO', 'EMGSEVLO']
+
+STATUS_XREF_COLUMNS = ['NAME', 'STATIONPID', 'PREFSUFFID', 'USERTYPEID', 'NORMSTATE']
+
+def process_analog_points(stations, aor):
     csv_path = os.path.join('..', 'Inputs', 'AnalogPoints.csv')
     if not os.path.exists(csv_path):
         print(f"Error: Could not find the file at {csv_path}")
         return None
     
 
-    useful_columns = ['RTUID', 'NAME', 'ENGUNITS', 'SCALEFACT', 'STATIONPID', 
-                      'PREMGHI', 'PREMGSEVHI', 'EMGHI', 'EMGSEVHI',
-                      'PREMGLO', 'PREMGSEVLO', 'EMGLO', 'EMGSEVLO']
+    useful_columns = ANALOG_COLUMNS
     
-    # Lee solo las columnas que necesitas
-    df = pd.read_csv(csv_path, usecols=useful_columns)
+    # Lee solo las columnas que necesitas, con los tipos de Input_schema
+    df = read_typed_csv(csv_path)
+    if df is None:
+        return None
     #print(f"File found: {csv_path}")
 
 
@@ -104,16 +190,35 @@ def process_analog_points(df_station):
     if not os.path.exists(xref_folder):
         os.makedirs(xref_folder)
     xref_path = os.path.join(xref_folder, 'analog_xref.csv')
-    df_xref.to_csv(xref_path, index=False)
+    with measure('xref', 'analog_xref.csv', rows_in=len(df)) as step:
+        df_xref.to_csv(xref_path, index=False)
+        step['rows_out'] = len(df_xref)
+        step['bytes_written'] = file_size(xref_path)
     print(f"Xref file generated: {xref_path}")
     ################
-    
+
+    try:
+        with measure('transform', 'analog', rows_in=len(df)) as step:
+            df_analog = build_analog_frame(df, stations, aor, KeyAllocator())
+            step['rows_out'] = len(df_analog)
+            step['frame_mb'] = frame_mb(df_analog)
+        stations.report_unmatched('analog')
+        return df_analog
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+def build_analog_frame(df, stations, aor, allocator):
+    """Convert AnalogPoints rows, numbering keys after the ones the allocator already gave out."""
     df_analog = pd.DataFrame()
-    df_analog['Type'] = df.get('RTUID', '').apply(lambda x: 2 if pd.isna(x) or x == '' else 1)
+    # Points without RTU are calculated (2), the others telemetered (1)
+    rtu = df['RTUID']
+    df_analog['Type'] = pd.Series(np.where(rtu.isna() | (rtu.astype(str) == ''), 2, 1), index=df.index)
     df_analog['Name'] = df.get('NAME', '')
     df_analog['pUNIT'] = df.get('ENGUNITS', '')
     df_analog['pScale'] = df.get('SCALEFACT', '')
-    df_analog['pConfiguredAORGroup'] = 1
+    # Analog points have no zone of their own, they are in the AOR group of their station
+    df_analog['pConfiguredAORGroup'] = aor.station_groups(df['STATIONPID'])
 
 
     df_analog['NominalHiLimits1'] = df.get('PREMGHI', '')
@@ -130,36 +235,31 @@ def process_analog_points(df_station):
     df_analog['NominalLowLimitsRnblty'] = -999999
 
     
-    station_map = {key.upper(): order for key, order in zip(df_station['Key'], df_station['Order'])}
-    
-    
-    df_analog['pStation'] = df['STATIONPID'].apply(lambda x: station_map.get(str(x).upper(), 0))
+    df_analog['pStation'] = stations.order(df['STATIONPID'])
+    # Legacy station name and PKEY, kept for the point reference index
+    df_analog['StationName'] = df['STATIONPID']
+    df_analog['PKey'] = df['PKEY']
     
     
-    def create_key(row, station_counter):
-        xx = str(row['Type']).zfill(2)
-        yyy = str(row['pStation']).zfill(3)
-        zzz = str(station_counter[row['pStation']]).zfill(3)
-        station_counter[row['pStation']] += 1
-        return f"{xx}{yyy}{zzz}"
-
-    station_counter = {station: 1 for station in df_analog['pStation'].unique()}
-    df_analog['Key'] = df_analog.apply(lambda row: create_key(row, station_counter), axis=1)
+    df_analog['Key'] = allocator.allocate(df_analog['Type'], df_analog['pStation'])
     
     #print(df_analog.head())
     return df_analog
 
-def process_status_points(df_station):
+def process_status_points(stations, aor):
     csv_path = os.path.join('..', 'Inputs', 'StatusPoints.csv')
     if not os.path.exists(csv_path):
         print(f"Error: Could not find the file at {csv_path}")
         return None
     
-    df_status = pd.read_csv(csv_path)
+    # Only the five columns used of the wide export
+    df_status = read_typed_csv(csv_path)
+    if df_status is None:
+        return None
 
 
     ###############
-    xref_columns = ['NAME', 'STATIONPID', 'PREFSUFFID', 'USERTYPEID', 'NORMSTATE']
+    xref_columns = STATUS_XREF_COLUMNS
 
     # Create Xref DataFrame
     df_xref = df_status[xref_columns].copy()
@@ -169,30 +269,56 @@ def process_status_points(df_station):
     if not os.path.exists(xref_folder):
         os.makedirs(xref_folder)
     xref_path = os.path.join(xref_folder, 'status_xref.csv')
-    df_xref.to_csv(xref_path, index=False)
+    with measure('xref', 'status_xref.csv', rows_in=len(df_status)) as step:
+        df_xref.to_csv(xref_path, index=False)
+        step['rows_out'] = len(df_xref)
+        step['bytes_written'] = file_size(xref_path)
     print(f"Xref file generated: {xref_path}")
 
     #################
     
+    df_prefix_suffixes = read_prefix_suffixes()
+    if df_prefix_suffixes is None:
+        return None
+
+    try:
+        with measure('transform', 'status', rows_in=len(df_status)) as step:
+            df_status_new = build_status_frame(df_status, stations, aor, df_prefix_suffixes, KeyAllocator())
+            step['rows_out'] = len(df_status_new)
+            step['frame_mb'] = frame_mb(df_status_new)
+        stations.report_unmatched('status')
+        return df_status_new
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+def read_prefix_suffixes():
     prefix_suffixes_path = os.path.join('..', 'Inputs', 'PrefixSuffixes.csv')
     if not os.path.exists(prefix_suffixes_path):
         print(f"Error: Could not find the file at {prefix_suffixes_path}")
         return None
     
-    df_prefix_suffixes = pd.read_csv(prefix_suffixes_path)
-    
+    return read_typed_csv(prefix_suffixes_path)
+
+def build_status_frame(df_status, stations, aor, df_prefix_suffixes, allocator):
+    """Convert StatusPoints rows, numbering keys after the ones the allocator already gave out."""
     # Create mappings
     prefix_suffixes_map = {name.upper(): int(pkey) for name, pkey in zip(df_prefix_suffixes['Name'], df_prefix_suffixes['PKey'])}
-    station_map = {key.upper(): pkey for key, pkey in zip(df_station['Key'], df_station['PKEY'])}
     
     df_status_new = pd.DataFrame()
     df_status_new['Type'] = 1  # Set all Types to 1 for status points
     df_status_new['Name'] = df_status['NAME']
-    df_status_new['pStation'] = df_status['STATIONPID'].apply(lambda x: station_map.get(str(x).upper(), 0))
-    df_status_new['pStates'] = df_status['PREFSUFFID'].apply(lambda x: prefix_suffixes_map.get(x.upper(), 0) + 200 if x else 0)
+    df_status_new['pStation'] = stations.pkey(df_status['STATIONPID'])
+    prefix = df_status['PREFSUFFID']
+    states = prefix.astype(str).str.upper().map(prefix_suffixes_map).fillna(0).astype('int64') + 200
+    df_status_new['pStates'] = states.where(prefix.notna() & (prefix.astype(str) != ''), 0)
     df_status_new['pALARM_GROUP'] = 1
-    df_status_new['pConfiguredAORGroup'] = df_status['USERTYPEID']
+    df_status_new['pConfiguredAORGroup'] = aor.point_groups(df_status['STATIONPID'], df_status['ZONEID'],
+                                                           df_status['USERTYPEID'])
     df_status_new['ConfigNormalState'] = df_status['NORMSTATE']
+    # Legacy station name and PKEY, kept for the point reference index
+    df_status_new['StationName'] = df_status['STATIONPID']
+    df_status_new['PKey'] = df_status['PKEY']
     
     
     integer_columns = ['Type', 'pStation', 'pStates', 'pALARM_GROUP', 'ConfigNormalState']
@@ -202,157 +328,145 @@ def process_status_points(df_station):
         df_status_new[col] = df_status_new[col].fillna(default_values[col]).astype('int32')
     
     # Create Key column
-    def create_key(row, station_counter):
-        xx = str(row['Type']).zfill(2)
-        yyy = str(row['pStation']).zfill(3)
-        zzz = str(station_counter[row['pStation']]).zfill(3)
-        station_counter[row['pStation']] += 1
-        return f"{xx}{yyy}{zzz}"
-
-    station_counter = {station: 1 for station in df_status_new['pStation'].unique()}
-    df_status_new['Key'] = df_status_new.apply(lambda row: create_key(row, station_counter), axis=1)
+    df_status_new['Key'] = allocator.allocate(df_status_new['Type'], df_status_new['pStation'])
     
     return df_status_new
 
-def process_measurement_units():
-    csv_path = os.path.join('..', 'Inputs', 'MeasurementUnits.CSV')
-    
+def convert_analog_points_chunked(stations, aor, chunksize):
+    """Read, convert and write AnalogPoints.csv chunk by chunk, return the number of points.
+
+    Key counters and record numbers carry over from one chunk to the next, so the
+    output is the same as a full conversion while only one chunk is in memory.
+    """
+    csv_path = os.path.join('..', 'Inputs', 'AnalogPoints.csv')
     if not os.path.exists(csv_path):
         print(f"Error: Could not find the file at {csv_path}")
         return None
-    
-    #print(f"File found: {csv_path}")
-    df = pd.read_csv(csv_path)
-    
-    xref_columns = ['Desc']
 
-    # Create Xref DataFrame
-    ##################
-    df_xref = df[xref_columns].copy()
+    xref_path = os.path.join('..', 'Xrefs', 'analog_xref.csv')
+    analog_filename = os.path.join('..', 'Dat_files', 'analog_dat.dat')
+    chunks = read_typed_chunks(csv_path, chunksize)
+    if chunks is None:
+        return None
+    chunks = measured_chunks(chunks, 'AnalogPoints.csv')
+    try:
+        rows = write_chunks(chunks, ANALOG_COLUMNS, xref_path, analog_filename, ANALOG_TABLE, 'A', 'analog',
+                            lambda df, allocator: build_analog_frame(df, stations, aor, allocator))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
 
-    # Save Xref file
-    xref_folder = os.path.join('..', 'Xrefs')
-    if not os.path.exists(xref_folder):
-        os.makedirs(xref_folder)
-    xref_path = os.path.join(xref_folder, 'measurement_units_xref.csv')
-    df_xref.to_csv(xref_path, index=False)
+    stations.report_unmatched('analog')
     print(f"Xref file generated: {xref_path}")
-    ####################
+    print(f".dat file generated: {analog_filename}")
+    return rows
 
+def convert_status_points_chunked(stations, aor, chunksize):
+    """Read, convert and write StatusPoints.csv chunk by chunk, return the number of points."""
+    csv_path = os.path.join('..', 'Inputs', 'StatusPoints.csv')
+    if not os.path.exists(csv_path):
+        print(f"Error: Could not find the file at {csv_path}")
+        return None
 
-    df_unit = pd.DataFrame()
-    df_unit['record'] = range(1, len(df) + 1)
-    df_unit['NAME'] = df['Desc']
-    
-    return df_unit
+    df_prefix_suffixes = read_prefix_suffixes()
+    if df_prefix_suffixes is None:
+        return None
+
+    xref_path = os.path.join('..', 'Xrefs', 'status_xref.csv')
+    status_filename = os.path.join('..', 'Dat_files', 'status_dat.dat')
+    chunks = read_typed_chunks(csv_path, chunksize)
+    if chunks is None:
+        return None
+    chunks = measured_chunks(chunks, 'StatusPoints.csv')
+    try:
+        rows = write_chunks(chunks, STATUS_XREF_COLUMNS, xref_path, status_filename, STATUS_TABLE, 'S', 'status',
+                            lambda df, allocator: build_status_frame(df, stations, aor, df_prefix_suffixes, allocator))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+    stations.report_unmatched('status')
+    print(f"Xref file generated: {xref_path}")
+    print(f".dat file generated: {status_filename}")
+    return rows
+
+def write_chunks(chunks, xref_columns, xref_path, dat_path, table, point_type, name, build_frame):
+    """Append the xref rows, .dat records and point index rows of each chunk, return the number of rows."""
+    os.makedirs(os.path.dirname(xref_path), exist_ok=True)
+    allocator = KeyAllocator()
+    index_path = point_index_path(point_type)
+    with open(xref_path, 'w', newline='') as xref_file, DatWriter(dat_path, table) as writer:
+        for number, df in enumerate(chunks):
+            with measure('xref', os.path.basename(xref_path), rows_in=len(df)) as step:
+                position = xref_file.tell()
+                df[xref_columns].to_csv(xref_file, header=(number == 0), index=False)
+                step['rows_out'] = len(df)
+                step['bytes_written'] = xref_file.tell() - position
+            with measure('transform', name, rows_in=len(df)) as step:
+                df_new = build_frame(df, allocator)
+                step['rows_out'] = len(df_new)
+                step['frame_mb'] = frame_mb(df_new)
+            first_record = writer.records + 1
+            writer.write(df_new)
+            with measure('index', os.path.basename(index_path)) as step:
+                position = file_size(index_path) if number else 0
+                write_point_index(point_index_rows(df_new['StationName'], df_new['Name'], point_type, df_new['Key'],
+                                                   df_new['PKey'], first_record), index_path, append=(number > 0))
+                step['rows_out'] = len(df_new)
+                step['bytes_written'] = file_size(index_path) - position
+    return writer.records
+
+STATION_TABLE = DatTable(
+    name='STATION', number=2, fields=['0', '3', '4', '13'],
+    columns=['Order', 'Order', 'Key', 'Name', 'pAORGroup'],
+    header=["*", "*", "* Creation Date/Time: {now}", "*", "*\tOrder\tKey\tName\tAOR", "*", "{fields}", "*"],
+    quoted=('Key', 'Name'))
+
+ANALOG_TABLE = DatTable(
+    name='ANALOG', number=5,
+    fields=['0', '1', '2', '3', '4', '5', '6', '7', '23', '24', '64',
+            '77:0', '77:1', '77:2', '77:3', '77:4', '78:0', '78:1', '78:2', '78:3', '78:4'],
+    columns=['record', 'orderNo', 'Type', 'Key', 'Name', 'pStation', 'pUNIT', 'pScale', 'pConfiguredAORGroup',
+             'NominalHiLimits1', 'NominalHiLimits2', 'NominalHiLimits3', 'NominalHiLimits4', 'NominalHiLimitsRnblty',
+             'NominalLowLimits1', 'NominalLowLimits2', 'NominalLowLimits3', 'NominalLowLimits4', 'NominalLowLimitsRnblty'],
+    header=["*", "{fields}",
+            "*\trecord\torderNo\tType\tKey\tName\tpStation\tpUNIT\tpScale\tpConfiguredAORGroup\t"
+            "NominalHiLimits77:0\tNominalHiLimits77:1\tNominalHiLimits77:2\tNominalHiLimits77:3\tNominalHiLimitsRnblty77:4\t"
+            "NominalLowLimits78:0\tNominalLowLimits78:1\tNominalLowLimits78:2\tNominalLowLimits78:3\tNominalLowLimitsRnblty78:4",
+            "*"],
+    quoted=('Key', 'Name'),
+    numbered=('record', 'orderNo'))
+
+STATUS_TABLE = DatTable(
+    name='STATUS', number=4, fields=['0', '1', '3', '4', '5', '19', '29', '40', '49'],
+    columns=['record', 'OrderNo', 'Type', 'Key', 'Name', 'pStation', 'pStates', 'pALARM_GROUP',
+             'pConfiguredAORGroup', 'ConfigNormalState'],
+    header=["*", "{fields}",
+            "*\trecord\tOrderNo\tType\tKey\tName\tpStation\tpStates\tpALARM_GROUP\tpConfiguredAORGroup\tConfigNormalState"],
+    quoted=('Key', 'Name'),
+    numbered=('record', 'OrderNo'),
+    constants={'Type': 1, 'pALARM_GROUP': 1})
 
 def generate_station_dat(df_station):
     dat_folder = os.path.join('..', 'Dat_files')
-    if not os.path.exists(dat_folder):
-        os.makedirs(dat_folder)
-    
     station_filename = os.path.join(dat_folder, "station_dat.dat")
-    
-    now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    
-    with open(station_filename, 'w') as f:
-        f.write("*\n")
-        f.write("*\n")
-        f.write(f"* Creation Date/Time: {now}\n")
-        f.write("*\n")
-        f.write("*\tOrder\tKey\tName\tAOR\n")
-        f.write("*\n")
-        f.write("\t2\tSTATION\t0\t3\t4\t13\n")
-        f.write("*\n")
-        
-        for _, row in df_station.iterrows():
-            
-            order = row.get('Order', '')
-            key = row.get('Key', '')
-            name = row.get('Name', '')
-            paorgroup = row.get('pAORGroup', '')
-            f.write(f"\t{order}\t{order}\t'{key}'\t'{name}'\t1\n")
-        
-        f.write(" 0")
-    
+    write_dat(station_filename, STATION_TABLE, df_station)
     print(f".dat file generated: {station_filename}")
 
 
 def generate_analog_dat(df_analog):
     dat_folder = os.path.join('..', 'Dat_files')
-    if not os.path.exists(dat_folder):
-        os.makedirs(dat_folder)
-    
     analog_filename = os.path.join(dat_folder, "analog_dat.dat")
-    
-    now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    
-    with open(analog_filename, 'w') as f:
-
-        f.write("*\n")
-        f.write("\t5\tANALOG\t0\t1\t2\t3\t4\t5\t6\t7\t23\t24\t64\t77:0\t77:1\t77:2\t77:3\t77:4\t78:0\t78:1\t78:2\t78:3\t78:4\n")
-        f.write("*\trecord\torderNo\tType\tKey\tName\tpStation\tpUNIT\tpScale\tpConfiguredAORGroup\t"
-                "NominalHiLimits77:0\tNominalHiLimits77:1\tNominalHiLimits77:2\tNominalHiLimits77:3\tNominalHiLimitsRnblty77:4\t"
-                "NominalLowLimits78:0\tNominalLowLimits78:1\tNominalLowLimits78:2\tNominalLowLimits78:3\tNominalLowLimitsRnblty78:4\n")
-        f.write("*\n")
-        
-        for index, row in df_analog.iterrows():
-            record_order = index + 1
-            f.write(f"\t{record_order}\t{record_order}\t{row['Type']}\t'{row['Key']}'\t'{row['Name']}'\t{row['pStation']}\t"
-                    f"{row['pUNIT']}\t{row['pScale']}\t{row['pConfiguredAORGroup']}\t"
-                    f"{row['NominalHiLimits1']}\t{row['NominalHiLimits2']}\t{row['NominalHiLimits3']}\t{row['NominalHiLimits4']}\t{row['NominalHiLimitsRnblty']}\t"
-                    f"{row['NominalLowLimits1']}\t{row['NominalLowLimits2']}\t{row['NominalLowLimits3']}\t{row['NominalLowLimits4']}\t{row['NominalLowLimitsRnblty']}\n")
-        
-        f.write(" 0")
-    
+    write_dat(analog_filename, ANALOG_TABLE, df_analog)
     print(f".dat file generated: {analog_filename}")
 
 
 def generate_status_dat(df_status):
     dat_folder = os.path.join('..', 'Dat_files')
-    if not os.path.exists(dat_folder):
-        os.makedirs(dat_folder)
-
     status_filename = os.path.join(dat_folder, "status_dat.dat")
-
-    with open(status_filename, 'w') as f:
-        f.write("*\n")
-        f.write("\t4\tSTATUS\t0\t1\t3\t4\t5\t19\t29\t40\t49\n")
-        f.write("*\trecord\tOrderNo\tType\tKey\tName\tpStation\tpStates\tpALARM_GROUP\tpConfiguredAORGroup\tConfigNormalState\n")
-
-        for index, row in df_status.iterrows():
-            record = index + 1
-            f.write(f"\t{record}\t{record}\t1\t'{row.get('Key', '')}'\t'{row.get('Name', '')}'\t{int(row.get('pStation', 0))}\t"
-                    f"{row.get('pStates', '')}\t1\t1\t{row.get('ConfigNormalState', '')}\n")
-        
-        f.write(" 0")
-    
+    write_dat(status_filename, STATUS_TABLE, df_status)
     print(f".dat file generated: {status_filename}")
 
-def generate_unit_dat(df_unit):
-    dat_folder = os.path.join('..', 'Dat_files')
-    if not os.path.exists(dat_folder):
-        os.makedirs(dat_folder)
-    
-    unit_filename = os.path.join(dat_folder, "unit_dat.dat")
-    
-    now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    
-    with open(unit_filename, 'w') as f:
-        f.write("*\n")
-
-        f.write("*\n")
-        f.write("\t2\tUNIT\t0\t1\n")
-        f.write("*\trecord\tNAME\n")
-        f.write("*\n")
-        
-        for _, row in df_unit.iterrows():
-            f.write(f"\t{row.get('record', '')}\t'{row.get('NAME', '')}'\n")
-        
-        f.write(" 0")
-    
-    print(f".dat file generated: {unit_filename}")
-
 if __name__ == "__main__":
     scada_processing()
 
@@ -0,0 +1,212 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from Dat_reader import DatFile
+from Merging_scada import OUTPUT_FOLDER, scada_output_path
+from Run_metrics import file_size, measure
+from Stage_scheduler import Stage
+
+DELTA_CODE = ['Scada_delta.py', 'Dat_reader.py']
+
+# Records read per step, the hashes of a whole table are the only per-record state kept
+DELTA_CHUNK = 200_000
+
+# Column identifying a record in each table; other tables use 'Key' when they have it
+DELTA_KEYS = {
+    'STATION': '3',
+    'UNIT': 'Name',
+    'AOR_GROUP': 'Name',
+}
+# Record numbers shift when a record is added before them, they are not compared
+ORDER_COLUMNS = {'record', 'OrderNo', 'orderNo', 'Order', '0'}
+
+ACTIONS = ('ADD', 'MODIFY', 'DELETE')
+
+
+def delta_path(output_path):
+    return os.path.splitext(output_path)[0] + '_delta.dat'
+
+
+def previous_build(output_path, folder=OUTPUT_FOLDER):
+    """Latest SCADA_yymmdd.dat in the output folder other than output_path, or None."""
+    current = os.path.abspath(output_path)
+    builds = [path for path in glob.glob(os.path.join(folder, 'SCADA_[0-9]*.dat'))
+              if os.path.abspath(path) != current and not path.endswith('_delta.dat')]
+    return max(builds, key=lambda path: (os.path.basename(path), os.path.getmtime(path))) if builds else None
+
+
+def key_column(info):
+    if info.name in DELTA_KEYS and DELTA_KEYS[info.name] in info.columns:
+        return DELTA_KEYS[info.name]
+    return 'Key' if 'Key' in info.columns else info.columns[0]
+
+
+def table_hashes(dat, name, chunksize=DELTA_CHUNK):
+    """Hash the key and the compared values of every record of a table, one chunk at a time.
+
+    Returns a frame of uint64 key hash, occurrence of the key, uint64 record hash and
+    position of the record in the table: 24 bytes per record, whatever the record width.
+    """
+    info = dat.table(name)
+    key = key_column(info)
+    values = [column for column in info.columns if column not in ORDER_COLUMNS]
+    parts = []
+    position = 0
+    for chunk in dat.frame(name, chunksize=chunksize, dtype=str):
+        parts.append(pd.DataFrame({
+            'key': pd.util.hash_pandas_object(chunk[key], index=False).to_numpy(),
+            'hash': pd.util.hash_pandas_object(chunk[values], index=False).to_numpy(),
+            'position': np.arange(position, position + len(chunk)),
+        }))
+        position += len(chunk)
+    hashes = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        {'key': np.array([], dtype='uint64'), 'hash': np.array([], dtype='uint64'), 'position': np.array([], dtype='int64')})
+    # Repeated keys are paired in file order
+    hashes['occurrence'] = hashes.groupby('key').cumcount()
+    return hashes
+
+
+def compare_hashes(old, new):
+    """Positions of added and modified records in new, of deleted records in old."""
+    joined = old.merge(new, on=['key', 'occurrence'], how='outer', suffixes=('_old', '_new'), indicator=True)
+    added = joined.loc[joined['_merge'] == 'right_only', 'position_new']
+    deleted = joined.loc[joined['_merge'] == 'left_only', 'position_old']
+    both = joined[joined['_merge'] == 'both']
+    modified = both.loc[both['hash_old'] != both['hash_new'], 'position_new']
+    return {
+        'ADD': np.sort(added.to_numpy(dtype='int64')),
+        'MODIFY': np.sort(modified.to_numpy(dtype='int64')),
+        'DELETE': np.sort(deleted.to_numpy(dtype='int64')),
+        'unchanged': int(len(both) - len(modified)),
+    }
+
+
+def selected_lines(dat, name, positions, chunksize=DELTA_CHUNK):
+    """Yield the raw lines of a table at the given sorted positions."""
+    if not len(positions):
+        return
+    start = 0
+    for lines in dat.lines(name, chunksize):
+        wanted = positions[(positions >= start) & (positions < start + len(lines))] - start
+        start += len(lines)
+        if len(wanted):
+            yield from lines.to_numpy()[wanted]
+
+
+def table_line(info):
+    return '\t' + '\t'.join([str(info.number), info.name] + info.fields)
+
+
+def write_delta(previous_path, current_path, output_path, chunksize=DELTA_CHUNK):
+    """Write the records added, modified and deleted since previous_path, return the summary.
+
+    Each table gets one block per action: a '* ADD|MODIFY|DELETE' comment, the table
+    line, the records as written in their build and the ' 0' terminator. Added and
+    modified records carry their new record number, deleted ones their old number.
+    """
+    summary = {'previous': os.path.basename(previous_path), 'current': os.path.basename(current_path), 'tables': {}}
+    folder = os.path.dirname(output_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(output_path), suffix='.tmp')
+    try:
+        with DatFile(previous_path) as old, DatFile(current_path) as new, \
+                os.fdopen(fd, 'w', buffering=1 << 20) as out:
+            database = new.database or (10, 'SCADA.DB')
+            out.write(f"{database[0]} {database[1]}\n")
+            out.write(f"* Delta from {summary['previous']} to {summary['current']}\n*\n")
+            for name in list(new.tables) + [name for name in old.tables if name not in new.tables]:
+                with measure('transform', f'delta {name}') as step:
+                    new_hashes = table_hashes(new, name, chunksize) if name in new.tables else None
+                    old_hashes = table_hashes(old, name, chunksize) if name in old.tables else None
+                    if new_hashes is None:
+                        new_hashes = old_hashes.iloc[:0]
+                    if old_hashes is None:
+                        old_hashes = new_hashes.iloc[:0]
+                    changes = compare_hashes(old_hashes, new_hashes)
+                    step['rows_in'] = len(new_hashes)
+                    step['rows_out'] = sum(len(changes[action]) for action in ACTIONS)
+
+                for action in ACTIONS:
+                    positions = changes[action]
+                    if not len(positions):
+                        continue
+                    source = old if action == 'DELETE' else new
+                    out.write(f"* {action}\n{table_line(source.table(name))}\n")
+                    for line in selected_lines(source, name, positions, chunksize):
+                        out.write(line + '\n')
+                    out.write(" 0\n")
+                summary['tables'][name] = {
+                    'added': len(changes['ADD']),
+                    'modified': len(changes['MODIFY']),
+                    'deleted': len(changes['DELETE']),
+                    'unchanged': changes['unchanged'],
+                }
+            out.write("0")
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+    summary['changed'] = sum(t['added'] + t['modified'] + t['deleted'] for t in summary['tables'].values())
+    summary['file'] = os.path.basename(output_path)
+    summary['bytes'] = file_size(output_path)
+    with open(output_path + '.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_delta_summary(summary):
+    print(f"Delta {summary['previous']} -> {summary['current']}: {summary['changed']} changed records")
+    print(f"{'Table':<14}{'Added':>9}{'Modified':>10}{'Deleted':>9}{'Unchanged':>11}")
+    for name, counts in summary['tables'].items():
+        print(f"{name:<14}{counts['added']:>9}{counts['modified']:>10}{counts['deleted']:>9}{counts['unchanged']:>11}")
+
+
+def write_scada_delta(previous_path=None):
+    """Compare today's SCADA build with the previous one and write the delta, return the summary or None."""
+    current_path = scada_output_path()
+    if not os.path.exists(current_path):
+        print(f"Error: No se pudo encontrar el archivo en {current_path}")
+        return None
+    previous_path = previous_path or previous_build(current_path)
+    if previous_path is None:
+        print("Error: No previous SCADA build found, delta not written")
+        return None
+    summary = write_delta(previous_path, current_path, delta_path(current_path))
+    print_delta_summary(summary)
+    print(f"Archivo {summary['file']} generado correctamente")
+    return summary
+
+
+def delta_stage(previous_path=None):
+    """Stage writing the delta after merge_scada, which produces its input."""
+    current_path = scada_output_path()
+    previous_path = previous_path or previous_build(current_path)
+    inputs = [current_path] + ([previous_path] if previous_path else [])
+    output = delta_path(current_path)
+    return Stage('delta_scada', partial(write_scada_delta, previous_path), inputs=inputs,
+                 outputs=[output, output + '.json'], code=DELTA_CODE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the records that changed between two SCADA builds")
+    parser.add_argument('previous', nargs='?', help="Previous build (default: latest other SCADA_*.dat)")
+    parser.add_argument('current', nargs='?', help="New build (default: today's SCADA_yymmdd.dat)")
+    parser.add_argument('--output', help="Delta file (default: <current>_delta.dat)")
+    args = parser.parse_args()
+    if args.current:
+        previous = args.previous or previous_build(args.current)
+        if previous is None:
+            print("Error: No previous SCADA build found, delta not written")
+            sys.exit(1)
+        result = write_delta(previous, args.current, args.output or delta_path(args.current))
+        print_delta_summary(result)
+    elif write_scada_delta(args.previous) is None:
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from Input_cache import file_digest
+
+MANIFEST_PATH = os.path.join('..', '.cache', 'manifest.json')
+
+# Bump when the mapping rules change without a code change, to force a full rebuild
+MAPPING_VERSION = 1
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Return the stage records of the last build, or an empty manifest."""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    """Write the manifest atomically."""
+    folder = os.path.dirname(manifest_path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def path_digest(path):
+    """Digest of a file, or None if it does not exist."""
+    return file_digest(path) if os.path.exists(path) else None
+
+
+def code_digest(code_files):
+    """Digest of the conversion scripts a stage runs, plus the mapping version."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(MAPPING_VERSION).encode())
+    for name in sorted(code_files):
+        digest.update(name.encode())
+        digest.update(str(path_digest(os.path.join(SCRIPTS_FOLDER, name))).encode())
+    return digest.hexdigest()
+
+
+def stage_signature(inputs, code_files, options=None):
+    """Everything a stage's outputs depend on."""
+    signature = {
+        'inputs': {path: path_digest(path) for path in inputs},
+        'code': code_digest(code_files),
+    }
+    # Only stages with options record them, the others keep their manifest entries
+    if options:
+        signature['options'] = options
+    return signature
+
+
+def is_up_to_date(manifest, stage_name, signature, outputs):
+    """True if the stage last ran with the same signature and its outputs are untouched."""
+    record = manifest.get(stage_name)
+    if record is None or record.get('signature') != signature:
+        return False
+    recorded_outputs = record.get('outputs', {})
+    if sorted(recorded_outputs) != sorted(outputs):
+        return False
+    return all(path_digest(path) == digest for path, digest in recorded_outputs.items())
+
+
+def record_stage(manifest, stage_name, signature, outputs):
+    """Remember the signature and the outputs produced by a successful stage run."""
+    manifest[stage_name] = {
+        'signature': signature,
+        'outputs': {path: path_digest(path) for path in outputs},
+    }
@@ -0,0 +1,274 @@
+import os
+import time
+from dataclasses import dataclass, field
+
+from Run_metrics import peak_rss_mb, take_steps
+from Stage_manifest import MANIFEST_PATH, load_manifest, save_manifest, stage_signature, is_up_to_date, record_stage
+
+
+@dataclass
+class Stage:
+    """One step of the conversion graph."""
+    name: str
+    func: object                                  # Module level function, called with the results of deps
+    deps: tuple = ()                              # Stages whose results are passed to func, in order
+    inputs: list = field(default_factory=list)    # Files read by the stage
+    outputs: list = field(default_factory=list)   # Files written by the stage
+    code: list = field(default_factory=list)      # Scripts whose changes invalidate the outputs
+    restore: object = None                        # Rebuilds the result without writing when skipped, called like func
+    after: tuple = ()                             # Stages that must succeed first, without passing their result
+    options: dict = field(default_factory=dict)   # Settings that change the outputs, part of the signature
+    check: object = None                          # Called before skipping an up to date stage, False runs it again
+
+
+def timed_call(func, args, profile_path=None):
+    """Run a stage function and measure it inside the worker.
+
+    Returns the result, the wall time and the CPU time, peak memory and steps measured
+    while it ran. With a profile_path the call runs under cProfile and the stats are dumped there.
+    """
+    # Steps left over by a previous call in this worker are not part of this stage
+    take_steps()
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = profiler.runcall(func, *args) if profiler else func(*args)
+    elapsed = time.perf_counter() - start
+    if profiler:
+        profiler.dump_stats(profile_path)
+    metrics = {
+        'cpu_seconds': time.process_time() - cpu_start,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'steps': take_steps(),
+    }
+    return result, elapsed, metrics
+
+
+def stage_predecessors(stages):
+    """Return the stages each stage waits for: its deps and after stages plus the producers of its input files."""
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            producers[os.path.normpath(path)] = stage.name
+
+    names = {stage.name for stage in stages}
+    predecessors = {}
+    for stage in stages:
+        unknown = (set(stage.deps) | set(stage.after)) - names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {sorted(unknown)}")
+        preds = set(stage.deps) | set(stage.after)
+        preds.update(producers[p] for p in map(os.path.normpath, stage.inputs) if p in producers)
+        preds.discard(stage.name)
+        predecessors[stage.name] = preds
+    return predecessors
+
+
+def topological_order(stages, predecessors):
+    """Order stages so every stage comes after its predecessors, keeping declaration order otherwise."""
+    order = []
+    done = set()
+    remaining = [stage.name for stage in stages]
+    while remaining:
+        ready = [name for name in remaining if predecessors[name] <= done]
+        if not ready:
+            raise ValueError(f"Cycle between stages: {remaining}")
+        order.extend(ready)
+        done.update(ready)
+        remaining = [name for name in remaining if name not in done]
+    return order
+
+
+def critical_path(order, predecessors, seconds):
+    """Return the chain of stages with the largest total time, and that time."""
+    finish = {}
+    previous = {}
+    for name in order:
+        before = max(predecessors[name], key=lambda p: finish[p], default=None)
+        finish[name] = seconds.get(name, 0.0) + (finish[before] if before else 0.0)
+        previous[name] = before
+
+    if not finish:
+        return [], 0.0
+    name = max(finish, key=finish.get)
+    total = finish[name]
+    path = []
+    while name:
+        path.append(name)
+        name = previous[name]
+    return path[::-1], total
+
+
+def run_stages(stages, force=False, workers=None, manifest_path=MANIFEST_PATH, profile_dir=None, warm=None):
+    """Run the stages in dependency order, independent ones in parallel worker processes.
+
+    A stage whose inputs, code and outputs match the manifest, and whose check if any
+    passes, is skipped. A stage that returns None or raises is failed, and the stages
+    after it are not run. So is a skipped stage whose result cannot be restored for a
+    later stage.
+    With a profile_dir every stage is profiled and the profile of the slowest one is kept.
+    A warm dict kept between calls holds the results of the stages, so a skipped stage
+    with the same signature is not restored again.
+    """
+    # Imported on first run, so commands that never run stages start faster
+    from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+    by_name = {stage.name: stage for stage in stages}
+    predecessors = stage_predecessors(stages)
+    order = topological_order(stages, predecessors)
+    workers = workers or os.cpu_count() or 1
+
+    manifest = load_manifest(manifest_path)
+    status = {}
+    seconds = {}
+    results = {}
+    signatures = {}
+    metrics = {}
+    running = {}
+    start_time = time.perf_counter()
+
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    def profile_path(name):
+        return os.path.join(profile_dir, f'{name}.prof') if profile_dir else None
+
+    def submit(name, func, args):
+        if executor is not None:
+            return executor.submit(timed_call, func, args, profile_path(name))
+        # Single worker: run in this process
+        future = Future()
+        try:
+            future.set_result(timed_call(func, args, profile_path(name)))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def dependency_result(name):
+        # A skipped stage only rebuilds its result when a later stage needs it
+        if name not in results and warm is not None and name in warm and warm[name][0] == signatures.get(name):
+            results[name] = warm[name][1]
+        if name not in results:
+            stage = by_name[name]
+            args = tuple(dependency_result(dep) for dep in stage.deps)
+            result, elapsed = None, 0.0
+            if any(status.get(dep) == 'failed' for dep in stage.deps):
+                print(f"Error: Stage {name} not restored, a stage it depends on failed")
+            elif stage.restore:
+                # A restore that raises or returns None fails the stage like a run would
+                try:
+                    result, elapsed, _ = timed_call(stage.restore, args)
+                except Exception as e:
+                    print(f"Error: Stage {name} could not be restored: {e!r}")
+            if result is None and (stage.restore or stage.deps):
+                status[name] = 'failed'
+            results[name] = result
+            seconds[name] += elapsed
+            if warm is not None and result is not None and name in signatures:
+                warm[name] = (signatures[name], result)
+        return results[name]
+
+    def start_ready():
+        for name in order:
+            if name in status:
+                continue
+            preds = predecessors[name]
+            if any(status.get(p) in ('failed', 'blocked') for p in preds):
+                status[name] = 'blocked'
+                seconds[name] = 0.0
+                print(f"Stage {name} not run, a previous stage failed")
+                continue
+            if not all(status.get(p) in ('ran', 'skipped') for p in preds):
+                continue
+
+            stage = by_name[name]
+            check_start = time.perf_counter()
+            if stage.code:
+                signatures[name] = stage_signature(stage.inputs, stage.code, stage.options)
+                if (not force and is_up_to_date(manifest, name, signatures[name], stage.outputs)
+                        and (stage.check is None or stage.check())):
+                    status[name] = 'skipped'
+                    seconds[name] = time.perf_counter() - check_start
+                    print(f"Stage {name} is up to date, skipping")
+                    continue
+
+            args = tuple(dependency_result(dep) for dep in stage.deps)
+            if any(status.get(dep) == 'failed' for dep in stage.deps):
+                status[name] = 'blocked'
+                seconds[name] = 0.0
+                print(f"Stage {name} not run, a previous stage failed")
+                continue
+            status[name] = 'running'
+            running[submit(name, stage.func, args)] = name
+
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    try:
+        start_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result, elapsed, metrics[name] = future.result()
+                except Exception as e:
+                    print(f"Error: Stage {name} failed: {e!r}")
+                    result, elapsed = None, 0.0
+                seconds[name] = elapsed
+                if result is None:
+                    status[name] = 'failed'
+                    continue
+                status[name] = 'ran'
+                results[name] = result
+                if warm is not None and name in signatures:
+                    warm[name] = (signatures[name], result)
+                if name in signatures:
+                    record_stage(manifest, name, signatures[name], by_name[name].outputs)
+                    save_manifest(manifest, manifest_path)
+            start_ready()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    path, path_seconds = critical_path(order, predecessors, seconds)
+    report = {
+        'stages': {name: dict({'status': status[name], 'seconds': seconds[name]}, **metrics.get(name, {}))
+                   for name in order},
+        'critical_path': path,
+        'critical_path_seconds': path_seconds,
+        'total_seconds': time.perf_counter() - start_time,
+        'workers': workers,
+    }
+    if profile_dir:
+        report['profile'] = keep_hottest_profile(profile_dir, metrics, seconds)
+    print_stage_report(report)
+    return report
+
+
+def keep_hottest_profile(profile_dir, metrics, seconds):
+    """Keep the profile of the slowest stage that ran, delete the others, return its path."""
+    ran = [name for name in metrics if os.path.exists(os.path.join(profile_dir, f'{name}.prof'))]
+    if not ran:
+        return None
+    hottest = max(ran, key=lambda name: seconds[name])
+    for name in ran:
+        if name != hottest:
+            os.remove(os.path.join(profile_dir, f'{name}.prof'))
+    path = os.path.join(profile_dir, f'{hottest}.prof')
+    print(f"Profile of the slowest stage ({hottest}): {path}")
+    return path
+
+
+def print_stage_report(report):
+    """Print per stage wall times and the critical path."""
+    print(f"{'Stage':<20}{'Status':<10}{'Seconds':>10}")
+    for name, info in report['stages'].items():
+        print(f"{name:<20}{info['status']:<10}{info['seconds']:>10.3f}")
+    print(f"Critical path: {' -> '.join(report['critical_path'])} ({report['critical_path_seconds']:.3f} s)")
+    print(f"Wall time with {report['workers']} worker(s): {report['total_seconds']:.3f} s")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+
+def station_names(names):
+    """Upper case names without surrounding blanks, missing as ''."""
+    return names.astype('string').str.strip().str.upper().fillna('')
+
+
+class StationIndex:
+    """Case and blank insensitive index of the converted stations, from legacy name to Order and PKEY.
+
+    Built once by the station stage and handed to the analog and status stages, which
+    resolve whole STATIONPID columns with one lookup. Names that match no station map
+    to 0, as before, and are counted in unmatched.
+    """
+
+    def __init__(self, df_station):
+        keys = station_names(df_station['Key'])
+        # Last occurrence wins on duplicated names, as with a dict built in file order
+        unique = ~keys.duplicated(keep='last').to_numpy() & (keys != '').to_numpy()
+        self.index = pd.Index(keys[unique].to_numpy())
+        self.orders = df_station['Order'].to_numpy()[unique]
+        self.pkeys = df_station['PKEY'].to_numpy()[unique]
+        self.unmatched = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, names, values):
+        upper = station_names(names)
+        positions = self.index.get_indexer(upper.to_numpy())
+        found = positions >= 0
+        if not found.all():
+            for name, count in upper[~found].value_counts(sort=False).items():
+                self.unmatched[name] = self.unmatched.get(name, 0) + int(count)
+        result = np.zeros(len(positions), dtype=values.dtype)
+        result[found] = values[positions[found]]
+        return pd.Series(result, index=names.index)
+
+    def order(self, names):
+        """Station Order of each name, 0 when unmatched."""
+        return self.lookup(names, self.orders)
+
+    def pkey(self, names):
+        """Station PKEY of each name, 0 when unmatched."""
+        return self.lookup(names, self.pkeys)
+
+    def report_unmatched(self, label):
+        """Print the station names that matched nothing since the last report, and forget them."""
+        if self.unmatched:
+            total = sum(self.unmatched.values())
+            names = sorted(self.unmatched, key=self.unmatched.get, reverse=True)
+            shown = ', '.join(f"{name or '<blank>'} ({self.unmatched[name]})" for name in names[:10])
+            more = f" and {len(names) - 10} more" if len(names) > 10 else ''
+            print(f"Warning: {total} {label} points reference {len(names)} unknown stations, pStation set to 0: {shown}{more}")
+        unmatched = self.unmatched
+        self.unmatched = {}
+        return unmatched
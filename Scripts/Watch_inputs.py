@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import datetime
+
+from Input_cache import keep_inputs_in_memory
+from Run_metrics import write_run_report
+from Stage_scheduler import run_stages
+
+INPUT_FOLDER = os.path.join('..', 'Inputs')
+WATCHED_FOLDERS = [INPUT_FOLDER, os.path.join('..', 'Mappings')]
+
+# Seconds between two looks at the inputs
+POLL_SECONDS = 0.5
+
+
+def input_snapshot(folders=WATCHED_FOLDERS):
+    """Size and mtime of every file of the folders; cheap enough to take every poll."""
+    snapshot = {}
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.startswith(('.', '~$')):
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def changed_files(before, after):
+    return sorted(path for path in set(before) | set(after) if before.get(path) != after.get(path))
+
+
+def wait_for_change(snapshot, poll_seconds=POLL_SECONDS):
+    """Block until the watched files change and stop changing, return the new snapshot and the changed files."""
+    while True:
+        time.sleep(poll_seconds)
+        current = input_snapshot()
+        if current == snapshot:
+            continue
+        # Exports are written in several steps, wait until a poll finds nothing new
+        while True:
+            time.sleep(poll_seconds)
+            settled = input_snapshot()
+            if settled == current:
+                break
+            current = settled
+        return current, changed_files(snapshot, current)
+
+
+def watch(stages_factory, poll_seconds=POLL_SECONDS, max_runs=None, force=False, report_path=None, profile_dir=None):
+    """Convert, then convert again each time an input changes, until interrupted.
+
+    The process stays alive between runs, so pandas, the parsed inputs and the stage
+    results (the StationIndex among them) are kept warm. Each run goes through the
+    manifest, so only the stages whose inputs changed are run, then merge_scada.
+    With force only the first run rebuilds every stage. A report_path is rewritten
+    after every run, and profile_dir keeps the profile of the slowest stage of the last one.
+    """
+    keep_inputs_in_memory()
+    warm = {}
+    runs = 0
+    snapshot = input_snapshot()
+    print(f"Watching {', '.join(WATCHED_FOLDERS)} every {poll_seconds} s, Ctrl+C to stop")
+    try:
+        while True:
+            start = time.perf_counter()
+            report = run_stages(stages_factory(), force=force and runs == 0, workers=1, warm=warm,
+                                profile_dir=profile_dir)
+            if report_path:
+                write_run_report(report, report_path)
+            ran = [name for name, info in report['stages'].items() if info['status'] == 'ran']
+            failed = [name for name, info in report['stages'].items() if info['status'] in ('failed', 'blocked')]
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Ran {', '.join(ran) or 'nothing'} in "
+                  f"{time.perf_counter() - start:.2f} s" + (f", failed: {', '.join(failed)}" if failed else ""))
+            runs += 1
+            if max_runs is not None and runs >= max_runs:
+                return runs
+            snapshot, changed = wait_for_change(snapshot, poll_seconds)
+            print(f"Changed: {', '.join(os.path.basename(path) for path in changed)}")
+    except KeyboardInterrupt:
+        print("Watch stopped")
+    finally:
+        keep_inputs_in_memory(False)
+    return runs
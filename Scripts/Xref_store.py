@@ -0,0 +1,175 @@
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from Point_index import POINT_INDEX_FILES, point_index_path
+from Run_metrics import file_size, measure
+from Stage_scheduler import Stage
+
+XREF_CODE = ['Xref_store.py', 'Point_index.py']
+
+XREF_FOLDER = os.path.join('..', 'Xrefs')
+XREF_STORE = os.path.join(XREF_FOLDER, 'xref_store.sqlite')
+STATION_XREF = os.path.join(XREF_FOLDER, 'station_xref.csv')
+# Table of the new database converted from each point index
+POINT_TABLES = {'A': 'ANALOG', 'S': 'STATUS'}
+# Rows read and inserted at a time, memory stays flat whatever the number of points
+XREF_BATCH_ROWS = 100_000
+
+XREF_COLUMNS = ['tbl', 'legacy_pkey', 'legacy_name', 'key', 'record']
+
+# Legacy names are a station NAME or a "STATION,POINT:TYPE" reference. Legacy PKEYs are numbers
+# for stations and the same references for points, so they are kept as text. Both are compared
+# without case like everywhere else in the conversion. The indexes are created once the rows are in.
+CREATE_TABLE = """
+CREATE TABLE xref (
+    tbl TEXT NOT NULL,
+    legacy_pkey TEXT COLLATE NOCASE,
+    legacy_name TEXT NOT NULL COLLATE NOCASE,
+    key TEXT NOT NULL COLLATE NOCASE,
+    record INTEGER NOT NULL
+)"""
+CREATE_INDEXES = [
+    "CREATE INDEX xref_legacy_name ON xref (legacy_name)",
+    "CREATE INDEX xref_legacy_pkey ON xref (legacy_pkey, tbl)",
+    "CREATE INDEX xref_key ON xref (key)",
+    "CREATE INDEX xref_record ON xref (tbl, record)",
+]
+
+
+def station_rows():
+    """Xref rows of the stations: their PKEY and NAME, which stays their key, and their order."""
+    df = pd.read_csv(STATION_XREF, usecols=['PKEY', 'NAME'], dtype=str, keep_default_na=False)
+    yield pd.DataFrame({
+        'tbl': 'STATION',
+        'legacy_pkey': df['PKEY'].replace('', None),
+        'legacy_name': df['NAME'],
+        'key': df['NAME'],
+        'record': np.arange(1, len(df) + 1),
+    })
+
+
+def point_rows(point_type):
+    """Xref rows of the points of one point index, read a batch at a time."""
+    chunks = pd.read_csv(point_index_path(point_type), dtype=str, keep_default_na=False, chunksize=XREF_BATCH_ROWS)
+    for df in chunks:
+        yield pd.DataFrame({
+            'tbl': POINT_TABLES[point_type],
+            # Point indexes written before the PKey column was added give no legacy PKEY
+            'legacy_pkey': df['PKey'].replace('', None) if 'PKey' in df else None,
+            'legacy_name': df['Station'] + ',' + df['Name'] + ':' + df['Type'],
+            'key': df['Key'],
+            'record': df['record'].astype('int64'),
+        })
+
+
+def build_xref_store(path=XREF_STORE):
+    """Write the stations and points of the xrefs and point indexes to the store, return the rows or None.
+
+    The store is built in a new file with one bulk transaction and replaces the old one
+    at the end, so a lookup running meanwhile never sees it half written.
+    """
+    if not os.path.exists(STATION_XREF):
+        print(f"Error: Could not find the file at {STATION_XREF}")
+        return None
+    sources = [station_rows()]
+    for point_type in POINT_INDEX_FILES:
+        if os.path.exists(point_index_path(point_type)):
+            sources.append(point_rows(point_type))
+        else:
+            print(f"Warning: Point index not found: {point_index_path(point_type)}")
+
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    rows = 0
+    with measure('xref', os.path.basename(path)) as step:
+        connection = sqlite3.connect(temp_path)
+        try:
+            # Nothing to recover if the build stops, the old store is still in place
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            with connection:
+                connection.execute(CREATE_TABLE)
+                for source in sources:
+                    for df in source:
+                        values = df[XREF_COLUMNS].astype(object)
+                        connection.executemany("INSERT INTO xref VALUES (?, ?, ?, ?, ?)",
+                                               values.where(values.notna(), None).itertuples(index=False, name=None))
+                        rows += len(df)
+                for statement in CREATE_INDEXES:
+                    connection.execute(statement)
+        finally:
+            connection.close()
+        os.replace(temp_path, path)
+        step['rows_in'] = rows
+        step['rows_out'] = rows
+        step['bytes_written'] = file_size(path)
+    print(f"Xref store generated: {path} ({rows:,} rows)")
+    return rows
+
+
+class XrefStore:
+    """Lookups in the xref store, from legacy PKEY or name to new key and record and back.
+
+    Every lookup is one query on an index of the store. Rows are returned as dicts with
+    the XREF_COLUMNS; a legacy PKEY or name can match a row in more than one table.
+    """
+
+    def __init__(self, path=XREF_STORE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Xref store not found: {path}")
+        self.connection = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+        self.connection.row_factory = sqlite3.Row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def select(self, where, params, table=None):
+        sql = f"SELECT {', '.join(XREF_COLUMNS)} FROM xref WHERE {where}"
+        if table:
+            sql += " AND tbl = ?"
+            params = params + (table.upper(),)
+        return [dict(row) for row in self.connection.execute(sql + " ORDER BY tbl, record", params)]
+
+    def by_name(self, name, table=None):
+        """Rows of a legacy station NAME or "STATION,POINT:TYPE" point reference."""
+        return self.select("legacy_name = ?", (str(name).strip(),), table)
+
+    def by_pkey(self, pkey, table=None):
+        return self.select("legacy_pkey = ?", (str(pkey).strip(),), table)
+
+    def by_key(self, key, table=None):
+        """Rows whose new key is this one: what a converted station or point was."""
+        return self.select("key = ?", (str(key).strip(),), table)
+
+    def by_record(self, table, record):
+        return self.select("record = ?", (int(record),), table)
+
+    def find(self, value, table=None):
+        """Rows matching a value as legacy name, legacy PKEY or new key, each row once."""
+        rows = []
+        for lookup in (self.by_name, self.by_pkey, self.by_key):
+            rows += [row for row in lookup(value, table) if row not in rows]
+        return rows
+
+
+def xref_store_stage():
+    """Built from the station xref and the point indexes, after the stages that write them."""
+    return Stage('xref_store', build_xref_store,
+                 inputs=[STATION_XREF] + [point_index_path(point_type) for point_type in POINT_INDEX_FILES],
+                 outputs=[XREF_STORE],
+                 code=XREF_CODE)
+
+
+if __name__ == "__main__":
+    build_xref_store()
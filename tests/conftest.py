@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other by module name, like when run from the Scripts folder
+SCRIPTS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Scripts')
+sys.path.insert(0, SCRIPTS_FOLDER)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Empty project folders, with the working directory in Scripts as the conversion expects."""
+    for folder in ('Inputs', 'Dat_files', 'Xrefs', 'Populateables', 'Mappings', 'Scripts'):
+        (tmp_path / folder).mkdir()
+    monkeypatch.chdir(tmp_path / 'Scripts')
+    return tmp_path
@@ -0,0 +1,75 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from Aor_groups import AOR_LIST_SIZE, DAT_PATH, build_aor_groups
+from Dat_reader import DatFile
+from Scada_code import scada_stages
+from Stage_scheduler import run_stages
+
+MAPPINGS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mappings')
+
+
+@pytest.fixture
+def inputs(workspace):
+    inputs = workspace / 'Inputs'
+    pd.DataFrame({'PKEY': [1, 2, 3], 'NAME': ['Zone1', 'Zone2', 'Zone3']}).to_csv(inputs / 'Zones.CSV', index=False)
+    pd.DataFrame({'NAME': ['First', 'Both', 'Same'], 'MASK': ['ZONE1', 'Zone1,Zone2', 'Zone1,Zone2']}).to_csv(
+        inputs / 'ZoneGroups.CSV', index=False)
+    pd.DataFrame({'PKey': [4], 'Name': ['Breaker']}).to_csv(inputs / 'UserTypes.CSV', index=False)
+    pd.DataFrame({'PKEY': [7, 9], 'NAME': ['STA1', 'STA2'], 'DESC': ['', ''], 'ZONEID': ['First', 'Same'],
+                  'ALRMPRIOR': [1, 1]}).to_csv(inputs / 'StationPoints.CSV', index=False)
+    pd.DataFrame({'PKEY': ['1', '2'], 'NAME': ['CB1', 'CB2'], 'STATIONPID': ['STA1', 'STA2'],
+                  'PREFSUFFID': ['BREAKER', 'BREAKER'], 'USERTYPEID': ['Breaker', 'breaker'], 'ZONEID': ['', 'both'],
+                  'NORMSTATE': [0, 1]}).to_csv(inputs / 'StatusPoints.csv', index=False)
+    pd.DataFrame({'PKey': [3], 'Name': ['BREAKER']}).to_csv(inputs / 'PrefixSuffixes.csv', index=False)
+    return inputs
+
+
+def test_groups_are_named_after_their_zone_group(inputs):
+    aor = build_aor_groups(str(inputs))
+    df_aor = aor.table()
+    # Both and Same have the same mask, each group keeps the name of the row that used it
+    assert df_aor['Name'].tolist() == ['First', 'Same', 'First/Breaker', 'Both/Breaker']
+    assert df_aor[['AORList0', 'AORList1', 'AORList2']].values.tolist() == [[1, 0, 0], [1, 1, 0], [1, 0, 0], [1, 1, 0]]
+    assert df_aor.shape[1] == AOR_LIST_SIZE + 1
+
+
+def test_dat_file_has_a_value_per_field_after_the_record(inputs):
+    build_aor_groups(str(inputs))
+    with DatFile(DAT_PATH) as dat:
+        info = dat.table('AOR_GROUP')
+        assert info.fields[:2] + info.fields[-2:] == ['1', '2:0', '2:127', '4']
+        # The record number leads, each field then has its value
+        by_field = dict(zip(info.fields, info.columns[1:]))
+        assert (by_field['1'], by_field['2:0'], by_field['4']) == ('Name', 'AORList2:0', 'SiteID')
+        df = dat.frame('AOR_GROUP')
+    assert df['record'].tolist() == [1, 2, 3, 4]
+    assert df['Name'].tolist() == ['First', 'Same', 'First/Breaker', 'Both/Breaker']
+    assert df['SiteID'].tolist() == [0] * 4
+
+
+def test_status_points_are_optional(inputs, capsys):
+    (inputs / 'StatusPoints.csv').unlink()
+    aor = build_aor_groups(str(inputs))
+    assert aor.table()['Name'].tolist() == ['First', 'Same']
+    assert "only the station AOR groups are built" in capsys.readouterr().out
+
+
+def test_aor_change_converts_stations_and_points_again(inputs, workspace):
+    # The SCADA stages read the mapping spec when they are declared
+    for name in ('PMPA_DB_Mapping.csv', 'PMPA_DB_Mapping_Template.xlsx'):
+        shutil.copy(os.path.join(MAPPINGS_FOLDER, name), workspace / 'Mappings')
+    stages = [stage for stage in scada_stages() if stage.name in ('aor', 'station', 'status')]
+
+    def run():
+        report = run_stages(stages, workers=1, manifest_path='manifest.json')
+        return {name: info['status'] for name, info in report['stages'].items()}
+
+    assert run() == {'aor': 'ran', 'station': 'ran', 'status': 'ran'}
+    assert run() == {'aor': 'skipped', 'station': 'skipped', 'status': 'skipped'}
+    pd.DataFrame({'NAME': ['First', 'Both', 'Same'], 'MASK': ['ZONE3', 'Zone1,Zone2', 'Zone1,Zone2']}).to_csv(
+        inputs / 'ZoneGroups.CSV', index=False)
+    assert run() == {'aor': 'ran', 'station': 'ran', 'status': 'ran'}
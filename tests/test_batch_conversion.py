@@ -0,0 +1,38 @@
+import glob
+import os
+import shutil
+
+from Batch_conversion import run_batch
+from Benchmark_scada import write_synthetic_inputs
+
+# Stages of the SCADA database, the other databases have no inputs in these projects
+SCADA_STAGES = ['aor', 'station', 'analog', 'status', 'unit', 'merge_scada']
+
+
+def stage_statuses(result, names):
+    return {name: result['stages'][name]['status'] for name in names}
+
+
+def test_two_projects_convert_with_their_delta(workspace):
+    roots = []
+    for name, points in (('north', 300), ('south', 500)):
+        root = workspace / 'projects' / name
+        write_synthetic_inputs(str(root / 'Inputs'), points, seed=len(roots))
+        roots.append(str(root))
+    output_root = str(workspace / 'out')
+
+    batch = run_batch(roots, workers=2, output_root=output_root, validate=False)
+    assert [result['project'] for result in batch['projects']] == ['north', 'south']
+    assert batch['missing'] == []
+    for result in batch['projects']:
+        assert stage_statuses(result, SCADA_STAGES) == dict.fromkeys(SCADA_STAGES, 'ran')
+        assert 'delta_scada' not in result['stages']
+        # The previous build the delta is compared with
+        build = glob.glob(os.path.join(result['workspace'], 'Populateables', 'SCADA_[0-9]*.dat'))[0]
+        shutil.copy(build, os.path.join(result['workspace'], 'Populateables', 'SCADA_000101.dat'))
+
+    batch = run_batch(roots, workers=2, output_root=output_root, validate=False, delta='')
+    for result in batch['projects']:
+        assert stage_statuses(result, ['merge_scada', 'delta_scada']) == {'merge_scada': 'skipped',
+                                                                           'delta_scada': 'ran'}
+        assert glob.glob(os.path.join(result['workspace'], 'Populateables', 'SCADA_*_delta.dat'))
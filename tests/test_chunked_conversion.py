@@ -0,0 +1,35 @@
+import os
+import shutil
+
+import pytest
+
+from Benchmark_scada import write_synthetic_inputs
+from Scada_code import scada_stages
+from Stage_scheduler import run_stages
+
+MAPPINGS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mappings')
+# Files written by the analog and status stages
+POINT_OUTPUTS = ['Dat_files/analog_dat.dat', 'Dat_files/status_dat.dat', 'Xrefs/analog_xref.csv',
+                 'Xrefs/status_xref.csv', 'Xrefs/analog_point_index.csv', 'Xrefs/status_point_index.csv']
+
+
+def convert(workspace, chunksize=None):
+    report = run_stages(scada_stages(chunksize), force=True, workers=1, manifest_path='manifest.json')
+    assert {info['status'] for info in report['stages'].values()} == {'ran'}
+    outputs = {}
+    for path in POINT_OUTPUTS:
+        with open(workspace / path, 'rb') as f:
+            outputs[path] = f.read()
+    return outputs
+
+
+# Chunks ending mid file, and chunks ending exactly with the 3750 analog points
+@pytest.mark.parametrize('chunksize', [997, 1250])
+def test_chunked_output_matches_full_output(workspace, chunksize):
+    for name in ('PMPA_DB_Mapping.csv', 'PMPA_DB_Mapping_Template.xlsx'):
+        shutil.copy(os.path.join(MAPPINGS_FOLDER, name), workspace / 'Mappings')
+    write_synthetic_inputs(str(workspace / 'Inputs'), 5_000)
+    full = convert(workspace)
+    chunked = convert(workspace, chunksize)
+    for path in POINT_OUTPUTS:
+        assert chunked[path] == full[path], path
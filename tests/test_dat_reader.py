@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Dat_reader import DatFile
+from Dat_writer import DatTable, write_dat
+from Merging_scada import write_merged
+
+STATION = DatTable(name='STATION', number=2, fields=['0', '3', '4', '13'],
+                   columns=['record', 'Order', 'Key', 'Name', 'pAORGroup'],
+                   header=['*', '{fields}', '*\tOrder\tKey\tName\tAOR', '*'],
+                   quoted=('Key', 'Name'), numbered=('record',))
+STATUS = DatTable(name='STATUS', number=4, fields=['1', '3', '4'], columns=['record', 'Type', 'Key', 'Name'],
+                  header=['*', '{fields}', '*'], quoted=('Key', 'Name'), numbered=('record',), constants={'Type': 1})
+
+
+@pytest.fixture
+def merged(workspace):
+    stations = pd.DataFrame({'Order': [1, 2, 3], 'Key': ['STA1', 'STA2', "B'S"],
+                             'Name': ['First station', 'Second', 'Tabé'], 'pAORGroup': [1, 1, 2]})
+    points = pd.DataFrame({'Key': ['01001001', '01001002'], 'Name': ['CB1', 'nan']})
+    paths = [str(workspace / 'Dat_files' / 'station_dat.dat'), str(workspace / 'Dat_files' / 'status_dat.dat')]
+    write_dat(paths[0], STATION, stations)
+    write_dat(paths[1], STATUS, points)
+    output = str(workspace / 'Populateables' / 'SCADA.dat')
+    summary = write_merged(output, b'10 SCADA.DB\n', paths, b'\n0', trailer=True)
+    return output, stations, points, summary
+
+
+def test_merged_file_reads_back(merged):
+    output, stations, points, summary = merged
+    with DatFile(output) as dat:
+        assert dat.database == (10, 'SCADA.DB')
+        assert list(dat.tables) == ['STATION', 'STATUS']
+        assert dat.table('STATION').fields == ['0', '3', '4', '13']
+        assert dat.table('STATUS').number == 4
+
+        station = dat.frame('STATION')
+        # Four labels for five values: the columns are named after the fields
+        assert station.columns.tolist() == ['record', '0', '3', '4', '13']
+        assert station['record'].tolist() == [1, 2, 3]
+        station = station.drop(columns='record').set_axis(stations.columns, axis=1)
+        pd.testing.assert_frame_equal(station, stations)
+
+        status = dat.frame('STATUS', dtype=str)
+        assert status.columns.tolist() == ['record', '1', '3', '4']
+        assert status['3'].tolist() == points['Key'].tolist()
+        # 'nan' written by the conversion stays as written
+        assert status['4'].tolist() == ['CB1', 'nan']
+
+        counts = [dat.count_records(name) for name in dat.tables]
+    # Same counts as the merge summary
+    assert counts == list(summary['records'].values()) == [3, 2]
+
+
+def test_chunks_and_lines_match_the_whole_table(merged):
+    output = merged[0]
+    with DatFile(output) as dat:
+        chunks = list(dat.frame('STATION', chunksize=2))
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), dat.frame('STATION'))
+        lines = pd.concat(list(dat.lines('STATUS', chunksize=10))).tolist()
+    assert lines == ["\t1\t1\t'01001001'\t'CB1'", "\t2\t1\t'01001002'\t'nan'"]
+
+
+def test_single_table_file(merged, workspace):
+    with DatFile(str(workspace / 'Dat_files' / 'status_dat.dat')) as dat:
+        assert dat.database is None
+        assert dat.count_records('STATUS') == 2
+        with pytest.raises(KeyError, match="Table ANALOG not found"):
+            dat.table('ANALOG')
@@ -0,0 +1,29 @@
+import struct
+import zlib
+
+import pandas as pd
+import pytest
+
+from Encoded_text import HZ_PREFIX, decode_hz, decode_hz_column
+
+
+def encode_hz(text):
+    """'T=HZ;<hex>' of a text, the way the exports write it."""
+    data = text.encode('latin-1')
+    compressor = zlib.compressobj(wbits=-15)
+    packed = compressor.compress(data) + compressor.flush()
+    return HZ_PREFIX + (struct.pack('<II', len(packed), len(data)) + packed).hex().upper()
+
+
+def test_decode_hz():
+    assert decode_hz(encode_hz('ZONE1\nZONE4\n')) == 'ZONE1\nZONE4\n'
+    with pytest.raises(ValueError, match="Invalid encoded text"):
+        decode_hz(HZ_PREFIX + '0100000005000000FF')
+
+
+def test_decode_hz_column_keeps_plain_values():
+    values = pd.Series([encode_hz('Zone1,Zone2'), 'ZONE3', None, HZ_PREFIX + '00', encode_hz('Zone1,Zone2')])
+    decoded, undecoded = decode_hz_column(values)
+    assert decoded[[0, 1, 4]].tolist() == ['Zone1,Zone2', 'ZONE3', 'Zone1,Zone2']
+    assert decoded[[2, 3]].isna().all()
+    assert undecoded.tolist() == [False, False, False, True, False]
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from Dat_reader import DatFile
+from Fep_code import fep_stages
+from Stage_scheduler import run_stages
+
+MAPPINGS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mappings')
+
+
+@pytest.fixture
+def inputs(workspace):
+    # The FEP stages read the mapping spec when they are declared
+    for name in ('PMPA_DB_Mapping.csv', 'PMPA_DB_Mapping_Template.xlsx'):
+        shutil.copy(os.path.join(MAPPINGS_FOLDER, name), workspace / 'Mappings')
+    inputs = workspace / 'Inputs'
+    pd.DataFrame({'PKey': [1, 2], 'Name': ['LINE_A', 'LINE_B'], 'Desc': ['', '']}).to_csv(
+        inputs / 'ComLines.CSV', index=False)
+    pd.DataFrame({
+        'PKEY': [10, 20, 30], 'NAME': ['RTU1', 'RTU2', 'RTU3'], 'DESC': ['First', '', 'Third'],
+        'COMLINEID': ['LINE_B', 'LINE_A', 'NO_LINE'], 'RTUADDR1': [5, 6, ''],
+        'HOSTNAME1': ['host1', '', 'host3'], 'HOSTPORT1': [20000, '', 20002],
+        'HOSTNAME2': ['host1b', '', ''], 'HOSTPORT2': [20001, '', ''],
+        'HOSTNAME3': ['', '', ''], 'HOSTPORT3': ['', '', ''],
+        'HOSTNAME4': ['', 'host2', ''], 'HOSTPORT4': ['', 30000, ''],
+    }).to_csv(inputs / 'Rtus.CSV', index=False)
+    return inputs
+
+
+def read_table(file_name, table):
+    with DatFile(os.path.join('..', 'Dat_files', file_name)) as dat:
+        info = dat.table(table)
+        return info, dat.frame(table)
+
+
+def test_fep_tables(inputs, capsys):
+    report = run_stages(fep_stages(), workers=1, manifest_path='manifest.json')
+    assert {name: info['status'] for name, info in report['stages'].items()} == {
+        'channel_group': 'ran', 'channel': 'ran', 'rtu': 'ran'}
+    # The line of RTU3 is unknown, its channel and RTU point to no group
+    assert "Warning: 1 values of COMLINEID not found in ComLines.CSV.Name" in capsys.readouterr().out
+
+    info, groups = read_table('channel_group_dat.dat', 'CHANNEL_GROUP')
+    assert info.columns == ['record', 'Protocol', 'Name']
+    assert groups['Name'].tolist() == ['LINE_A', 'LINE_B']
+    assert groups['Protocol'].tolist() == [1, 1]
+
+
+def test_each_used_host_is_a_channel(inputs):
+    run_stages(fep_stages(), workers=1, manifest_path='manifest.json')
+    info, channels = read_table('channel_dat.dat', 'CHANNEL')
+    assert info.columns == ['record', 'Name', 'PhysicalPort', 'Hostname', 'pCHANNEL_GROUP']
+    assert channels['Name'].tolist() == ['RTU1', 'RTU1', 'RTU2', 'RTU3']
+    assert channels['Hostname'].tolist() == ['host1', 'host1b', 'host2', 'host3']
+    assert channels['PhysicalPort'].tolist() == [20000, 20001, 30000, 20002]
+    assert channels['pCHANNEL_GROUP'].tolist() == [2, 2, 1, 0]
+    # Ports are written as integers even though the blank hosts made them floats
+    with open(os.path.join('..', 'Dat_files', 'channel_dat.dat')) as f:
+        assert '20000.0' not in f.read()
+
+
+def test_rtus_point_to_their_channel_group(inputs):
+    run_stages(fep_stages(), workers=1, manifest_path='manifest.json')
+    _, rtus = read_table('rtu_data_dat.dat', 'RTU_DATA')
+    assert rtus['Indics'].tolist() == [10, 20, 30]
+    assert rtus['pCHANNEL_GROUP'].tolist() == [2, 1, 0]
+    assert rtus['Name'].tolist() == ['First', '', 'Third']
+    assert rtus['Address'].tolist() == [5, 6, 0]
+    assert rtus['rtu_abbrev'].tolist() == ['RTU1', 'RTU2', 'RTU3']
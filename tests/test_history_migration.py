@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+
+from History_migration import HISTORY_LOGS, migrate_history, partition_path, partitions_intact
+from Station_index import StationIndex
+from test_encoded_text import encode_hz
+
+LOG = HISTORY_LOGS['Alarms.CSV']
+
+
+def write_alarms(inputs):
+    rows = pd.DataFrame({column: [''] * 3 for column in LOG['columns']})
+    rows['PKey'] = ['1', '2', '3']
+    rows['Time'] = ['#2024-01-31 23:59:59.500#', '#2024-02-01 00:00:00#', '']
+    rows['Pid'] = ['STA1,CB1:S'] * 3
+    rows['Text'] = [encode_hz('CB1 Open, tripped'), 'Plain text', '']
+    rows.to_csv(inputs / 'Alarms.CSV', index=False)
+
+
+def test_alarms_are_migrated_with_their_text_decoded(workspace):
+    write_alarms(workspace / 'Inputs')
+    stations = StationIndex(pd.DataFrame({'Key': ['STA1'], 'Order': [1], 'PKEY': [7]}))
+    assert migrate_history(stations, 'Alarms.CSV') == 2
+
+    january = pd.read_csv(partition_path(LOG, 202401), dtype=str)
+    assert january['Text'].tolist() == ['CB1 Open, tripped']
+    assert january['Time'].tolist() == ['2024-01-31 23:59:59.500']
+    assert pd.read_csv(partition_path(LOG, 202402), dtype=str)['Text'].tolist() == ['Plain text']
+
+
+def test_edited_or_deleted_partitions_are_detected(workspace):
+    write_alarms(workspace / 'Inputs')
+    stations = StationIndex(pd.DataFrame({'Key': ['STA1'], 'Order': [1], 'PKEY': [7]}))
+    migrate_history(stations, 'Alarms.CSV')
+    assert partitions_intact(LOG)
+
+    with open(partition_path(LOG, 202401), 'a') as f:
+        f.write('edited\n')
+    assert not partitions_intact(LOG)
+    migrate_history(stations, 'Alarms.CSV')
+    os.remove(partition_path(LOG, 202402))
+    assert not partitions_intact(LOG)
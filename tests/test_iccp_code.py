@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Dat_reader import DatFile
+from Iccp_code import DAT_FOLDER, NameIndex, XREF_PATH, process_iccp, split_sets
+from Point_index import point_index_path, point_index_rows, write_point_index
+
+SETS = pd.DataFrame({
+    'Name': ['IMP1', 'EXP1', 'NODIR', 'DNP1'],
+    'Desc': ['Data recvd from TVA', 'Data sent to TVA', 'TVA data', 'Data sent to RTU'],
+    'ProtoName': ['ICCPSV', 'iccpsv', 'ICCPSV', 'DNP3SV'],
+})
+
+
+@pytest.fixture
+def inputs(workspace):
+    inputs = workspace / 'Inputs'
+    pd.DataFrame({'NAME': ['TVA', 'DNP'], 'PROTONAME': ['ICCPSV', 'DNP3SV'], 'ICDOMAIN': ['PMPA', ''],
+                  'ICRMDOMAIN': ['TVA', ''],
+                  'ICLOCNAME1': ['cc1', ''], 'ICLOCNAME2': ['CC9', ''], 'ICLOCNAME3': ['', ''], 'ICLOCNAME4': ['', ''],
+                  'ICREMNAME1': ['CC2', ''], 'ICREMNAME2': ['', ''], 'ICREMNAME3': ['', ''], 'ICREMNAME4': ['', '']},
+                 ).to_csv(inputs / 'DEServers.CSV', index=False)
+    pd.DataFrame({'Name': ['CC1', 'CC2', 'cc1'], 'HostName': ['h1', 'h2', 'h3'], 'ApTitle': ['1 3', '1 4', '1 5'],
+                  'AeQual': [1, 2, 3], 'Psel': ['00', '00', '00'], 'Ssel': ['01', '01', '01'],
+                  'Tsel': ['02', '02', '02']}).to_csv(inputs / 'ICCP.CSV', index=False)
+    SETS.to_csv(inputs / 'DESets.CSV', index=False)
+    members = {'DESetAnalog.CSV': [(1, 'IMP1', 'STA1,MW:A', 'TVA_MW'), (2, 'EXP1', 'STA1,MW:A', ''),
+                                   (3, 'DNP1', 'STA1,MW:A', '')],
+               'DESetStatus.CSV': [(1, 'exp1', 'STA1,CB1:S', 'TVA_CB1'), (2, 'IMP1', 'STA9,GONE:S', '')],
+               'DESetSetpoint.CSV': []}
+    for file_name, rows in members.items():
+        df = pd.DataFrame(rows, columns=['PKey', 'SetId', 'Pid', 'Alias'])
+        df.assign(Type=1).to_csv(inputs / file_name, index=False)
+    for point_type, name, key in (('A', 'MW', 'A01'), ('S', 'CB1', 'S01')):
+        rows = point_index_rows(pd.Series(['STA1']), pd.Series([name]), point_type, pd.Series([key]),
+                                pd.Series(['1']), first_record=5)
+        write_point_index(rows, point_index_path(point_type))
+    return inputs
+
+
+def test_sets_are_split_by_the_direction_in_their_description(capsys):
+    export_sets, import_sets = split_sets(SETS)
+    assert export_sets['Name'].tolist() == ['EXP1']
+    assert import_sets['Name'].tolist() == ['IMP1']
+    # Sets of other protocols are left out silently, ICCP sets without a direction with a warning
+    assert "1 ICCP sets have no direction in their description, not converted: NODIR" in capsys.readouterr().out
+
+
+def test_name_index_gives_the_first_record_of_each_name():
+    index = NameIndex(pd.Series(['CC1', 'CC2', 'cc1']))
+    records = index.records_of(pd.Series([' cc2', 'CC1', 'CC9', None]))
+    assert records.tolist() == [2, 1, 0, 0]
+
+
+def test_iccp_tables_point_to_their_records(inputs, capsys):
+    assert process_iccp(str(inputs)) == 4
+    out = capsys.readouterr().out
+    assert "Warning: Local control centers not in ICCP.CSV, pointer set to 0: CC9" in out
+    assert "Warning: 1 set member points not found in the point index: STA9,GONE:S" in out
+
+    with DatFile(os.path.join(DAT_FOLDER, 'vcc_info_dat.dat')) as dat:
+        info = dat.table('VCC_INFO')
+        # The record number leads, each field then has its value
+        assert info.fields[0] == '6:0' and len(info.columns) == len(info.fields) + 1
+        vcc = dat.frame('VCC_INFO')
+    assert vcc[['pLocalControlCenter6:0', 'pLocalControlCenter6:1', 'pRemoteControlCenter44:0']].values.tolist() == [
+        [1, 0, 2]]
+    assert vcc['Name'].tolist() == ['TVA']
+
+    with DatFile(os.path.join(DAT_FOLDER, 'iccp_import_point_dat.dat')) as dat:
+        imports = dat.frame('ICCP_IMPORT_POINT')
+    assert imports['Name'].tolist() == ['TVA_MW', 'STA9,GONE:S']
+    assert imports['REC_KEY'].tolist() == ['A01', '']
+    assert imports['REC_NUMBER'].tolist() == [5, 0]
+    assert imports['pImpDS'].tolist() == [1, 1]
+    with DatFile(os.path.join(DAT_FOLDER, 'iccp_export_point_dat.dat')) as dat:
+        exports = dat.frame('ICCP_EXPORT_POINT')
+    assert exports['Name'].tolist() == ['STA1,MW:A', 'TVA_CB1']
+    assert exports['OBJ_NUM'].tolist() == [5, 4]
+
+    xref = pd.read_csv(XREF_PATH)
+    assert xref['Object'].value_counts().to_dict() == {'ICCP_EXPORT_POINT': 2, 'ICCP_IMPORT_POINT': 2}
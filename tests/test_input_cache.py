@@ -0,0 +1,108 @@
+import os
+
+import pandas as pd
+import pytest
+
+import Input_cache
+from Input_cache import evict_cache, keep_inputs_in_memory, read_cached_csv, read_input_csv
+
+
+@pytest.fixture
+def csv_reads(workspace, monkeypatch):
+    """Count the CSVs actually parsed, every other read is served by a cache."""
+    reads = []
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        reads.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', counting_read_csv)
+    return reads
+
+
+def write_csv(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def cache_entries(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith('.pkl'))
+
+
+def test_unchanged_file_is_read_from_the_cache(workspace, csv_reads):
+    path = write_csv(workspace / 'Inputs' / 'a.csv', 'A,B\n1,x\n')
+    cache = str(workspace / 'cache')
+    first = read_cached_csv(path, cache)
+    second = read_cached_csv(path, cache)
+    assert len(csv_reads) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_content_change_invalidates_the_entry(workspace, csv_reads):
+    path = write_csv(workspace / 'Inputs' / 'a.csv', 'A,B\n1,x\n')
+    cache = str(workspace / 'cache')
+    stat = os.stat(path)
+    read_cached_csv(path, cache)
+    # Same size and mtime, only the content hash differs
+    write_csv(path, 'A,B\n2,x\n')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert read_cached_csv(path, cache)['A'].tolist() == [2]
+    assert len(csv_reads) == 2
+
+
+def test_read_options_are_part_of_the_key(workspace, csv_reads):
+    path = write_csv(workspace / 'Inputs' / 'a.csv', 'A,B\n1,x\n')
+    cache = str(workspace / 'cache')
+    assert list(read_cached_csv(path, cache, usecols=['A'])) == ['A']
+    assert list(read_cached_csv(path, cache, usecols=['B'])) == ['B']
+    assert list(read_cached_csv(path, cache, usecols=['A'])) == ['A']
+    assert len(csv_reads) == 2
+    assert len(cache_entries(cache)) == 2
+
+
+def test_least_recently_used_entries_are_evicted(workspace):
+    cache = workspace / 'cache'
+    cache.mkdir()
+    for age, name in enumerate(['new', 'mid', 'old']):
+        (cache / f'{name}.pkl').write_bytes(b'x' * 100)
+        os.utime(cache / f'{name}.pkl', (1000 - age, 1000 - age))
+    (cache / 'other.tmp').write_bytes(b'x' * 1000)
+    evict_cache(str(cache), max_bytes=250)
+    assert cache_entries(cache) == ['mid.pkl', 'new.pkl']
+    evict_cache(str(cache), max_bytes=100)
+    assert cache_entries(cache) == ['new.pkl']
+
+
+def test_cache_hit_marks_the_entry_as_recently_used(workspace):
+    cache = str(workspace / 'cache')
+    first = write_csv(workspace / 'Inputs' / 'first.csv', 'A\n1\n')
+    second = write_csv(workspace / 'Inputs' / 'second.csv', 'A\n2\n')
+    read_cached_csv(first, cache)
+    read_cached_csv(second, cache)
+    for entry in os.scandir(cache):
+        os.utime(entry.path, (1000, 1000))
+    # Reading first again makes second the least recently used entry
+    read_cached_csv(first, cache)
+    size = max(entry.stat().st_size for entry in os.scandir(cache))
+    evict_cache(cache, max_bytes=size)
+    # Had first been evicted, reading it would add its entry back next to second
+    assert read_cached_csv(first, cache, max_bytes=10 * size)['A'].tolist() == [1]
+    assert len(cache_entries(cache)) == 1
+
+
+def test_memory_cache_serves_copies_until_the_file_changes(workspace, csv_reads):
+    path = write_csv(workspace / 'Inputs' / 'a.csv', 'A\n1\n')
+    keep_inputs_in_memory()
+    try:
+        df = read_input_csv(path, cache_folder=None)
+        df['A'] = 9
+        assert read_input_csv(path, cache_folder=None)['A'].tolist() == [1]
+        assert len(csv_reads) == 1
+        write_csv(path, 'A\n22\n')
+        assert read_input_csv(path, cache_folder=None)['A'].tolist() == [22]
+        assert len(csv_reads) == 2
+    finally:
+        keep_inputs_in_memory(False)
+    assert Input_cache.MEMORY_CACHE == {}
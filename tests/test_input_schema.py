@@ -0,0 +1,44 @@
+import pandas as pd
+
+from Input_schema import read_typed_chunks, read_typed_csv
+
+SCHEMA = {'PKey': 'int', 'Name': 'str', 'Unit': 'category'}
+
+
+def write_input(path, columns):
+    pd.DataFrame({column: values for column, values in columns.items()}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_reads_only_the_schema_columns_with_their_types(workspace):
+    path = write_input(workspace / 'Inputs' / 'Units.csv',
+                       {'PKey': [1, 2], 'Name': ['kV', 'MW'], 'Unit': ['a', 'a'], 'Other': [0, 0]})
+    df = read_typed_csv(path, SCHEMA)
+    assert list(df.columns) == ['PKey', 'Name', 'Unit']
+    assert df['PKey'].dtype == 'int8'
+    assert isinstance(df['Unit'].dtype, pd.CategoricalDtype)
+    assert [len(chunk) for chunk in read_typed_chunks(path, 1, SCHEMA)] == [1, 1]
+
+
+def test_missing_column_is_reported(workspace, capsys):
+    path = write_input(workspace / 'Inputs' / 'Units.csv', {'PKey': [1], 'Desc': ['kV']})
+    assert read_typed_csv(path, SCHEMA) is None
+    assert "Error: Columns missing in Units.csv: Name, Unit" in capsys.readouterr().out
+    assert read_typed_chunks(path, 10, SCHEMA) is None
+
+
+def test_absent_optional_column_is_read_as_missing(workspace, capsys):
+    path = write_input(workspace / 'Inputs' / 'Units.csv',
+                       {'Name': ['kV', 'MW'], 'Unit': ['a', 'a']})
+    df = read_typed_csv(path, SCHEMA, optional=['PKey'])
+    assert list(df.columns) == ['Name', 'Unit', 'PKey']
+    assert df['PKey'].isna().all()
+    assert [chunk['PKey'].isna().all() for chunk in read_typed_chunks(path, 1, SCHEMA, optional=['PKey'])] == [True, True]
+    assert "Error" not in capsys.readouterr().out
+
+
+def test_analog_pkey_is_optional(workspace):
+    from Input_schema import INPUT_SCHEMAS
+    columns = {column: [1] for column in INPUT_SCHEMAS['AnalogPoints.csv'] if column != 'PKEY'}
+    df = read_typed_csv(write_input(workspace / 'Inputs' / 'AnalogPoints.csv', columns))
+    assert df['PKEY'].isna().all()
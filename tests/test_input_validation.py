@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from Input_schema import INPUT_SCHEMAS
+from Input_validation import exit_status, run_validation, summarize_violations, validate_inputs
+
+
+def write_input(folder, file_name, rows):
+    """Write an input with every column of its schema, blank unless given."""
+    df = pd.DataFrame(rows)
+    for column in INPUT_SCHEMAS[file_name]:
+        if column not in df:
+            df[column] = 0 if INPUT_SCHEMAS[file_name][column] == 'int' else ''
+    df.to_csv(folder / file_name, index=False)
+
+
+@pytest.fixture
+def inputs(workspace):
+    inputs = workspace / 'Inputs'
+    write_input(inputs, 'StationPoints.CSV', {'PKEY': [1, 2, 3], 'NAME': ['STA1', 'STA2', 'sta1']})
+    write_input(inputs, 'AnalogPoints.csv', {'PKEY': ['1', '2', '3', '4'], 'NAME': ['MW', 'MW', 'MVAR', 'KV'],
+                                             'STATIONPID': ['STA1', 'sta1', 'STA9', ''],
+                                             'ENGUNITS': ['MW', 'MW', '', 'Volts']})
+    write_input(inputs, 'StatusPoints.csv', {'PKEY': ['1', '2'], 'NAME': ['CB1', 'CB2'], 'STATIONPID': ['STA2', 'STA2'],
+                                             'PREFSUFFID': ['BREAKER', 'NOPE']})
+    write_input(inputs, 'PrefixSuffixes.csv', {'PKey': [1], 'Name': ['Breaker']})
+    write_input(inputs, 'MeasurementUnits.CSV', {'PKey': [1], 'Name': ['mw'], 'Desc': ['Megawatt']})
+    return inputs
+
+
+def failed_checks(violations):
+    rows = violations.groupby(['file', 'check'])['row'].apply(list)
+    return {f'{file_name}:{check}': rows for (file_name, check), rows in rows.items()}
+
+
+def test_each_check_reports_its_rows(inputs):
+    assert failed_checks(validate_inputs(str(inputs))) == {
+        'StationPoints.CSV:duplicate_station': [3],
+        'AnalogPoints.csv:unknown_station': [3, 4],
+        'AnalogPoints.csv:missing_unit': [3],
+        'AnalogPoints.csv:unknown_unit': [4],
+        'AnalogPoints.csv:duplicate_point': [2],
+        'StatusPoints.csv:unknown_states': [2],
+    }
+
+
+def test_missing_states_and_files_are_errors(inputs):
+    write_input(inputs, 'StatusPoints.csv', {'PKEY': ['1'], 'NAME': ['CB1'], 'STATIONPID': ['STA2'], 'PREFSUFFID': ['']})
+    (inputs / 'MeasurementUnits.CSV').unlink()
+    checks = failed_checks(validate_inputs(str(inputs)))
+    assert checks['StatusPoints.csv:missing_states'] == [1]
+    assert checks['MeasurementUnits.CSV:missing_file'] == [0]
+    # Without the units their names are not checked
+    assert 'AnalogPoints.csv:unknown_unit' not in checks
+
+
+def test_missing_column_skips_the_checks_of_the_file(inputs, capsys):
+    pd.DataFrame({'PKEY': [1], 'NAME': ['STA1']}).to_csv(inputs / 'StationPoints.CSV', index=False)
+    violations = validate_inputs(str(inputs))
+    missing = violations[violations['check'] == 'missing_column']
+    assert missing['column'].tolist() == ['DESC', 'ZONEID', 'ALRMPRIOR']
+    assert not violations['check'].isin(['duplicate_station', 'unknown_station']).any()
+    assert "Error: Columns missing in StationPoints.CSV: DESC, ZONEID, ALRMPRIOR" in capsys.readouterr().out
+
+
+def test_summary_counts_errors_and_warnings(inputs):
+    summary = summarize_violations(validate_inputs(str(inputs)))
+    assert (summary['errors'], summary['warnings']) == (4, 3)
+    assert summary['checks']['AnalogPoints.csv:unknown_station']['examples'] == ['STA9', '']
+
+
+def test_errors_give_a_failing_exit_status(inputs):
+    summary = run_validation(input_folder=str(inputs))
+    assert summary['errors'] == 4
+    assert exit_status(summary) == 1
+    assert run_validation(fail_fast=True, input_folder=str(inputs)) is None
+    assert exit_status(None) == 1
+    assert exit_status({'errors': 0, 'warnings': 3, 'checks': {}}) == 0
@@ -0,0 +1,117 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from Mapping_engine import build_frame, compile_spec
+from Mapping_template import field_matches, read_template
+from Point_keys import KeyAllocator
+from Scada_code import build_status_frame
+from Station_index import StationIndex
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Mappings', 'PMPA_DB_Mapping_Template.xlsx')
+
+# StatusPoints.csv through the engine, with the F:I of the STATUS object of the template
+STATUS_SPEC = """\
+Object,Number,File,Xref,Output,F:I,Structure Name,Rule,Source,Value,Quoted
+STATUS,4,StatusPoints.csv,,status_dat.dat,,record,record,,,
+STATUS,,,,,,Type,constant,,1,
+STATUS,,,,,,Key,key,,Type|pStation,Y
+STATUS,,,,,,Name,column,NAME,,Y
+STATUS,,,,,,pStation,lookup,STATIONPID,StationPoints.CSV|NAME|PKEY,
+STATUS,,,,,,pStates,lookup,PREFSUFFID,PrefixSuffixes.csv|Name|PKey|offset=200,
+STATUS,,,,,,ConfigNormalState,column,NORMSTATE,,
+"""
+
+
+@pytest.fixture(scope='module')
+def template():
+    return read_template(TEMPLATE_PATH)
+
+
+def spec_frame(text):
+    return pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+
+
+def test_template_fields(template):
+    assert template[('STATUS', 'KEY')] == '3'
+    assert template[('STATION', 'PAORGROUP')] == '13'
+    assert template[('UNIT', 'NAME')] == '0'
+    assert template[('AOR_GROUP', 'AORLIST')] == '2:0-127'
+    # OpenCalc arrays 'InputKey {100}' at F:I 5
+    assert template[('FORMULA', 'INPUTKEY')] == '5:0-99'
+    assert template[('FORMULA_TEMPLATE', 'RECORD')] == '0'
+
+
+@pytest.mark.parametrize('field, template_field, matches', [
+    ('3', '3', True), ('4', '3', False), ('2:5', '2:0-127', True), ('2:128', '2:0-127', False),
+    ('77:0', '77:0', True), ('3:1', '2:0-127', False), ('2:1-2', '2:0-127', False),
+])
+def test_field_matches(field, template_field, matches):
+    assert field_matches(field, template_field) is matches
+
+
+def test_spec_fields_come_from_the_template(template):
+    plan = compile_spec(spec_frame(STATUS_SPEC), template)['STATUS']
+    # The record number leads each record, the fields are those of the template
+    assert plan.table.fields == ['1', '3', '4', '5', '19', '49']
+    assert plan.table.columns == ['record', 'Type', 'Key', 'Name', 'pStation', 'pStates', 'ConfigNormalState']
+
+
+def test_spec_field_must_match_the_template():
+    template = {('AOR_GROUP', 'NAME'): '1', ('AOR_GROUP', 'AORLIST'): '2:0-127'}
+    spec = "Object,Number,File,Xref,Output,F:I,Structure Name,Rule,Source,Value,Quoted\n"
+    plan = compile_spec(spec_frame(spec + "AOR_GROUP,3,A.csv,,a.dat,,Name,column,N,,Y\n"
+                                          "AOR_GROUP,,,,,2:1,AORList,column,Z,,\n"), template)['AOR_GROUP']
+    assert plan.table.fields == ['1', '2:1']
+    with pytest.raises(ValueError, match="does not match 1"):
+        compile_spec(spec_frame(spec + "AOR_GROUP,3,A.csv,,a.dat,2,Name,column,N,,Y\n"), template)
+    with pytest.raises(ValueError, match="is a range"):
+        compile_spec(spec_frame(spec + "AOR_GROUP,3,A.csv,,a.dat,,AORList,column,Z,,\n"), template)
+    with pytest.raises(ValueError, match="no F:I in the spec"):
+        compile_spec(spec_frame(spec + "AOR_GROUP,3,A.csv,,a.dat,,Other,column,Z,,\n"), template)
+
+
+def test_indexes_of_a_structure_are_separate_columns(template):
+    spec = ("Object,Number,File,Xref,Output,F:I,Structure Name,Rule,Source,Value,Quoted\n"
+            "FORMULA,3,C.csv,,f.dat,,record,record,,,\n"
+            "FORMULA,,,,,5:0,InputKey,column,P2Pid,,Y\n"
+            "FORMULA,,,,,5:1,InputKey,column,P3Pid,,Y\n"
+            "FORMULA,,,,,,OutputKey,column,P1Pid,,Y\n")
+    plan = compile_spec(spec_frame(spec), template)['FORMULA']
+    assert plan.table.fields == ['5:0', '5:1', '8']
+    assert plan.table.columns == ['record', 'InputKey5:0', 'InputKey5:1', 'OutputKey']
+    frame = build_frame(plan, pd.DataFrame({'P1Pid': ['A'], 'P2Pid': ['B'], 'P3Pid': ['C']}))
+    assert frame.loc[0, ['InputKey5:0', 'InputKey5:1', 'OutputKey']].tolist() == ['B', 'C', 'A']
+
+
+def test_status_spec_matches_the_status_conversion(workspace, template):
+    inputs = workspace / 'Inputs'
+    pd.DataFrame({'NAME': ['STA1', 'Sta2'], 'PKEY': [7, 9]}).to_csv(inputs / 'StationPoints.CSV', index=False)
+    pd.DataFrame({'Name': ['BREAKER', 'ALARM'], 'PKey': [3, 12]}).to_csv(inputs / 'PrefixSuffixes.csv', index=False)
+    pd.DataFrame({
+        'NAME': ['CB1', 'CB2', 'AL1', 'CB3', 'X'],
+        'STATIONPID': ['STA1', 'sta2', 'STA1', 'STA2', 'STA1'],
+        'PREFSUFFID': ['BREAKER', 'breaker', 'ALARM', 'BREAKER', 'UNKNOWN'],
+        'NORMSTATE': [1, 0, 0, 1, 0],
+    }).to_csv(inputs / 'StatusPoints.csv', index=False)
+
+    plan = compile_spec(spec_frame(STATUS_SPEC), template)['STATUS']
+    df = pd.read_csv(inputs / 'StatusPoints.csv')
+    mapped = build_frame(plan, df, str(inputs), KeyAllocator())
+
+    class NoAor:
+        def point_groups(self, stations, zones, user_types):
+            return pd.Series(0, index=stations.index)
+
+    df['ZONEID'] = df['USERTYPEID'] = ''
+    df['PKEY'] = df['NAME']
+    stations = StationIndex(pd.DataFrame({'Key': ['STA1', 'Sta2'], 'Order': [1, 2], 'PKEY': [7, 9]}))
+    prefixes = pd.DataFrame({'Name': ['BREAKER', 'ALARM'], 'PKey': [3, 12]})
+    converted = build_status_frame(df, stations, NoAor(), prefixes, KeyAllocator())
+
+    for column in ['Key', 'Name', 'pStation', 'pStates', 'ConfigNormalState']:
+        assert mapped[column].astype(str).tolist() == converted[column].astype(str).tolist(), column
+    assert mapped['Key'].tolist() == ['01007001', '01009001', '01007002', '01009002', '01007003']
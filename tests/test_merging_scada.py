@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from Calc_code import warn_unconverted
+from Merging_scada import merge_scada, scada_output_path, trailer_file
+from PMPA_Conversion import conversion_stages
+from Stage_scheduler import stage_predecessors
+
+MAPPINGS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mappings')
+
+
+@pytest.fixture
+def dat_files(workspace):
+    for name, record in (('station_dat.dat', "\t1\t'STA1'"), ('status_dat.dat', "\t1\t'PT1'")):
+        with open(os.path.join('..', 'Dat_files', name), 'w') as f:
+            f.write(f"\t2\t{name.split('_')[0].upper()}\t0\t1\n{record}\n")
+    return workspace
+
+
+def statuses(report):
+    return {name: info['status'] for name, info in report['stages'].items()}
+
+
+def test_trailer_flag_invalidates_the_merge(dat_files):
+    summary = trailer_file(scada_output_path())
+    assert statuses(merge_scada()) == {'merge_scada': 'ran'}
+    assert not os.path.exists(summary)
+
+    assert statuses(merge_scada(trailer=True)) == {'merge_scada': 'ran'}
+    with open(summary) as f:
+        assert json.load(f)['records'] == {'station_dat.dat': 1, 'status_dat.dat': 1}
+    assert statuses(merge_scada(trailer=True)) == {'merge_scada': 'skipped'}
+
+    # The summary is an output, losing it reruns the merge
+    os.remove(summary)
+    assert statuses(merge_scada(trailer=True)) == {'merge_scada': 'ran'}
+    assert os.path.exists(summary)
+
+    # A merge without trailer does not leave the summary of another file
+    assert statuses(merge_scada()) == {'merge_scada': 'ran'}
+    assert not os.path.exists(summary)
+    assert statuses(merge_scada()) == {'merge_scada': 'skipped'}
+
+
+def test_only_scada_producers_gate_the_scada_merge(workspace, capsys):
+    # The stages read the mapping spec when they are declared
+    for name in ('PMPA_DB_Mapping.csv', 'PMPA_DB_Mapping_Template.xlsx'):
+        shutil.copy(os.path.join(MAPPINGS_FOLDER, name), workspace / 'Mappings')
+    for name in ('CalcOffline.CSV', 'HistDataSets.CSV'):
+        (workspace / 'Inputs' / name).write_text('PKey\n1\n')
+    predecessors = stage_predecessors(conversion_stages(validate=False))
+    assert predecessors['merge_scada'] == {'aor', 'station', 'analog', 'status', 'unit'}
+    out = capsys.readouterr().out
+    assert "Warning: CalcOffline.CSV is not converted" in out
+    assert "Warning: HistDataSets.CSV is not converted" in out
+
+
+def test_absent_unconverted_inputs_are_not_reported(workspace, capsys):
+    assert warn_unconverted() == []
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,22 @@
+import os
+import shutil
+
+from PMPA_cli import build_parser
+
+MAPPINGS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mappings')
+
+
+def run(*argv):
+    args = build_parser().parse_args(list(argv))
+    return args.func(args)
+
+
+def test_convert_fails_when_stages_fail(workspace):
+    for name in ('PMPA_DB_Mapping.csv', 'PMPA_DB_Mapping_Template.xlsx'):
+        shutil.copy(os.path.join(MAPPINGS_FOLDER, name), workspace / 'Mappings')
+    # No inputs: the conversion stages fail and the merges are blocked
+    assert run('convert', '--workers', '1', '--no-validate', '--report', str(workspace / 'run.json')) == 1
+
+
+def test_convert_fails_when_a_watch_cannot_start(workspace):
+    assert run('convert', '--watch', '--workers', '2') == 1
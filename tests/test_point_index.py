@@ -0,0 +1,45 @@
+import pandas as pd
+
+from Point_index import PointIndex, point_index_path, point_index_rows, write_point_index
+
+
+def index_rows(point_type, stations, names, keys, first_record=1):
+    return point_index_rows(pd.Series(stations), pd.Series(names), point_type, pd.Series(keys),
+                            pd.Series([''] * len(keys)), first_record)
+
+
+def test_references_resolve_to_key_and_record():
+    points = PointIndex(pd.concat([index_rows('A', ['STA1', 'STA1'], ['MW', 'MVAR'], ['A1', 'A2']),
+                                   index_rows('S', ['STA1'], ['MW'], ['S1'], first_record=7)], ignore_index=True))
+    references = pd.Series([' sta1,mw:a', 'STA1,MW:S', 'STA1,MVAR:A', 'STA1,MW:A'], index=[3, 4, 5, 6])
+    resolved, unresolved = points.resolve(references)
+    assert resolved['Key'].tolist() == ['A1', 'S1', 'A2', 'A1']
+    assert resolved['record'].tolist() == [1, 7, 2, 1]
+    assert resolved.index.tolist() == [3, 4, 5, 6]
+    assert unresolved == []
+
+
+def test_unknown_and_blank_references_are_missing():
+    points = PointIndex(index_rows('A', ['STA1'], ['MW'], ['A1']))
+    resolved, unresolved = points.resolve(pd.Series(['sta9,x:a', None, '', 'STA9,X:A ', 'STA1,MW:S', 'STA1,MW:A']))
+    assert resolved['Key'].tolist() == [None, None, None, None, None, 'A1']
+    assert resolved['record'].isna().tolist() == [True] * 5 + [False]
+    # Each unknown reference is listed once, blanks are not listed
+    assert unresolved == ['STA1,MW:S', 'STA9,X:A']
+
+
+def test_duplicate_points_keep_the_first_one():
+    points = PointIndex(index_rows('A', ['STA1', 'sta1'], ['MW', 'mw'], ['A1', 'A2']))
+    assert len(points) == 1
+    assert points.duplicates == 1
+    resolved, _ = points.resolve(pd.Series(['STA1,MW:A']))
+    assert resolved['Key'].tolist() == ['A1']
+
+
+def test_index_is_loaded_from_the_point_index_files(workspace, capsys):
+    write_point_index(index_rows('S', ['STA1'], ['CB1'], ['S1']), point_index_path('S'))
+    points = PointIndex.load()
+    assert "Warning: Point index not found" in capsys.readouterr().out
+    resolved, unresolved = points.resolve(pd.Series(['STA1,CB1:S']))
+    assert resolved['record'].tolist() == [1]
+    assert unresolved == []
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from Point_keys import KeyAllocator, create_keys
+
+
+def test_keys_are_numbered_per_station_in_input_order():
+    keys = create_keys(pd.Series([1, 1, 2, 1]), pd.Series([3, 4, 3, 3]))
+    assert keys.tolist() == ['01003001', '01004001', '02003002', '01003003']
+
+
+def test_sequence_carries_over_between_batches():
+    allocator = KeyAllocator()
+    allocator.allocate(pd.Series([1, 1]), pd.Series([7, 7]))
+    keys = allocator.allocate(pd.Series([1, 1], index=[5, 6]), pd.Series([7, 8], index=[5, 6]))
+    assert keys.tolist() == ['01007003', '01008001']
+    assert keys.index.tolist() == [5, 6]
+
+
+def test_station_with_more_than_999_points_overflows():
+    with pytest.raises(ValueError, match=r"stations with more than 999 points: \[12\]"):
+        create_keys(pd.Series(1, index=range(1000)), pd.Series(12, index=range(1000)))
+
+
+def test_overflow_across_batches_keeps_the_last_valid_counters():
+    allocator = KeyAllocator()
+    allocator.allocate(pd.Series(1, index=range(600)), pd.Series(5, index=range(600)))
+    with pytest.raises(ValueError, match="more than 999 points"):
+        allocator.allocate(pd.Series(1, index=range(400)), pd.Series(5, index=range(400)))
+    # The failed batch did not consume any number
+    assert allocator.allocate(pd.Series([1]), pd.Series([5])).tolist() == ['01005601']
+
+
+def test_type_and_station_out_of_range():
+    with pytest.raises(ValueError, match=r"point types out of range 0-99: \[100\].*stations out of range 0-999: \[1000\]"):
+        create_keys(pd.Series([100, 1]), pd.Series([1, 1000]))
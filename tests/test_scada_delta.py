@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from Aor_groups import AOR_GROUP_TABLE, AOR_LIST_SIZE
+from Dat_writer import DatTable, write_dat
+from Merging_scada import scada_output_path, write_merged
+from Scada_delta import compare_hashes, write_delta, write_scada_delta
+
+STATION = DatTable(name='STATION', number=2, fields=['0', '3', '4'], columns=['record', 'Order', 'Key', 'Name'],
+                   header=['*', '{fields}', '*'], quoted=('Key', 'Name'), numbered=('record', 'Order'))
+UNIT = DatTable(name='UNIT', number=2, fields=['0'], columns=['record', 'Name'],
+                header=['*', '{fields}', '*\trecord\tName', '*'], quoted=('Name',), numbered=('record',))
+
+
+def build(workspace, name, stations, units):
+    folder = workspace / 'Dat_files' / name
+    folder.mkdir()
+    write_dat(str(folder / 'station_dat.dat'), STATION, pd.DataFrame(stations, columns=['Key', 'Name']))
+    write_dat(str(folder / 'unit_dat.dat'), UNIT, pd.DataFrame({'Name': units}))
+    output = str(workspace / 'Populateables' / f'SCADA_{name}.dat')
+    write_merged(output, b'10 SCADA.DB\n', [str(folder / 'station_dat.dat'), str(folder / 'unit_dat.dat')], b'\n0')
+    return output
+
+
+@pytest.fixture
+def builds(workspace):
+    previous = build(workspace, '240801', [('STA1', 'One'), ('STA2', 'Two'), ('STA3', 'Three')], ['kV', 'MW'])
+    # STA0 is inserted first, shifting every record number; STA2 is renamed, STA3 deleted, 'A' added
+    current = build(workspace, '240802', [('STA0', 'Zero'), ('STA1', 'One'), ('STA2', 'Second')], ['A', 'kV', 'MW'])
+    return previous, current, str(workspace / 'Populateables' / 'SCADA_240802_delta.dat')
+
+
+def test_delta_lists_changed_records_only(builds):
+    previous, current, output = builds
+    summary = write_delta(previous, current, output, chunksize=2)
+    assert summary['tables'] == {
+        'STATION': {'added': 1, 'modified': 1, 'deleted': 1, 'unchanged': 1},
+        'UNIT': {'added': 1, 'modified': 0, 'deleted': 0, 'unchanged': 2},
+    }
+    assert summary['changed'] == 4
+    with open(output + '.json') as f:
+        assert json.load(f)['changed'] == 4
+
+    with open(output) as f:
+        lines = f.read().split('\n')
+    assert lines[0] == '10 SCADA.DB'
+    body = [line for line in lines if not line.startswith('* Delta') and line != '*']
+    assert body[1:] == [
+        '* ADD', '\t2\tSTATION\t0\t3\t4', "\t1\t1\t'STA0'\t'Zero'", ' 0',
+        '* MODIFY', '\t2\tSTATION\t0\t3\t4', "\t3\t3\t'STA2'\t'Second'", ' 0',
+        '* DELETE', '\t2\tSTATION\t0\t3\t4', "\t3\t3\t'STA3'\t'Three'", ' 0',
+        '* ADD', '\t2\tUNIT\t0', "\t1\t'A'", ' 0',
+        '0',
+    ]
+
+
+def test_same_build_has_no_delta(builds):
+    previous, _, output = builds
+    summary = write_delta(previous, previous, output)
+    assert summary['changed'] == 0
+    assert summary['tables']['STATION']['unchanged'] == 3
+
+
+def test_repeated_keys_pair_in_file_order():
+    old = pd.DataFrame({'key': [7, 7], 'hash': [1, 2], 'position': [0, 1], 'occurrence': [0, 1]}, dtype='int64')
+    new = pd.DataFrame({'key': [7, 7, 7], 'hash': [1, 3, 4], 'position': [0, 1, 2], 'occurrence': [0, 1, 2]},
+                       dtype='int64')
+    changes = compare_hashes(old, new)
+    assert changes['ADD'].tolist() == [2]
+    assert changes['MODIFY'].tolist() == [1]
+    assert changes['DELETE'].tolist() == []
+    assert changes['unchanged'] == 1
+
+
+def aor_build(workspace, name, groups):
+    folder = workspace / 'Dat_files' / name
+    folder.mkdir()
+    df = pd.DataFrame({'Name': groups, **{f'AORList{i}': 0 for i in range(AOR_LIST_SIZE)}})
+    write_dat(str(folder / 'aor_group_dat.dat'), AOR_GROUP_TABLE, df)
+    output = str(workspace / 'Populateables' / f'SCADA_{name}.dat')
+    write_merged(output, b'10 SCADA.DB\n', [str(folder / 'aor_group_dat.dat')], b'\n0')
+    return output
+
+
+def test_aor_groups_are_compared_by_name(workspace):
+    previous = aor_build(workspace, '240801', ['First', 'Second'])
+    # A group inserted first shifts the record numbers of the others
+    current = aor_build(workspace, '240802', ['New', 'First', 'Second'])
+    summary = write_delta(previous, current, str(workspace / 'Populateables' / 'SCADA_240802_delta.dat'))
+    assert summary['tables']['AOR_GROUP'] == {'added': 1, 'modified': 0, 'deleted': 0, 'unchanged': 2}
+
+
+def test_no_previous_build_writes_no_delta(workspace, capsys):
+    write_merged(scada_output_path(), b'10 SCADA.DB\n', [], b'\n0')
+    assert write_scada_delta() is None
+    assert "Error: No previous SCADA build found" in capsys.readouterr().out
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts', 'Scada_delta.py')
+    result = subprocess.run([sys.executable, script, '', scada_output_path()], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "Error: No previous SCADA build found" in result.stdout
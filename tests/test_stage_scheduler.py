@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from Stage_scheduler import Stage, run_stages
+
+CODE = ['Stage_scheduler.py']
+calls = []
+
+
+def write_upper(source='in.txt', target='out.txt'):
+    calls.append('upper')
+    with open(source) as f, open(target, 'w') as out:
+        out.write(f.read().upper())
+    return target
+
+
+def read_upper(target='out.txt'):
+    calls.append('restore')
+    with open(target) as f:
+        return f.read()
+
+
+def broken_restore():
+    calls.append('restore')
+    raise OSError('restore failed')
+
+
+def use_result(upper):
+    calls.append(('use', upper))
+    return upper
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.fixture
+def source(workspace):
+    with open('in.txt', 'w') as f:
+        f.write('abc')
+    return 'in.txt'
+
+
+def run(stages, **options):
+    report = run_stages(stages, workers=1, manifest_path='manifest.json', **options)
+    return {name: info['status'] for name, info in report['stages'].items()}
+
+
+def upper_stage(restore=read_upper):
+    return Stage('upper', write_upper, inputs=['in.txt'], outputs=['out.txt'], code=CODE, restore=restore)
+
+
+def test_unchanged_stage_is_skipped(source):
+    assert run([upper_stage()]) == {'upper': 'ran'}
+    assert run([upper_stage()]) == {'upper': 'skipped'}
+    assert run([upper_stage()], force=True) == {'upper': 'ran'}
+
+
+@pytest.mark.parametrize('change', ['input', 'output', 'deleted output'])
+def test_changes_invalidate_the_stage(source, change):
+    run([upper_stage()])
+    if change == 'input':
+        with open('in.txt', 'w') as f:
+            f.write('abcd')
+    elif change == 'output':
+        with open('out.txt', 'w') as f:
+            f.write('edited')
+    else:
+        os.remove('out.txt')
+    assert run([upper_stage()]) == {'upper': 'ran'}
+    with open('out.txt') as f:
+        assert f.read() == ('ABCD' if change == 'input' else 'ABC')
+
+
+def test_skipped_dependency_is_restored_for_its_dependents(source):
+    use = Stage('use', use_result, deps=('upper',))
+    run([upper_stage(), use])
+    calls.clear()
+    assert run([upper_stage(), use]) == {'upper': 'skipped', 'use': 'ran'}
+    assert calls == ['restore', ('use', 'ABC')]
+
+
+def test_failed_restore_fails_the_stage_and_blocks_its_dependents(source):
+    use = Stage('use', use_result, deps=('upper',))
+    after = Stage('after', use_result, deps=('use',))
+    run([upper_stage(), use, after])
+    calls.clear()
+    statuses = run([upper_stage(broken_restore), use, after])
+    assert statuses == {'upper': 'failed', 'use': 'blocked', 'after': 'blocked'}
+    assert calls == ['restore']
+
+
+def test_failed_check_runs_an_up_to_date_stage(source):
+    checked = []
+    stage = upper_stage()
+    stage.check = lambda: checked.append('check') or len(checked) > 1
+    run([stage])
+    assert run([stage]) == {'upper': 'ran'}
+    assert run([stage]) == {'upper': 'skipped'}
+    assert checked == ['check', 'check']
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from Station_index import StationIndex
+
+STATIONS = pd.DataFrame({'Key': ['Sta1', 'STA2 ', 'sta1', None], 'Order': [1, 2, 3, 4], 'PKEY': [11, 12, 13, 14]})
+
+
+def test_names_match_whatever_their_case_and_surrounding_blanks():
+    index = StationIndex(STATIONS)
+    assert len(index) == 2
+    names = pd.Series([' sta2', 'STA1', 'Sta2\t'], index=[5, 6, 7])
+    # Later duplicates replace earlier ones
+    assert index.order(names).tolist() == [2, 3, 2]
+    assert index.pkey(names).tolist() == [12, 13, 12]
+    assert index.order(names).index.tolist() == [5, 6, 7]
+    assert index.unmatched == {}
+
+
+def test_unmatched_names_are_counted_and_reported(capsys):
+    index = StationIndex(STATIONS)
+    names = pd.Series(['STA9', 'sta9 ', '', np.nan, 'STA1'])
+    assert index.order(names).tolist() == [0, 0, 0, 0, 3]
+    index.pkey(pd.Series(['Sta9']))
+    assert index.report_unmatched('analog') == {'STA9': 3, '': 2}
+    assert ("Warning: 5 analog points reference 2 unknown stations, pStation set to 0: STA9 (3), <blank> (2)"
+            in capsys.readouterr().out)
+    # Reported names are forgotten
+    assert index.report_unmatched('status') == {}
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,40 @@
+import argparse
+import json
+
+from PMPA_Conversion import add_conversion_arguments, run_conversion
+from Stage_scheduler import Stage
+from Watch_inputs import watch
+
+
+def copy_input():
+    with open('in.txt') as f, open('out.txt', 'w') as out:
+        out.write(f.read())
+    return 1
+
+
+def stages():
+    return [Stage('copy', copy_input, inputs=['in.txt'], outputs=['out.txt'], code=['Watch_inputs.py'])]
+
+
+def test_watch_forwards_force_report_and_profile(workspace):
+    with open('in.txt', 'w') as f:
+        f.write('x')
+    assert watch(stages, max_runs=1) == 1
+    report_path = str(workspace / 'run.json')
+    profile_dir = str(workspace / 'profiles')
+    watch(stages, max_runs=1, force=True, report_path=report_path, profile_dir=profile_dir)
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report['stages']['copy']['status'] == 'ran'
+    assert report['profile'].endswith('copy.prof')
+
+    watch(stages, max_runs=1, report_path=report_path)
+    with open(report_path) as f:
+        assert json.load(f)['stages']['copy']['status'] == 'skipped'
+
+
+def test_watch_rejects_workers(workspace, capsys):
+    parser = argparse.ArgumentParser()
+    add_conversion_arguments(parser)
+    assert run_conversion(parser.parse_args(['--watch', '--workers', '4'])) is None
+    assert "Error: --workers cannot be used with --watch" in capsys.readouterr().out